@@ -1,5 +1,4 @@
-"""
-Microsoft Agents (`microsoft_agents`) application for use with M365 (Teams / Playground / Copilot Studio).
+"""Microsoft Agents (`microsoft_agents`) application for M365 (Teams / Playground / Copilot Studio).
 
 Module: agent.py
 Purpose: Databricks Genie integration and Microsoft Agents plumbing.
@@ -17,43 +16,102 @@ Purpose: Databricks Genie integration and Microsoft Agents plumbing.
 #              This pass adds structured docstrings and explanatory comments only.
 # ─────────────────────────────────────────────────────────────────────────────
 
-import os
-from pathlib import Path
-import re
-import json
-import uuid
-import time
 import asyncio
+import hashlib
+import json
 import logging
+import math
+import os
 import random
-import hashlib
-from dataclasses import dataclass, asdict
-from typing import Dict, Optional, Any, Tuple, List, Callable
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 
+# === Genie (Databricks) ===
+from databricks.sdk import WorkspaceClient
+from databricks.sdk.config import Config
+from databricks.sdk.errors import OperationFailed
+from databricks.sdk.service.dashboards import GenieAPI
 from dotenv import load_dotenv
-
-from microsoft_agents.hosting.core import (
-    Authorization,
-    AgentApplication,
-    TurnState,
-    TurnContext,
-    MemoryStorage,
-)
 from microsoft_agents.activity import (
-    load_configuration_from_env,
     Activity,
     ActivityTypes,
+    Attachment,
+    ConversationReference,
     EndOfConversationCodes,
+    load_configuration_from_env,
 )
 from microsoft_agents.authentication.msal import MsalConnectionManager
 from microsoft_agents.hosting.aiohttp import CloudAdapter
+from microsoft_agents.hosting.core import (
+    AgentApplication,
+    Authorization,
+    MemoryStorage,
+    TurnContext,
+    TurnState,
+)
 
-# === Genie (Databricks) ===
-from databricks.sdk import WorkspaceClient
-from databricks.sdk.errors import OperationFailed
-from databricks.sdk.service.dashboards import GenieAPI
+from . import cards, followups
+from .arrow_results import ARROW_FETCHES, arrow_available, fetch_arrow_result, result_incomplete
+from .commands import (
+    COMMANDS,
+    CommandArgs,
+    parse_config,
+    parse_export,
+    parse_list,
+    parse_messages,
+    parse_prefetch,
+    parse_reset,
+    parse_space,
+    parse_subscribe,
+    parse_tables,
+    parse_unsubscribe,
+    truthy,
+)
+from .deadline import RETRIES_SKIPPED, Deadline, DeadlineExceeded
+from .exports import EXPORT_FORMATS, ExportError, ExportStore, default_export_dir
+from .health import HealthProber
+from .hedge import RaceFailed, race_staggered
+from .idempotency import MemoryLedgerStore, RedisLedgerStore, TurnLedger
+from .inflight import InFlightRegistry, InFlightTurn, TurnCancelled
+from .logpipe import sampled, structured
+from .metrics import REGISTRY
+from .outbound import OutboundMessage, OutboundQueue
+from .payload import DELIVERY_SECONDS, PAYLOAD_BYTES, compact_json, encode_response, markdown_table
+from .prefetch import PrefetchScheduler
+from .ratelimit import (
+    BucketSpec,
+    MemoryBucketStore,
+    RedisBucketStore,
+    TokenBucketLimiter,
+    parse_bucket_spec,
+)
+from .result_table import ResultCache, ResultTable
+from .rollover import CONVERSATION_TURNS, ROLLOVERS, ConversationState, RolloverPolicy
+from .schema_index import (
+    SCHEMA_ANSWERS,
+    ColumnSchema,
+    SchemaIndex,
+    TableSchema,
+    match_metadata_question,
+    render_columns_md,
+    render_tables_md,
+)
+from .state import BoundedStateMap, RefCountedLock
+from .subscriptions import (
+    FileSubscriptionStore,
+    RedisSubscriptionStore,
+    Schedule,
+    Subscription,
+    SubscriptionScheduler,
+    result_fingerprint,
+)
+from .transport import DatabricksTransport, install_transport
 
 # ------------------------------------------------------------------------------
 # Configuration (environment)
@@ -63,7 +121,20 @@ from databricks.sdk.service.dashboards import GenieAPI
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env", override=True)
 agents_sdk_config = load_configuration_from_env(os.environ)
 
+
+def _env_flag(name: str, default: bool) -> bool:
+    """On/off setting from the environment (`commands.truthy` vocabulary).
+
+    Args:
+        name: Environment variable name.
+        default: Value when the variable is unset, empty or not recognised.
+    """
+    value = truthy(os.getenv(name) or "")
+    return default if value is None else value
+
+
 VERSION = os.getenv("VERSION", "databricks-genie-teams-1.4.1")
+BOT_APP_ID = os.getenv("CONNECTIONS__SERVICE_CONNECTION__SETTINGS__CLIENTID", "")
 STORAGE = MemoryStorage()
 CONNECTION_MANAGER = MsalConnectionManager(**agents_sdk_config)
 ADAPTER = CloudAdapter(connection_manager=CONNECTION_MANAGER)
@@ -104,6 +175,18 @@ CALL_TIMEOUT_SECONDS_DEFAULT = int(os.getenv("GENIE_TIMEOUT", "60"))
 GENIE_MAX_CHARS_DEFAULT = int(os.getenv("GENIE_MAX_CHARS", "12000"))
 GENIE_MAX_COLS_DEFAULT = int(os.getenv("GENIE_MAX_COLS", "8"))
 GENIE_MAX_CELL_CHARS_DEFAULT = int(os.getenv("GENIE_MAX_CELL_CHARS", "200"))
+GENIE_TABLE_CARDS_DEFAULT = _env_flag("GENIE_TABLE_CARDS", True)
+GENIE_CARD_PAGE_ROWS = int(os.getenv("GENIE_CARD_PAGE_ROWS", "15"))
+# Markdown tables: per-row character budget (widest columns are narrowed first; 0 = off)
+GENIE_MD_ROW_CHARS = int(os.getenv("GENIE_MD_ROW_CHARS", "480"))
+# Arrow result path (needs pyarrow): off | auto (only when the inline JSON result is incomplete)
+# | always
+GENIE_ARROW_FETCH = os.getenv("GENIE_ARROW_FETCH", "auto").strip().lower()
+GENIE_ARROW_MAX_ROWS = int(os.getenv("GENIE_ARROW_MAX_ROWS", "100000"))
+# Skip the Arrow refetch when less than this many seconds of the turn budget remain
+ARROW_MIN_BUDGET_SECONDS = int(os.getenv("GENIE_ARROW_MIN_BUDGET", "10"))
+# Generated SQL in Markdown replies: inline (Notes section) | ondemand (`sql` command)
+GENIE_SQL_NOTES_MODE = os.getenv("GENIE_SQL_NOTES_MODE", "inline").strip().lower()
 
 # Hard clamps to avoid abuse/misconfiguration
 HARD_MAX_ROWS = int(os.getenv("HARD_MAX_ROWS", "500"))
@@ -113,10 +196,124 @@ HARD_MAX_CELL_CHARS = int(os.getenv("HARD_MAX_CELL_CHARS", "2000"))
 HARD_MAX_TIMEOUT = int(os.getenv("HARD_MAX_TIMEOUT", "600"))
 HARD_MAX_QUERY_TIMEOUT = int(os.getenv("HARD_MAX_QUERY_TIMEOUT", "1200"))
 
-# Rate limiting & de-duplication windows
-MIN_INTERVAL_SECONDS = float(os.getenv("MIN_INTERVAL_SECONDS", "2.0"))  # per user
+# Server-side result cache (Adaptive Card pagination)
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# Last result per user/conversation (local follow-ups such as "sort by X")
+LAST_RESULT_MAX_ENTRIES = int(os.getenv("LAST_RESULT_MAX_ENTRIES", "2000"))
+LAST_RESULT_MAX_MB = int(os.getenv("LAST_RESULT_MAX_MB", "256"))
+LAST_RESULT_TTL_SECONDS = float(os.getenv("LAST_RESULT_TTL_SECONDS", "3600"))
+
+# Full-result exports (signed, expiring download links)
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+EXPORT_MOUNT = os.getenv("EXPORT_MOUNT", "/exports")
+EXPORT_DIR = os.getenv("EXPORT_DIR") or default_export_dir()
+EXPORT_MAX_DISK_MB = int(os.getenv("EXPORT_MAX_DISK_MB", "2048"))
+EXPORT_MAX_FILE_MB = int(os.getenv("EXPORT_MAX_FILE_MB", "512"))
+EXPORT_TTL_SECONDS = float(os.getenv("EXPORT_TTL_SECONDS", "3600"))
+EXPORT_SIGNING_KEY = os.getenv("EXPORT_SIGNING_KEY", "")
+
+# Rate limiting (token buckets, "burst/per_minute"; "off" disables a level) & de-duplication window
+# MIN_INTERVAL_SECONDS is legacy: it only sets the default user refill rate
+MIN_INTERVAL_SECONDS = float(os.getenv("MIN_INTERVAL_SECONDS", "2.0"))
+RATE_LIMIT_USER = parse_bucket_spec(
+    os.getenv("RATE_LIMIT_USER", ""), BucketSpec(3, 60 / max(0.1, MIN_INTERVAL_SECONDS))
+)
+RATE_LIMIT_TENANT = parse_bucket_spec(os.getenv("RATE_LIMIT_TENANT", ""), BucketSpec(30, 120))
+RATE_LIMIT_SPACE = parse_bucket_spec(os.getenv("RATE_LIMIT_SPACE", ""), BucketSpec(30, 120))
+RATE_LIMIT_GLOBAL = parse_bucket_spec(os.getenv("RATE_LIMIT_GLOBAL", ""), BucketSpec(100, 600))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()  # memory | redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
 DEDUP_WINDOW_SECONDS = float(os.getenv("DEDUP_WINDOW_SECONDS", "8.0"))  # same text
 
+# Idempotency: redelivered activities / double-sent questions
+# (IDEMPOTENCY_BACKEND memory | redis; Redis shares the records across workers)
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", RATE_LIMIT_BACKEND).strip().lower()
+IDEMPOTENCY_REDIS_URL = os.getenv("IDEMPOTENCY_REDIS_URL", RATE_LIMIT_REDIS_URL)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "900"))  # finished ids
+IDEMPOTENCY_MAX_ANSWER_BYTES = int(os.getenv("IDEMPOTENCY_MAX_ANSWER_BYTES", str(256 * 1024)))
+
+# Bounds for per-user state (entries idle longer than the TTL are evicted)
+USER_STATE_MAX_ENTRIES = int(os.getenv("USER_STATE_MAX_ENTRIES", "50000"))
+USER_SETTINGS_TTL_SECONDS = float(os.getenv("USER_SETTINGS_TTL_SECONDS", str(7 * 24 * 3600)))
+USER_CONVERSATION_TTL_SECONDS = float(os.getenv("USER_CONVERSATION_TTL_SECONDS", str(24 * 3600)))
+
+# Genie conversation rollover: start a fresh conversation after N turns, an idle gap,
+# or when the smoothed turn latency passes a threshold (0 disables a trigger)
+ROLLOVER_POLICY = RolloverPolicy(
+    max_turns=int(os.getenv("GENIE_ROLLOVER_TURNS", "10")),
+    idle_seconds=float(os.getenv("GENIE_ROLLOVER_IDLE_SECONDS", "1800")),
+    latency_seconds=float(os.getenv("GENIE_ROLLOVER_LATENCY_SECONDS", "0")),
+    carry_question=_env_flag("GENIE_ROLLOVER_CARRY", True),
+)
+USER_LOCK_IDLE_SECONDS = float(os.getenv("USER_LOCK_IDLE_SECONDS", "600"))
+
+# Global concurrency for Genie turns (all callers) and batch prompt limits
+GENIE_MAX_CONCURRENCY = int(os.getenv("GENIE_MAX_CONCURRENCY", "8"))
+# Query attachments of one Genie answer fetched in parallel
+GENIE_ATTACHMENT_CONCURRENCY = int(os.getenv("GENIE_ATTACHMENT_CONCURRENCY", "4"))
+# Head start of get_statement before the attachment query result is raced against it
+GENIE_FETCH_STAGGER_SECONDS = float(os.getenv("GENIE_FETCH_STAGGER_SECONDS", "1.5"))
+
+# Databricks HTTP transport (one pooled keep-alive session shared by all SDK calls)
+DATABRICKS_HTTP_POOL_SIZE = int(
+    os.getenv("DATABRICKS_HTTP_POOL_SIZE", str(max(20, GENIE_MAX_CONCURRENCY * 4)))
+)
+DATABRICKS_HTTP_POOL_BLOCK = _env_flag("DATABRICKS_HTTP_POOL_BLOCK", True)
+DATABRICKS_HTTP_KEEPALIVE = _env_flag("DATABRICKS_HTTP_KEEPALIVE", True)
+DATABRICKS_HTTP_TIMEOUT_SECONDS = float(os.getenv("DATABRICKS_HTTP_TIMEOUT_SECONDS", "60"))
+
+# Background Genie health probe (reachability + auth) and spaces listing cache
+GENIE_PROBE_INTERVAL_SECONDS = float(os.getenv("GENIE_PROBE_INTERVAL_SECONDS", "30"))
+GENIE_PROBE_TIMEOUT_SECONDS = float(os.getenv("GENIE_PROBE_TIMEOUT_SECONDS", "10"))
+GENIE_PROBE_FAILURE_THRESHOLD = int(os.getenv("GENIE_PROBE_FAILURE_THRESHOLD", "2"))
+SPACES_CACHE_TTL_SECONDS = float(os.getenv("SPACES_CACHE_TTL_SECONDS", "300"))
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "20"))
+
+# Warm-result prefetching of popular questions
+PREFETCH_ENABLED = _env_flag("PREFETCH_ENABLED", False)
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "20"))
+PREFETCH_INTERVAL_SECONDS = float(os.getenv("PREFETCH_INTERVAL_SECONDS", "1800"))
+# Extra daily passes, e.g. "08:00,13:00"
+PREFETCH_PEAK_TIMES = [t for t in os.getenv("PREFETCH_PEAK_TIMES", "").split(",") if t.strip()]
+PREFETCH_RESULT_TTL_SECONDS = float(os.getenv("PREFETCH_RESULT_TTL_SECONDS", "3600"))
+PREFETCH_BUDGET_SECONDS_PER_HOUR = float(os.getenv("PREFETCH_BUDGET_SECONDS_PER_HOUR", "600"))
+
+# Proactive delivery (welcomes, scheduled results): paced by a token bucket so bursts
+# (e.g. installing into a large team) are not throttled by the Bot Connector.
+# Needs the bot's app id (proactive sends); without it welcomes are sent inline.
+OUTBOUND_ENABLED = bool(BOT_APP_ID) and _env_flag("OUTBOUND_QUEUE", True)
+OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "1.0"))
+OUTBOUND_BURST = int(os.getenv("OUTBOUND_BURST", "5"))
+OUTBOUND_MAX_QUEUE = int(os.getenv("OUTBOUND_MAX_QUEUE", "5000"))
+# At most one welcome per conversation per cooldown; in channels/group chats, member
+# additions larger than this are not welcomed individually (0 = never; the install still is)
+WELCOME_COOLDOWN_SECONDS = float(os.getenv("WELCOME_COOLDOWN_SECONDS", "3600"))
+WELCOME_CHANNEL_MAX_MEMBERS = int(os.getenv("WELCOME_CHANNEL_MAX_MEMBERS", "10"))
+
+# Local answers to metadata questions ("which tables do you have?") from a per-space
+# schema index (space definition + Unity Catalog), rebuilt in the background on a TTL
+SCHEMA_INDEX_ENABLED = _env_flag("SCHEMA_INDEX_ENABLED", True)
+SCHEMA_INDEX_TTL_SECONDS = float(os.getenv("SCHEMA_INDEX_TTL_SECONDS", "3600"))
+SCHEMA_INDEX_MAX_TABLES = int(os.getenv("SCHEMA_INDEX_MAX_TABLES", "100"))
+
+# Scheduled question subscriptions (`subscribe "<question>" daily 08:00`): delivered through
+# the outbound queue, so they need OUTBOUND_ENABLED. State is kept in a JSON file, or in
+# Redis when several workers serve the bot (SUBSCRIPTIONS_BACKEND=redis).
+SUBSCRIPTIONS_ENABLED = OUTBOUND_ENABLED and _env_flag("SUBSCRIPTIONS", True)
+SUBSCRIPTIONS_BACKEND = os.getenv("SUBSCRIPTIONS_BACKEND", "file").strip().lower()  # file | redis
+SUBSCRIPTIONS_FILE = os.getenv(
+    "SUBSCRIPTIONS_FILE", str(Path(__file__).resolve().parents[1] / "data" / "subscriptions.json")
+)
+SUBSCRIPTIONS_REDIS_URL = os.getenv("SUBSCRIPTIONS_REDIS_URL", RATE_LIMIT_REDIS_URL)
+SUBSCRIPTIONS_MAX_PER_USER = int(os.getenv("SUBSCRIPTIONS_MAX_PER_USER", "10"))
+SUBSCRIPTIONS_CONCURRENCY = int(os.getenv("SUBSCRIPTIONS_CONCURRENCY", "2"))
+
+# Admin commands (e.g. `prefetch ...`): comma-separated Teams user ids or AAD object ids
+ADMIN_USER_IDS = {x.strip() for x in os.getenv("ADMIN_USER_IDS", "").split(",") if x.strip()}
+
 # Retry policy
 MAX_RETRIES = int(os.getenv("GENIE_MAX_RETRIES", "3"))
 BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.8"))
@@ -124,13 +321,36 @@ BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.8"))
 # Timezone for user-facing timestamps
 USER_TZ = ZoneInfo(os.getenv("USER_TZ", "America/Sao_Paulo"))
 
+# ------------------------------------------------------------------------------
+# Metrics (exposed on /metrics when ENABLE_METRICS is on)
+# ------------------------------------------------------------------------------
+
+FOLLOWUP_TOTAL = REGISTRY.counter(
+    "genie_followup_total",
+    "Questions asked while a previous result was available, by outcome (local|genie).",
+    ["outcome"],
+)
+FOLLOWUP_SAVED_SECONDS = REGISTRY.counter(
+    "genie_followup_saved_seconds_total",
+    "Genie/warehouse seconds avoided by answering follow-ups from the previous result.",
+)
+SPACE_LOOKUPS = REGISTRY.counter(
+    "genie_space_lookups_total",
+    "get_space calls by outcome (fetched|coalesced onto a running lookup).",
+    ["outcome"],
+)
+QUERY_ATTACHMENTS = REGISTRY.counter(
+    "genie_query_attachments_total",
+    "Query attachments fetched from Genie answers, by outcome (ok|error).",
+    ["outcome"],
+)
+
 # ------------------------------------------------------------------------------
 # Utilities
 # ------------------------------------------------------------------------------
 
 def clamp(val: int, lo: int, hi: int) -> int:
-    """
-    Clamp an integer value to a [lo, hi] range.
+    """Clamp an integer value to a [lo, hi] range.
 
     Args:
         val: Input value.
@@ -144,8 +364,7 @@ def clamp(val: int, lo: int, hi: int) -> int:
 
 
 def sha256_hex(s: str) -> str:
-    """
-    Compute the SHA-256 hex digest of a string.
+    """Compute the SHA-256 hex digest of a string.
 
     Args:
         s: Input string.
@@ -157,8 +376,10 @@ def sha256_hex(s: str) -> str:
 
 
 def log_event(level: int, event: str, **kwargs):
-    """
-    Emit a JSON-structured log line with a consistent shape.
+    """Emit a JSON-structured log line with a consistent shape.
+
+    Encoding and the stdout write happen on the logging listener thread when
+    the pipeline in `logpipe` is installed (see main.py).
 
     Args:
         level: Logging level from the logging module.
@@ -166,36 +387,14 @@ def log_event(level: int, event: str, **kwargs):
         **kwargs: Arbitrary serializable context to include.
     """
     try:
+        if not sampled(event, level):
+            return
         payload = {"event": event, "v": VERSION, **kwargs}
-        logger.log(level, json.dumps(payload, ensure_ascii=False))
+        logger.log(level, structured(payload))
     except Exception:
         logger.log(level, f"{event} | {kwargs}")
 
 
-def truthy(s: str) -> Optional[bool]:
-    """
-    Parse a truthy/falsey string value into a boolean.
-
-    Recognized tokens (case-insensitive):
-      True-like: 1, true, on, yes, y, enable, enabled
-      False-like: 0, false, off, no, n, disable, disabled
-
-    Args:
-        s: String to parse.
-
-    Returns:
-        True/False if recognized, otherwise None.
-    """
-    if s is None:
-        return None
-    t = s.strip().lower()
-    if t in ("1", "true", "on", "yes", "y", "enable", "enabled"):
-        return True
-    if t in ("0", "false", "off", "no", "n", "disable", "disabled"):
-        return False
-    return None
-
-
 def fmt_epoch_ms_to_local(ms_like: Any) -> str:
     """Convert epoch milliseconds (int/str) to a localized timestamp string."""
     try:
@@ -206,9 +405,90 @@ def fmt_epoch_ms_to_local(ms_like: Any) -> str:
         return str(ms_like)
 
 
-def _is_skill_invocation(activity: Activity) -> bool:
+def _is_admin(activity: Activity) -> bool:
+    """True when the sender is listed in ADMIN_USER_IDS (Teams id or AAD object id)."""
+    sender = getattr(activity, "from_property", None)
+    ids = {getattr(sender, "id", None), getattr(sender, "aad_object_id", None)}
+    return bool(ADMIN_USER_IDS & {i for i in ids if i})
+
+
+def parse_batch_prompts(payload: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Validate a batch request.
+
+    Shape: {"prompts": [str | {"id"?, "prompt", "timeoutSeconds"?}], "timeoutSeconds"?}.
+
+    Returns:
+        (items, error). Items are {id, prompt, timeout}; error is a message or None.
     """
-    Determine if the incoming turn was initiated by a parent bot (Bot Framework Skill).
+    if not isinstance(payload, dict):
+        return [], "Invalid payload."
+    raw = payload.get("prompts")
+    if not isinstance(raw, list) or not raw:
+        return [], "No prompts provided."
+    if len(raw) > BATCH_MAX_PROMPTS:
+        return [], f"Too many prompts ({len(raw)} > {BATCH_MAX_PROMPTS})."
+    try:
+        default_timeout = int(payload.get("timeoutSeconds") or CALL_TIMEOUT_SECONDS_DEFAULT)
+    except (TypeError, ValueError):
+        return [], "timeoutSeconds must be an integer."
+
+    items: List[Dict[str, Any]] = []
+    for idx, entry in enumerate(raw):
+        if isinstance(entry, str):
+            entry = {"prompt": entry}
+        prompt = entry.get("prompt") if isinstance(entry, dict) else None
+        if not isinstance(prompt, str) or not prompt.strip():
+            return [], f"Prompt #{idx + 1} is empty or invalid."
+        try:
+            timeout = int(entry.get("timeoutSeconds") or default_timeout)
+        except (TypeError, ValueError):
+            return [], f"Prompt #{idx + 1}: timeoutSeconds must be an integer."
+        items.append({
+            "id": str(entry.get("id") or idx + 1),
+            "prompt": prompt.strip(),
+            "timeout": clamp(timeout, 5, HARD_MAX_TIMEOUT),
+        })
+    return items, None
+
+
+def batch_status(results: List[Dict[str, Any]]) -> str:
+    """Overall batch status: ok (all ok), error (none ok) or partial."""
+    ok = sum(1 for r in results if r.get("status") == "ok")
+    if ok == len(results):
+        return "ok"
+    return "error" if ok == 0 else "partial"
+
+
+def _tenant_id(activity: Activity) -> Optional[str]:
+    """Return the AAD tenant id of the sender (conversation.tenant_id or Teams channel data)."""
+    tid = getattr(getattr(activity, "conversation", None), "tenant_id", None)
+    if not tid:
+        channel_data = getattr(activity, "channel_data", None) or {}
+        if isinstance(channel_data, dict):
+            tid = (channel_data.get("tenant") or {}).get("id")
+    return tid or None
+
+
+def _space_table_names(serialized: Any) -> List[str]:
+    """Table identifiers of a serialized Genie space (`data_sources.tables[].identifier`)."""
+    if not serialized:
+        return []
+    try:
+        doc = json.loads(serialized) if isinstance(serialized, str) else serialized
+    except ValueError:
+        return []
+    tables = ((doc or {}).get("data_sources") or {}).get("tables") or []
+    names = [t.get("identifier") or t.get("full_name") for t in tables if isinstance(t, dict)]
+    return [n for n in names if n]
+
+
+def _bf_conversation_id(context: TurnContext) -> str:
+    """Return the Bot Framework conversation id of the current turn (or '')."""
+    return getattr(getattr(context.activity, "conversation", None), "id", "") or ""
+
+
+def _is_skill_invocation(activity: Activity) -> bool:
+    """Determine if the incoming turn was initiated by a parent bot (Bot Framework Skill).
 
     The Bot Framework sets activity.caller_id to something like 'urn:botframework:skill'
     when invoking a skill.
@@ -229,8 +509,7 @@ def _is_skill_invocation(activity: Activity) -> bool:
 
 @dataclass
 class UserSettings:
-    """
-    Per-user rendering and timeout limits for Genie responses.
+    """Per-user rendering and timeout limits for Genie responses.
 
     Fields:
         rows: Max number of result rows to render.
@@ -240,6 +519,7 @@ class UserSettings:
         timeout: Timeout (seconds) for high-level text operations.
         query_timeout: Timeout (seconds) for query/statement fetches.
         sql_notes: Whether to include generated SQL in the 'Notes' section.
+        cards: Whether to render tables as paginated Adaptive Cards.
     """
     rows: int = MAX_ROWS_DEFAULT
     cols: int = GENIE_MAX_COLS_DEFAULT
@@ -248,11 +528,10 @@ class UserSettings:
     timeout: int = CALL_TIMEOUT_SECONDS_DEFAULT         # text-level operations
     query_timeout: int = max(CALL_TIMEOUT_SECONDS_DEFAULT, 120)  # SQL fetch timeout
     sql_notes: bool = True  # include generated SQL in Notes
+    cards: bool = GENIE_TABLE_CARDS_DEFAULT  # paginated Adaptive Card tables
 
     def clamped(self) -> "UserSettings":
-        """
-        Return a defensive copy of settings constrained by global hard limits.
-        """
+        """Return a defensive copy of settings constrained by global hard limits."""
         return UserSettings(
             rows=clamp(self.rows, 1, HARD_MAX_ROWS),
             cols=clamp(self.cols, 1, HARD_MAX_COLS),
@@ -261,11 +540,11 @@ class UserSettings:
             timeout=clamp(self.timeout, 5, HARD_MAX_TIMEOUT),
             query_timeout=clamp(self.query_timeout, 30, HARD_MAX_QUERY_TIMEOUT),
             sql_notes=self.sql_notes,
+            cards=self.cards,
         )
 
     def pretty(self, space_title: str, space_id: str) -> str:
-        """
-        Produce a human-readable summary of the current limits.
+        """Produce a human-readable summary of the current limits.
 
         Args:
             space_title: Title of the current Genie Space.
@@ -280,7 +559,8 @@ class UserSettings:
             f"Your current limits → rows={s.rows}, cols={s.cols}, "
             f"chars/activity={s.chars}, cell chars={s.cell_chars}, "
             f"timeout={s.timeout}s, query_timeout={s.query_timeout}s\n"
-            f"Extras → sql_notes={'on' if s.sql_notes else 'off'}"
+            f"Extras → sql_notes={'on' if s.sql_notes else 'off'}, "
+            f"cards={'on' if s.cards else 'off'}"
         )
 
 
@@ -289,57 +569,91 @@ class UserSettings:
 # ------------------------------------------------------------------------------
 
 class GenieBot:
-    """
-    Thin stateful facade around Databricks Genie:
-      - Maintains per-user settings, space selection, rate limits, and de-dup.
-      - Talks to the Genie API to create/continue conversations and fetch results.
-      - Formats answers (tables, notes) safely for M365 channels.
+    """Thin stateful facade around Databricks Genie.
 
-    """
+    - Maintains per-user settings, space selection, rate limits, and de-dup.
+    - Talks to the Genie API to create/continue conversations and fetch results.
+    - Formats answers (tables, notes) safely for M365 channels.
 
-    # Precompiled regex for command parsing
-    RE_CONFIG_CMD = re.compile(r"^\s*(config|settings?|set)\b", re.IGNORECASE)
-    RE_PAIR_NUM = re.compile(
-        r"(?i)\b(rows|cols|columns|timeout|chars|cell|cell_chars|query_timeout|qt)\s*[:=]\s*(\d+)"
-    )
-    RE_PAIR_BOOL = re.compile(
-        r"(?i)\b(sql|sql_notes)\s*[:=]\s*(on|off|true|false|yes|no|enable|disable|enabled|disabled|0|1)\b"
-    )
-    RE_RESET = re.compile(r"^(?:/)?(?:reset|restart|clear|start\s+over)\b", re.IGNORECASE)
-
-    # Spaces / conversations commands
-    RE_SPACES = re.compile(r"^spaces\b", re.IGNORECASE)  # plural only
-    RE_SPACE = re.compile(r"^space\b", re.IGNORECASE)    # singular
-    RE_CONVERSATIONS = re.compile(r"^(conversations?)\b", re.IGNORECASE)
-    RE_MESSAGES = re.compile(r"^(messages?)\b", re.IGNORECASE)
-
-    # Normalization map for numeric config keys
-    KEYMAP_NUM = {
-        "rows": "rows",
-        "cols": "cols", "columns": "cols",
-        "timeout": "timeout",
-        "chars": "chars",
-        "cell": "cell_chars", "cell_chars": "cell_chars",
-        "query_timeout": "query_timeout", "qt": "query_timeout",
-    }
+    """
 
     def __init__(self):
-        """
-        Initialize internal caches and (optionally) a Databricks Workspace client.
+        """Initialize internal caches and (optionally) a Databricks Workspace client.
 
         If DBX_ENABLED is True, this creates a WorkspaceClient using PAT or OAuth
-        (M2M), and attempts a lightweight Genie API call to confirm connectivity.
+        (M2M). Connectivity is verified off the request path by `self.health`
+        (started by the web host), never at import time.
         """
         self._workspace_client: Optional[WorkspaceClient] = None
         self._genie_api: Optional[GenieAPI] = None
+        self._spaces_cache: Optional[List[Dict[str, Any]]] = None
+        self._spaces_cached_at = 0.0
+        self.health = HealthProber(
+            "genie",
+            self._probe_genie,
+            interval_seconds=GENIE_PROBE_INTERVAL_SECONDS,
+            timeout_seconds=GENIE_PROBE_TIMEOUT_SECONDS,
+            failure_threshold=GENIE_PROBE_FAILURE_THRESHOLD,
+            on_change=lambda healthy, snap: log_event(
+                logging.INFO if healthy else logging.ERROR,
+                "✅ genie_health_ok" if healthy else "⛔ genie_health_failed",
+                auth="pat" if DBX_HAS_PAT else "oauth", **snap,
+            ),
+        )
 
-        self._user_settings: Dict[str, UserSettings] = {}
-        self._user_conversation: Dict[str, str] = {}
-        self._user_locks: Dict[str, asyncio.Lock] = {}
-        self._user_next_allowed: Dict[str, float] = {}
-        self._user_dedup: Dict[str, Dict[str, Any]] = {}
-        self._user_space: Dict[str, str] = {}  # per-user space override; default is env
+        # Per-user state: TTL + LRU bounded so memory stays flat as users come and go.
+        # Locks are never evicted while held (or awaited).
+        self._user_settings: BoundedStateMap[str, UserSettings] = BoundedStateMap(
+            "settings", max_entries=USER_STATE_MAX_ENTRIES, ttl_seconds=USER_SETTINGS_TTL_SECONDS
+        )
+        self._user_conversation: BoundedStateMap[str, ConversationState] = BoundedStateMap(
+            "conversation",
+            max_entries=USER_STATE_MAX_ENTRIES,
+            ttl_seconds=USER_CONVERSATION_TTL_SECONDS,
+        )
+        self._user_locks: BoundedStateMap[str, RefCountedLock] = BoundedStateMap(
+            "locks", max_entries=USER_STATE_MAX_ENTRIES, ttl_seconds=USER_LOCK_IDLE_SECONDS,
+            can_evict=lambda lock: not lock.in_use,
+        )
+        self._user_dedup: BoundedStateMap[str, Dict[str, Any]] = BoundedStateMap(
+            "dedup", max_entries=USER_STATE_MAX_ENTRIES, ttl_seconds=max(1.0, DEDUP_WINDOW_SECONDS)
+        )
+        # per-user space override; default is env
+        self._user_space: BoundedStateMap[str, str] = BoundedStateMap(
+            "space", max_entries=USER_STATE_MAX_ENTRIES, ttl_seconds=USER_SETTINGS_TTL_SECONDS
+        )
         self._space_title_cache: Dict[str, str] = {}
+        self._genie_slots = asyncio.Semaphore(max(1, GENIE_MAX_CONCURRENCY))
+        # Running turns (chat turns keyed by user id) so abandoned ones can cancel their statements
+        self._inflight = InFlightRegistry(
+            lambda statement_id: self._workspace_client.statement_execution.cancel_execution(
+                statement_id
+            ),
+            lookup_message=lambda turn: asyncio.to_thread(
+                self._genie_api.get_message, turn.space_id, turn.conversation_id, turn.message_id
+            ),
+        )
+        self._space_warehouse_cache: Dict[str, str] = {}
+        # Running get_space calls (concurrent lookups of one space share them) and
+        # welcome texts per space: (space title, text)
+        self._space_lookups: Dict[str, "asyncio.Future[Any]"] = {}
+        self._welcome_cache: Dict[str, Tuple[str, str]] = {}
+        # Last tabular answer per user (current conversation) for follow-ups and `export`
+        self._last_results = ResultCache(
+            name="last_results",
+            max_entries=LAST_RESULT_MAX_ENTRIES,
+            max_bytes=LAST_RESULT_MAX_MB * 1024 * 1024,
+            ttl_seconds=LAST_RESULT_TTL_SECONDS,
+        )
+        REGISTRY.gauge(
+            "genie_last_results_bytes", "Approximate bytes held by cached last results."
+        ).set_function(lambda: self._last_results.nbytes)
+        self._result_cache = ResultCache(
+            name="cards",
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+            ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+        )
 
         # Legacy (PAT-only) initialization retained for reference above.
 
@@ -354,43 +668,75 @@ class GenieBot:
                 client_kwargs["client_secret"] = DATABRICKS_CLIENT_SECRET
                 client_kwargs["auth_type"] = "oauth-m2m"
 
-            self._workspace_client = WorkspaceClient(**client_kwargs)
+            # Both pool knobs get the same value: the SDK maps them onto requests'
+            # pool_connections/pool_maxsize in swapped order in some versions.
+            config = Config(
+                **client_kwargs,
+                max_connection_pools=DATABRICKS_HTTP_POOL_SIZE,
+                max_connections_per_pool=DATABRICKS_HTTP_POOL_SIZE,
+                http_timeout_seconds=DATABRICKS_HTTP_TIMEOUT_SECONDS,
+            )
+            self._workspace_client = WorkspaceClient(config=config)
             self._genie_api = self._workspace_client.genie
-
-            try:
-                # Lightweight ping to validate access/token
-                self._genie_api.list_spaces()
-                log_event(logging.INFO, "✅ genie_init_ok", auth="pat" if DBX_HAS_PAT else "oauth")
-            except Exception as e:
-                log_event(logging.ERROR, "⛔ genie_init_failed", stage="genie_ping", error=str(e))
-                self._workspace_client = None
-                self._genie_api = None
+            transport = DatabricksTransport(
+                pool_size=DATABRICKS_HTTP_POOL_SIZE,
+                pool_block=DATABRICKS_HTTP_POOL_BLOCK,
+                keepalive=DATABRICKS_HTTP_KEEPALIVE,
+            )
+            if not install_transport(self._workspace_client, transport):
+                log_event(
+                    logging.WARNING, "dbx_transport_not_installed", reason="sdk_session_not_found"
+                )
 
     # -------------------- Space helpers --------------------
 
     def get_user_space_id(self, user_id: str) -> str:
-        """
-        Resolve the current Genie Space ID for a given user.
+        """Resolve the current Genie Space ID for a given user.
 
         Returns:
             The user's selected space id or the default env-configured space id.
         """
         return self._user_space.get(user_id) or DATABRICKS_SPACE_ID
 
+    def spaces_in_use(self) -> List[str]:
+        """The default space plus every space a user has switched to."""
+        return list(
+            dict.fromkeys(
+                [DATABRICKS_SPACE_ID or "", *(sid for _, sid in self._user_space.items())]
+            )
+        )
+
     def set_user_space_id(self, user_id: str, space_id: str):
-        """
-        Set (persist for session) the Genie Space ID for a given user.
+        """Set (persist for session) the Genie Space ID for a given user.
 
         Side effect:
             Resets the user's conversation context (keeps settings).
         """
         self._user_space[user_id] = space_id
-        # Reset conversation when changing spaces
+        # Reset conversation (and drop any in-flight question) when changing spaces
+        self._inflight.cancel(user_id, "space_switch")
         self._user_conversation.pop(user_id, None)
+        self._last_results.pop(user_id)
+
+    async def _probe_genie(self):
+        """Health check: list spaces (proves reachability and auth) and refresh the cache."""
+        if not self._genie_api:
+            raise RuntimeError("Databricks connection is not configured")
+        await self._fetch_spaces(refresh=True)
 
-    async def _fetch_spaces(self) -> List[Dict[str, Any]]:
-        """Return a list of spaces as dicts with {id, title}."""
+    async def _fetch_spaces(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Return a list of spaces as dicts with {id, title}.
+
+        Served from the listing cached by the health probe unless it is older
+        than SPACES_CACHE_TTL_SECONDS (or refresh=True).
+        """
         assert self._genie_api is not None
+        if (
+            not refresh
+            and self._spaces_cache is not None
+            and time.monotonic() - self._spaces_cached_at < SPACES_CACHE_TTL_SECONDS
+        ):
+            return self._spaces_cache
 
         def _list_spaces():
             resp = self._genie_api.list_spaces()  # GenieListSpacesResponse
@@ -403,75 +749,146 @@ class GenieBot:
                     out.append({"id": sid, "title": title})
             return out
 
-        return await asyncio.to_thread(_list_spaces)
+        spaces = await asyncio.to_thread(_list_spaces)
+        self._spaces_cache, self._spaces_cached_at = spaces, time.monotonic()
+        for sp in spaces:
+            self._space_title_cache[sp["id"]] = sp["title"]
+            self._welcome_for(sp["id"], sp["title"])  # precompute welcomes off the hot path
+        return spaces
+
+    async def _get_space(self, space_id: str) -> Any:
+        """`get_space` with concurrent callers coalesced onto one request.
+
+        A bulk install asks for the same cold space many times at once; the
+        result fills the title and warehouse caches.
+        """
+        pending = self._space_lookups.get(space_id)
+        if pending is None:
+            pending = asyncio.ensure_future(asyncio.to_thread(self._genie_api.get_space, space_id))
+            self._space_lookups[space_id] = pending
+            pending.add_done_callback(lambda _f: self._space_lookups.pop(space_id, None))
+            SPACE_LOOKUPS.inc(outcome="fetched")
+        else:
+            SPACE_LOOKUPS.inc(outcome="coalesced")
+        # shield: one caller giving up must not cancel the lookup the others wait on
+        space = await asyncio.shield(pending)
+        title = getattr(space, "title", None)
+        if title:
+            self._space_title_cache[space_id] = title
+        wh = getattr(space, "warehouse_id", None)
+        if wh:
+            self._space_warehouse_cache[space_id] = wh
+        return space
 
     async def _ensure_space_title(self, space_id: str) -> str:
-        """
-        Get (and cache) the title for a given space id. Falls back to placeholders.
-        """
+        """Get (and cache) the title for a given space id. Falls back to placeholders."""
         if not space_id:
             return "(no space)"
         if space_id in self._space_title_cache:
             return self._space_title_cache[space_id]
         title = "(unknown space)"
         try:
-            s = await asyncio.to_thread(self._genie_api.get_space, space_id)
+            s = await self._get_space(space_id)
             title = getattr(s, "title", None) or title
         except Exception:
             pass
         self._space_title_cache[space_id] = title
         return title
 
+    async def _space_warehouse_id(self, space_id: str) -> Optional[str]:
+        """Get (and cache) the SQL warehouse id backing a Genie space."""
+        if space_id in self._space_warehouse_cache:
+            return self._space_warehouse_cache[space_id]
+        try:
+            s = await self._get_space(space_id)
+        except Exception:
+            return None
+        return getattr(s, "warehouse_id", None)
+
     # -------------------- Health / Help / Welcome --------------------
 
+    def is_configured(self) -> bool:
+        """True when the Databricks connection is configured and the client was created."""
+        return bool(DBX_ENABLED and self._genie_api and self._workspace_client)
+
+    def is_enabled(self) -> bool:
+        """True when configured and the background probe has not found Genie unreachable."""
+        return self.is_configured() and self.health.available
+
+    def genie_slots_snapshot(self) -> Dict[str, int]:
+        """Global Genie concurrency: configured slots and how many are in use."""
+        free = getattr(self._genie_slots, "_value", 0)
+        limit = max(1, GENIE_MAX_CONCURRENCY)
+        return {"limit": limit, "in_use": max(0, limit - free)}
+
     def health_summary(self) -> str:
-        """
-        Quick status string suitable for user-facing health checks.
-        """
-        if self._genie_api and self._workspace_client and DBX_ENABLED:
-            return "Genie is enabled and configured."
-        return "⚠️ The data connection isn’t set up yet. Please contact your admin."
+        """Quick status string suitable for user-facing health checks."""
+        if not self.is_configured():
+            return "⚠️ The data connection isn’t set up yet. Please contact your admin."
+        if not self.health.available:
+            return "⚠️ Genie is temporarily unreachable. Please try again in a minute."
+        return "Genie is enabled and configured."
 
     async def help_text(self, user_id: str) -> str:
-        """
-        Produce help text with command references for the user.
-        """
+        """Produce help text with command references for the user."""
         space_id = self.get_user_space_id(user_id)
         space_title = await self._ensure_space_title(space_id)
         return (
-            f"**Databricks Genie Help** ({VERSION}) • **Current Space:** {space_title} (`{space_id}`)\n"
+            f"**Databricks Genie Help** ({VERSION}) • "
+            f"**Current Space:** {space_title} (`{space_id}`)\n"
             "\n"
             "**Basics**\n"
             "- Type your question directly\n"
             "- `help` → show this help\n"
             "- `version` → show version\n"
-            "- `reset` → start a fresh conversation (keeps your config)\n"
+            "- `reset` → start a fresh conversation (keeps your config; long or idle "
+            "conversations also restart automatically)\n"
+            "- `export csv` / `export parquet` → download the **full** result of your last query\n"
+            "- `sql` → show the generated SQL of your last table\n"
+            "\n"
+            "**Follow-ups on your last table** (answered instantly, no new query)\n"
+            "- `show more rows` • `top 10` • `top 5 by <column>` • `sort by <column> desc`\n"
+            "- `show columns <a>, <b>` • `where <column> > 100` • "
+            "`where <column> contains <text>`\n"
             "\n"
             "**Settings** (`config ...`)\n"
             "- `config show` → display current settings (including current Genie Space)\n"
             "- `config defaults` → restore default limits\n"
             "- `config rows=100 cols=20 timeout=90 query_timeout=180` → adjust numeric limits\n"
             "- `config sql=on` → include the **generated SQL** in table replies (default: on)\n"
-            "  Fields: rows, cols/columns, chars, cell/cell_chars, timeout, query_timeout (qt), sql/sql_notes\n"
+            "- `config cards=on` → show tables as paged cards with ◀ Prev / Next ▶ buttons\n"
+            "  Fields: rows, cols/columns, chars, cell/cell_chars, timeout, query_timeout (qt), "
+            "sql/sql_notes, cards\n"
             "\n"
             "**Spaces**\n"
             "- `spaces list` → list available Genie Spaces\n"
             "- `space show` → show current Genie Space\n"
             "- `space set <space-id or title>` → switch to another Genie Space\n"
             "  _(Default remains the one in `DATABRICKS_SPACE_ID` until you switch.)_\n"
+            "- `tables` → list the tables of the current space • `tables <name>` → its columns\n"
             "\n"
             "**Conversations (in current space)**\n"
             "- `conversations list` → list your conversations in this Genie Space\n"
-            "- `messages <conversation-id> [N]` → list the last messages of a conversation (default N=3)\n"
+            "- `messages <conversation-id> [N]` → list the last messages of a conversation "
+            "(default N=3)\n"
+            "\n"
+            "**Subscriptions** (the result is sent to you only when it changed)\n"
+            "- `subscribe \"<question>\" daily 08:00` (or `weekdays 08:00`, `mon 08:00`) "
+            "→ re-ask on a schedule\n"
+            "- `subscriptions` → your subscriptions • `unsubscribe <id>` → stop one\n"
         )
 
     async def welcome_text(self, user_id: str) -> str:
-        """
-        Produce a short welcome message with onboarding hints.
-        """
+        """Produce a short welcome message with onboarding hints (built once per space)."""
         space_id = self.get_user_space_id(user_id)
-        space_title = await self._ensure_space_title(space_id)
-        return (
+        return self._welcome_for(space_id, await self._ensure_space_title(space_id))
+
+    def _welcome_for(self, space_id: str, space_title: str) -> str:
+        """Cached welcome text of a space (rebuilt when its title changes)."""
+        cached = self._welcome_cache.get(space_id)
+        if cached and cached[0] == space_title:
+            return cached[1]
+        text = (
             f"Hi! I’m Genie — your data assistant in **{space_title}**.\n"
             "- Try questions like:\n"
             "    - `Which tables do you have?`\n"
@@ -480,23 +897,17 @@ class GenieBot:
             "- Need a fresh start? Type `reset`.\n"
             "- For tips, type `help`."
         )
+        self._welcome_cache[space_id] = (space_title, text)
+        return text
 
     # -------------------- State / Settings --------------------
 
-    def get_lock(self, user_id: str) -> asyncio.Lock:
-        """
-        Obtain (or create) a per-user asyncio lock to serialize Genie calls.
-        """
-        lock = self._user_locks.get(user_id)
-        if not lock:
-            lock = asyncio.Lock()
-            self._user_locks[user_id] = lock
-        return lock
+    def get_lock(self, user_id: str) -> RefCountedLock:
+        """Obtain (or create) a per-user lock to serialize Genie calls (use with `async with`)."""
+        return self._user_locks.setdefault(user_id, RefCountedLock)
 
     def get_settings(self, user_id: str) -> UserSettings:
-        """
-        Retrieve clamped per-user settings (created on first access).
-        """
+        """Retrieve clamped per-user settings (created on first access)."""
         s = self._user_settings.get(user_id)
         if not s:
             s = UserSettings()
@@ -504,113 +915,397 @@ class GenieBot:
         return s.clamped()
 
     def apply_overrides(self, user_id: str, overrides: Dict[str, Any]) -> UserSettings:
-        """
-        Merge and clamp settings overrides, persisting back to the per-user store.
-        """
+        """Merge and clamp settings overrides, persisting back to the per-user store."""
         current = self.get_settings(user_id)
         updated = UserSettings(**{**asdict(current), **overrides}).clamped()
         self._user_settings[user_id] = updated
         return updated
 
-    def parse_config_overrides(self, text: str) -> Optional[Dict[str, Any]]:
-        """
-        Parse inline configuration tokens from a free-text command.
+    # -------------------- Rate limiting / De-dup --------------------
 
-        Recognizes number pairs, e.g.: rows=100 cols=20 query_timeout=180
-        Recognizes boolean toggles for sql/sql_notes, e.g.: sql=on
+    async def check_rate_limit(
+        self,
+        user_id: Optional[str],
+        tenant_id: Optional[str],
+        space_id: Optional[str],
+        cost: float = 1.0,
+    ) -> Optional[str]:
+        """Take `cost` tokens from the user/tenant/space/global buckets.
 
         Returns:
-            Dict of recognized overrides or {} if none; returns None if
-            the text does not look like a config command at all.
+            A user-facing "try again" message if limited, else None. The limiter
+            failing open (e.g. Redis unreachable) never blocks a request.
         """
-        if not text:
+        try:
+            decision = await LIMITER.acquire(
+                user_id=user_id, tenant_id=tenant_id, space_id=space_id, cost=cost
+            )
+        except Exception as e:
+            log_event(logging.WARNING, "rate_limit_backend_error", error=str(e))
             return None
-        if not (self.RE_CONFIG_CMD.search(text) or self.RE_PAIR_NUM.search(text) or self.RE_PAIR_BOOL.search(text)):
+        if decision.allowed:
             return None
+        retry = max(1, math.ceil(decision.retry_after))
+        log_event(
+            logging.INFO,
+            "rate_limited",
+            user_id=user_id,
+            tenant_id=tenant_id,
+            space_id=space_id,
+            level=decision.level,
+            retry_after=round(decision.retry_after, 3),
+        )
+        if decision.level == "user":
+            return f"⏱️ You're sending too fast. Try again in ~{retry}s."
+        return f"⏱️ Genie is busy ({decision.level} limit reached). Try again in ~{retry}s."
 
-        out: Dict[str, Any] = {}
-        for k, v in self.RE_PAIR_NUM.findall(text):
-            nk = self.KEYMAP_NUM.get(k.lower())
-            if nk:
-                try:
-                    out[nk] = max(1, int(v))
-                except Exception:
-                    pass
-        for _k, v in self.RE_PAIR_BOOL.findall(text):
-            val = truthy(v)
-            if val is not None:
-                out["sql_notes"] = val
-        return out if out else {}
-
-    # -------------------- Rate limiting / De-dup --------------------
-
-    def check_rate_limit(self, user_id: str) -> Optional[float]:
-        """
-        Check if the user must wait before the next request.
-
-        Returns:
-            Remaining seconds (rounded) if still rate-limited, else None.
-        """
-        now = time.monotonic()
-        nxt = self._user_next_allowed.get(user_id, 0.0)
-        if now < nxt:
-            return round(nxt - now, 2)
-        return None
-
-    def note_rate(self, user_id: str):
-        """
-        Note a request for the user to enforce the minimum interval next time.
-        """
-        self._user_next_allowed[user_id] = time.monotonic() + MIN_INTERVAL_SECONDS
+    def check_dedup(self, user_id: str, text: str) -> Optional[Dict[str, Any]]:
+        """Return the previous answer for the same text within the de-dup window.
 
-    def check_dedup(self, user_id: str, text: str) -> Optional[str]:
-        """
-        Return a previous markdown response for the same text if it was sent within
-        the de-dup window, otherwise None.
+        Returns None when there is no such answer.
+        The answer is kept in its compact form (see `ResultTable`) and rendered
+        again by the caller with the user's current limits.
         """
         norm = " ".join((text or "").split())
         h = sha256_hex(norm)
         now = time.monotonic()
         entry = self._user_dedup.get(user_id)
-        if entry and entry.get("hash") == h and (now - entry.get("ts", 0.0)) <= DEDUP_WINDOW_SECONDS:
-            return entry.get("md")
+        if (
+            entry
+            and entry.get("hash") == h
+            and (now - entry.get("ts", 0.0)) <= DEDUP_WINDOW_SECONDS
+        ):
+            return entry.get("answer")
         return None
 
-    def store_dedup(self, user_id: str, text: str, md: str):
+    def store_dedup(self, user_id: str, text: str, answer: Dict[str, Any]):
+        """Store the latest message hash and its answer for de-duplication."""
+        norm = " ".join((text or "").split())
+        self._user_dedup[user_id] = {
+            "hash": sha256_hex(norm),
+            "ts": time.monotonic(),
+            "answer": answer,
+        }
+
+    # -------------------- Idempotency --------------------
+
+    def _turn_lease(self, user_id: str) -> float:
+        """How long a running claim stays valid: the user's turn budget plus delivery slack."""
+        settings = self.get_settings(user_id)
+        return float(max(settings.timeout, settings.query_timeout) + 60)
+
+    async def claim_activity(self, activity_id: Optional[str], user_id: str) -> bool:
+        """False when the activity was already received (a channel redelivery).
+
+        Fails open: a ledger error never drops an activity.
         """
-        Store the latest message hash and rendered markdown for de-duplication.
+        if not activity_id:
+            return True
+        try:
+            return await LEDGER.claim_activity(activity_id, self._turn_lease(user_id))
+        except Exception as e:
+            log_event(logging.WARNING, "idempotency_backend_error", error=str(e))
+            return True
+
+    async def finish_activity(self, activity_id: Optional[str]):
+        """Keep a processed activity id for IDEMPOTENCY_TTL_SECONDS (redeliveries are dropped)."""
+        if not activity_id:
+            return
+        try:
+            await LEDGER.finish_activity(activity_id)
+        except Exception as e:
+            log_event(logging.WARNING, "idempotency_backend_error", error=str(e))
+
+    async def claim_question(
+        self, user_id: str, space_id: str, text: str
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Claim the user's question for this turn (see `TurnLedger.claim_question`).
+
+        A replayed answer is returned in the in-memory answer format.
         """
-        norm = " ".join((text or "").split())
-        self._user_dedup[user_id] = {"hash": sha256_hex(norm), "ts": time.monotonic(), "md": md}
+        try:
+            state, wire = await LEDGER.claim_question(
+                user_id, space_id, text, self._turn_lease(user_id)
+            )
+        except Exception as e:
+            log_event(logging.WARNING, "idempotency_backend_error", error=str(e))
+            return "new", None
+        return state, (self._answer_from_wire(wire) if wire is not None else None)
+
+    async def settle_question(
+        self, user_id: str, space_id: str, text: str, answer: Optional[Dict[str, Any]]
+    ):
+        """Mark the question done with its answer, or release it (answer None) to allow a resend."""
+        try:
+            if answer is None:
+                await LEDGER.release_question(user_id, space_id, text)
+            else:
+                await LEDGER.complete_question(
+                    user_id,
+                    space_id,
+                    text,
+                    self.answer_to_json(answer) if LEDGER.store.shared else None,
+                )
+        except Exception as e:
+            log_event(logging.WARNING, "idempotency_backend_error", error=str(e))
 
     # -------------------- Conversation --------------------
 
     def reset_conversation(self, user_id: str):
+        """Clear cached conversation and de-dup information for the user.
+
+        Also cancels the user's in-flight question (if any).
         """
-        Clear cached conversation and de-dup information for the user.
-        """
+        self._inflight.cancel(user_id, "reset")
         self._user_conversation.pop(user_id, None)
         self._user_dedup.pop(user_id, None)
+        self._last_results.pop(user_id)
 
     def get_conversation_id(self, user_id: str) -> Optional[str]:
+        """Get the current conversation id for the user (if any)."""
+        state = self._user_conversation.get(user_id)
+        return state.conversation_id if state else None
+
+    def set_conversation_id(self, user_id: str, conv_id: str):
+        """Persist the latest conversation id for the user.
+
+        Turn stats restart when the id changes.
         """
-        Get the current conversation id for the user (if any).
+        state = self._user_conversation.get(user_id)
+        if state is None or state.conversation_id != conv_id:
+            self._user_conversation[user_id] = ConversationState(conv_id)
+
+    def conversation_for_turn(self, user_id: str, question: str) -> Tuple[Optional[str], str]:
+        """Apply the rollover policy before a Genie turn.
+
+        Returns:
+            (conversation_id, question): the conversation to continue (None to
+            start a fresh one) and the text to send, which after a rollover may
+            carry a one-line summary of the previous question.
+        """
+        state = self._user_conversation.get(user_id)
+        reason = ROLLOVER_POLICY.reason(state)
+        if state is None or reason is None:
+            return (state.conversation_id if state else None), question
+        self._user_conversation.pop(user_id, None)
+        ROLLOVERS.inc(reason=reason)
+        CONVERSATION_TURNS.observe(state.turns)
+        log_event(
+            logging.INFO,
+            "conversation_rollover",
+            user_id=user_id,
+            reason=reason,
+            turns=state.turns,
+            latency_ewma_s=round(state.latency_ewma, 2),
+            conv_id=state.conversation_id,
+        )
+        return None, ROLLOVER_POLICY.carry_over(state, question)
+
+    def record_conversation_turn(self, user_id: str, question: str, latency_s: float):
+        """Count a completed Genie turn (and its latency) against the user's conversation."""
+        state = self._user_conversation.get(user_id)
+        if state is not None:
+            state.record_turn(question, latency_s)
+
+    # -------------------- Prefetch --------------------
+
+    async def prefetch_answer(self, space_id: str, question: str) -> Dict[str, Any]:
+        """Prefetch runner: ask a context-free question in a fresh conversation."""
+        answer, _ = await self.ask_genie(
+            question, space_id, None,
+            timeout_text=CALL_TIMEOUT_SECONDS_DEFAULT,
+            timeout_query=max(CALL_TIMEOUT_SECONDS_DEFAULT, 120),
+        )
+        return answer
+
+    async def prefetch_command_md(self, user_id: str, action: str, arg: str) -> str:
+        """Handle the prefetch admin commands.
+
+        Commands: `prefetch list`, `prefetch pin <question>`,
+        `prefetch unpin <question or #n>`, `prefetch run`.
         """
-        return self._user_conversation.get(user_id)
+        space_id = self.get_user_space_id(user_id)
+        action = (action or "list").lower()
+        if action == "pin":
+            if not arg:
+                return "Usage: `prefetch pin <question>`"
+            PREFETCH.pin(space_id, sha256_hex(" ".join(arg.split())), arg)
+            return f"📌 Pinned for prefetch in this space: _{arg}_"
+        if action == "unpin":
+            target = arg
+            m = re.match(r"^#?(\d+)$", arg or "")
+            if m:
+                rows = PREFETCH.describe()
+                idx = int(m.group(1)) - 1
+                if not (0 <= idx < len(rows)):
+                    return "No such entry. Use `prefetch list`."
+                space_id, target = rows[idx]["space_id"], rows[idx]["question"]
+            ok = PREFETCH.unpin(space_id, sha256_hex(" ".join((target or "").split())))
+            return "✅ Unpinned." if ok else "That question is not pinned."
+        if action == "run":
+            stats = await PREFETCH.run_cycle(reason="admin")
+            return (
+                f"🔁 Prefetch cycle done → ok={stats['ok']}, errors={stats['error']}, "
+                f"skipped (budget)={stats['skipped_budget']}"
+            )
 
-    def set_conversation_id(self, user_id: str, conv_id: str):
+        rows = PREFETCH.describe()
+        spent = PREFETCH.spent_last_hour()
+        head = (
+            f"**Prefetch** ({'enabled' if PREFETCH_ENABLED else 'disabled'}) • "
+            f"budget used last hour: {spent:.0f}/{PREFETCH_BUDGET_SECONDS_PER_HOUR:.0f}s"
+        )
+        if not rows:
+            return head + "\n\n_No questions selected yet._"
+        lines = [head, ""]
+        for i, r in enumerate(rows, 1):
+            flags = ("📌 " if r["pinned"] else "") + ("🔥 warm" if r["warm"] else "cold")
+            lines.append(
+                f"{i}. {r['question']} — score {r['score']} • {flags} • space `{r['space_id']}`"
+            )
+        return "\n".join(lines)
+
+    # -------------------- Exports --------------------
+
+    async def export_last_query(self, user_id: str, fmt: str, *, timeout: int) -> str:
+        """Return a Markdown download link (signed, expiring) for the last full result.
+
+        The user's last query is re-run with EXTERNAL_LINKS, or its complete
+        Arrow result is reused.
+        """
+        last = self._last_results.get(user_id)
+        if not last or not last.get("sql"):
+            return (
+                "Ask a question that returns a table first, "
+                "then send `export csv` or `export parquet`."
+            )
+        if not PUBLIC_BASE_URL:
+            return (
+                "⚠️ Exports are not configured (missing `PUBLIC_BASE_URL`). "
+                "Please contact your admin."
+            )
+        started = time.monotonic()
+        try:
+            if last.get("_arrow") is not None:
+                # The complete result is already in memory (Arrow path): no second query
+                f = await asyncio.to_thread(EXPORTS.export_arrow, last["_arrow"], fmt=fmt)
+            else:
+                warehouse_id = await self._space_warehouse_id(last["_space_id"])
+                if not warehouse_id:
+                    return "⚠️ Couldn't resolve the SQL warehouse of this Genie Space."
+                f = await asyncio.to_thread(
+                    EXPORTS.export_statement,
+                    self._workspace_client,
+                    sql=last["sql"],
+                    warehouse_id=warehouse_id,
+                    fmt=fmt,
+                    timeout=timeout,
+                )
+        except ExportError as e:
+            log_event(logging.WARNING, "export_failed", user_id=user_id, fmt=fmt, error=str(e))
+            return f"⚠️ {e}"
+        except Exception as e:
+            log_event(
+                logging.WARNING, "export_failed", user_id=user_id, fmt=fmt,
+                error=f"{type(e).__name__}: {e}",
+            )
+            return f"⚠️ Export failed ({type(e).__name__}). Please try again."
+        log_event(
+            logging.INFO, "export_ok", user_id=user_id, fmt=fmt, bytes=f.size, rows=f.rows,
+            duration_ms=int((time.monotonic() - started) * 1000),
+        )
+        url = PUBLIC_BASE_URL + EXPORTS.signed_path(EXPORT_MOUNT, f)
+        rows = f"{f.rows:,} rows, " if f.rows is not None else ""
+        minutes = max(1, int(EXPORT_TTL_SECONDS // 60))
+        return (
+            f"📎 [Download {f.filename}]({url}) ({rows}{f.size / 1024 / 1024:.1f} MB) • "
+            f"link expires in {minutes} min."
+        )
+
+    # -------------------- Last result / local follow-ups --------------------
+
+    def remember_result(
+        self,
+        user_id: str,
+        space_id: str,
+        conversation_id: Optional[str],
+        answer: Dict[str, Any],
+        elapsed_s: float,
+    ):
+        """Keep the user's latest tabular answer (bounded LRU/TTL).
+
+        Presentation-only follow-ups and `export` reuse it without a new
+        warehouse query.
         """
-        Persist the latest conversation id for the user.
+        if not self.has_table(answer):
+            self._last_results.pop(user_id)
+            return
+        settings = self.get_settings(user_id)
+        self._last_results.put(user_id, {
+            **answer,
+            "_space_id": space_id,
+            "_conv_id": conversation_id,
+            "_elapsed_s": elapsed_s,
+            "_view": answer["table"],
+            "_shown": min(answer["table"].num_rows, settings.rows),
+        })
+
+    def last_sql(self, user_id: str) -> str:
+        """Generated SQL of the user's latest tabular answer ('' if none)."""
+        last = self._last_results.get(user_id)
+        return ((last or {}).get("sql") or "").strip()
+
+    def try_local_followup(self, user_id: str, text: str) -> Optional[Dict[str, Any]]:
+        """Answer a presentation-only follow-up from the previous result.
+
+        Examples: "show more rows", "sort by X", "top 10", "show column X",
+        "where X > 5".
+
+        Returns:
+            An answer dict to render, or None to fall back to Genie.
         """
-        self._user_conversation[user_id] = conv_id
+        last = self._last_results.get(user_id)
+        if not last:
+            return None
+        if (
+            last.get("_space_id") != self.get_user_space_id(user_id)
+            or last.get("_conv_id") != self.get_conversation_id(user_id)
+        ):
+            self._last_results.pop(user_id)
+            return None
+
+        f = followups.parse_followup(text)
+        # Sorting or filtering a truncated result would answer from a prefix of the rows
+        if f and f.kind in ("sort", "filter") and last.get("_incomplete"):
+            f = None
+        out = None
+        if f:
+            out = followups.apply_followup(
+                last["table"], last["_view"], last["_shown"], f, self.get_settings(user_id).rows
+            )
+        if out is None:
+            FOLLOWUP_TOTAL.inc(outcome="genie")
+            return None
+
+        display, shown, view = out
+        last["_view"], last["_shown"] = view, shown
+        saved = float(last.get("_elapsed_s") or 0.0)
+        FOLLOWUP_TOTAL.inc(outcome="local")
+        FOLLOWUP_SAVED_SECONDS.inc(saved)
+        log_event(
+            logging.INFO, "followup_local", user_id=user_id, kind=f.kind, saved_s=round(saved, 2)
+        )
+        return {
+            "columns": display.schema_dict(),
+            "table": display,
+            "query_description": f"↩️ From your previous result (no new query): {f.label}.",
+        }
 
     # -------------------- Markdown rendering --------------------
 
     @staticmethod
     def _escape_cell(value: Any) -> str:
-        """
-        Escape risky characters for GitHub/Markdown tables while remaining readable.
-        """
+        """Escape risky characters for GitHub/Markdown tables while remaining readable."""
         s = "" if value is None else str(value)
         s = s.replace("|", r"\|").replace("\r", " ").replace("\n", " ")
         s = s.replace("`", "ʼ")
@@ -618,9 +1313,7 @@ class GenieBot:
 
     @staticmethod
     def _truncate_text(s: str, limit: int) -> str:
-        """
-        Truncate text to a limit, appending an ellipsis if needed.
-        """
+        """Truncate text to a limit, appending an ellipsis if needed."""
         if s is None:
             return ""
         if len(s) <= limit:
@@ -628,9 +1321,7 @@ class GenieBot:
         return s[: max(0, limit - 1)] + "…"
 
     def _fmt_cell(self, value: Any, type_name: str, cell_limit: int) -> str:
-        """
-        Format a single table cell according to type and cell length budget.
-        """
+        """Format a single table cell according to type and cell length budget."""
         t = (type_name or "").upper()
         if value is None:
             return "NULL"
@@ -644,54 +1335,70 @@ class GenieBot:
             return self._truncate_text(self._escape_cell(value), cell_limit)
 
     @staticmethod
-    def _truncate_rows(rows: List[List[Any]], max_rows: int) -> Tuple[List[List[Any]], Optional[int]]:
-        """
-        Truncate rows array to max_rows, returning (rows, hidden_count).
-        """
-        if not rows:
-            return [], None
-        if len(rows) <= max_rows:
-            return rows, None
-        return rows[:max_rows], len(rows) - max_rows
+    def _truncate_rows(table: ResultTable, max_rows: int) -> Tuple[ResultTable, Optional[int]]:
+        """Window the table to max_rows, returning (table, hidden_count). No rows are copied."""
+        if table.num_rows <= max_rows:
+            return table, None
+        return table.head(max_rows), table.num_rows - max_rows
 
     @staticmethod
-    def _limit_cols(
-        cols_meta: Any, rows: List[List[Any]], max_cols: int
-    ) -> Tuple[List[Dict[str, Any]], List[List[Any]], Optional[int]]:
-        """
-        Limit displayed columns to max_cols, returning (meta_cols, rows, hidden_count).
+    def _limit_cols(table: ResultTable, max_cols: int) -> Tuple[ResultTable, Optional[int]]:
+        """Window the table to max_cols columns, returning (table, hidden_count)."""
+        if table.num_cols <= max_cols:
+            return table, None
+        return table.window(cols=slice(0, max_cols)), table.num_cols - max_cols
+
+    @staticmethod
+    def _table_from_answer(answer_json: Dict[str, Any]) -> ResultTable:
+        """Return the answer's ResultTable.
+
+        Builds it from legacy 'columns'/'data' dicts (data_array or
+        data_typed_array) when needed.
         """
-        meta_cols = []
-        if isinstance(cols_meta, dict):
-            meta_cols = cols_meta.get("columns", []) or []
-        elif isinstance(cols_meta, list):
-            meta_cols = cols_meta
-        else:
-            meta_cols = []
+        table = answer_json.get("table")
+        if isinstance(table, ResultTable):
+            return table
+        return ResultTable.from_result_dict(
+            answer_json.get("columns") or {}, answer_json.get("data") or {}
+        )
 
-        if len(meta_cols) <= max_cols:
-            fixed_rows = [r[:len(meta_cols)] for r in rows]
-            return meta_cols, fixed_rows, None
+    @staticmethod
+    def _answer_wire(answer: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON-ready dict of an answer (ResultTable -> columns/data, private keys dropped)."""
+        out = {
+            k: v
+            for k, v in answer.items()
+            if k not in ("table", "sections") and not k.startswith("_")
+        }
+        table = answer.get("table")
+        if isinstance(table, ResultTable):
+            out["columns"] = answer.get("columns") or table.schema_dict()
+            out["data"] = table.to_result_dict()
+        if answer.get("sections"):
+            out["sections"] = [GenieBot._answer_wire(s) for s in answer["sections"]]
+        return out
 
-        kept = meta_cols[:max_cols]
-        new_rows = [r[:max_cols] for r in rows]
-        hidden = len(meta_cols) - max_cols
-        return kept, new_rows, hidden
+    @staticmethod
+    def _answer_from_wire(wire: Dict[str, Any]) -> Dict[str, Any]:
+        """Inverse of `_answer_wire`: columns/data back into a ResultTable."""
+        answer = {k: v for k, v in wire.items() if k not in ("data", "sections")}
+        if "columns" in wire and "data" in wire:
+            answer["table"] = ResultTable.from_result_dict(
+                wire.get("columns") or {}, wire.get("data") or {}
+            )
+        if wire.get("sections"):
+            answer["sections"] = [GenieBot._answer_from_wire(s) for s in wire["sections"]]
+        return answer
 
     @staticmethod
-    def _rows_from_result_dict(data_dict: Dict[str, Any]) -> List[List[Any]]:
-        """Accept both 'data_array' and 'data_typed_array' shapes."""
-        if not data_dict:
-            return []
-        if "data_array" in data_dict and isinstance(data_dict["data_array"], list):
-            return data_dict["data_array"]
-        if "data_typed_array" in data_dict and isinstance(data_dict["data_typed_array"], list):
-            rows = []
-            for row in data_dict["data_typed_array"]:
-                if isinstance(row, list):
-                    rows.append([cell.get("v") if isinstance(cell, dict) else cell for cell in row])
-            return rows
-        return data_dict.get("data_array") or []
+    def answer_to_json(answer: Dict[str, Any]) -> str:
+        r"""Serialize an answer into the JSON contract used by Copilot Studio callers.
+
+        {columns, data, query_description, sql?, message?, sections?} | {message} | {error}.
+        'sections' holds further query results of the same answer (same shape).
+        Encoded compactly (no separator whitespace, UTF-8 instead of \\u escapes).
+        """
+        return compact_json(GenieBot._answer_wire(answer))
 
     def format_genie_answer_md(
         self,
@@ -702,15 +1409,43 @@ class GenieBot:
         cell_limit: int,
         show_sql: bool,
     ) -> str:
-        """
-        Render the Genie answer JSON into Markdown.
+        """Render the Genie answer JSON into Markdown.
 
         Behavior:
-          - If 'columns' and 'data' exist, a Markdown table is produced (with truncations).
+          - If 'columns' and a 'table' (or legacy 'data' dict) exist, a Markdown table
+            is produced from zero-copy windows of the ResultTable (with truncations).
           - If 'message' exists without tabular content, a plain message is returned.
           - If 'error' exists, a warning line is returned.
-          - If SQL is available and show_sql=True, include it under 'Notes'.
+          - If SQL is available and show_sql=True, include it under 'Notes' (or, with
+            GENIE_SQL_NOTES_MODE=ondemand, a pointer to the `sql` command).
+          - Text that came with a table ('message') precedes it, and further query
+            results ('sections') follow as numbered results.
         """
+        opts = dict(
+            rows_limit=rows_limit, cols_limit=cols_limit, cell_limit=cell_limit, show_sql=show_sql
+        )
+        md = self._format_section_md(answer_json, **opts)
+        sections = answer_json.get("sections") or []
+        if not sections:
+            return md
+        total = len(sections) + 1
+        parts = [f"**Result 1 of {total}**\n\n{md}"]
+        for idx, section in enumerate(sections, 2):
+            parts.append(
+                f"---\n\n**Result {idx} of {total}**\n\n{self._format_section_md(section, **opts)}"
+            )
+        return "\n\n".join(parts)
+
+    def _format_section_md(
+        self,
+        answer_json: Dict,
+        *,
+        rows_limit: int,
+        cols_limit: int,
+        cell_limit: int,
+        show_sql: bool,
+    ) -> str:
+        """Render one answer/section (see `format_genie_answer_md`)."""
         if "error" in answer_json:
             return f"⚠️ {answer_json['error']}"
 
@@ -719,33 +1454,34 @@ class GenieBot:
         query_text = (answer_json.get("query_description") or "").strip()
         sql_text = (answer_json.get("sql") or "").strip()
 
+        tabular = "columns" in answer_json and ("table" in answer_json or "data" in answer_json)
+        if tabular and (answer_json.get("message") or "").strip():
+            parts.append(str(answer_json["message"]).strip() + "\n\n")
+
         if query_text:
             parts.append("## Query Description:\n\n")
             parts.append(query_text + "\n\n")
 
-        if "columns" in answer_json and "data" in answer_json:
-            cols_meta = (answer_json.get("columns") or {})
-            data_dict = (answer_json.get("data") or {})
-            raw_rows = self._rows_from_result_dict(data_dict)
-
-            rows, hidden_rows = self._truncate_rows(raw_rows, rows_limit)
-            meta_cols, rows, hidden_cols = self._limit_cols(cols_meta, rows, cols_limit)
+        if tabular:
+            table = self._table_from_answer(answer_json)
+            table, hidden_rows = self._truncate_rows(table, rows_limit)
+            table, hidden_cols = self._limit_cols(table, cols_limit)
+            meta_cols = table.columns
 
             parts.append("## Query Results:\n\n")
 
             if meta_cols:
-                table_lines: List[str] = []
-                headers = [c.get("name", f"col{i+1}") for i, c in enumerate(meta_cols)]
-                table_lines.append("| " + " | ".join(headers) + " |")
-                table_lines.append("|" + "|".join(["---"] * len(headers)) + "|")
-
-                for row in rows:
-                    formatted: List[str] = []
-                    for value, col in zip(row, meta_cols):
-                        formatted.append(self._fmt_cell(value, col.get("type_name") or "", cell_limit))
-                    table_lines.append("| " + " | ".join(formatted) + " |")
-
-                parts.append("\n".join(table_lines) + "\n")
+                type_names = [col.get("type_name") or "" for col in meta_cols]
+                rows = [
+                    [
+                        self._fmt_cell(value, type_name, cell_limit)
+                        for value, type_name in zip(row, type_names)
+                    ]
+                    for row in table.iter_rows()
+                ]
+                parts.append(
+                    markdown_table(table.column_names, rows, row_chars=GENIE_MD_ROW_CHARS) + "\n"
+                )
 
                 notes_bits: List[str] = []
                 if hidden_rows:
@@ -755,10 +1491,17 @@ class GenieBot:
                 if notes_bits or (show_sql and sql_text):
                     parts.append("\n### Notes:\n\n")
                     if notes_bits:
-                        parts.append("_" + " • ".join(notes_bits) + ". Refine your question to see fewer rows/columns._\n")
+                        parts.append(
+                            "_"
+                            + " • ".join(notes_bits)
+                            + ". Refine your question to see fewer rows/columns._\n"
+                        )
                         parts.append("_To see more, send: `config cols=20 rows=200` (example)._")
                     if show_sql and sql_text:
-                        parts.append(f"\n> SQL: ```{sql_text}```\n")
+                        if GENIE_SQL_NOTES_MODE == "ondemand":
+                            parts.append("\n_Send `sql` to see the generated SQL._\n")
+                        else:
+                            parts.append(f"\n> SQL: ```{sql_text}```\n")
             else:
                 parts.append("\n_No columns to display._")
 
@@ -772,9 +1515,9 @@ class GenieBot:
 
     @staticmethod
     def chunk_markdown(md: str, limit: int) -> List[str]:
-        """
-        Split a Markdown string into chunks that respect a character limit, trying
-        to break at paragraph and then line boundaries.
+        """Split a Markdown string into chunks that respect a character limit.
+
+        Breaks at paragraph and then line boundaries where possible.
         """
         if not md:
             return []
@@ -832,51 +1575,188 @@ class GenieBot:
         return chunks
 
     async def send_markdown(self, context: TurnContext, md: str, *, max_chars: int):
-        """
-        Send a potentially long Markdown response, chunked to comply with channel limits.
-        """
+        """Send a potentially long Markdown response, chunked to comply with channel limits."""
         parts = self.chunk_markdown(md, max_chars)
         total = len(parts)
+        started = time.monotonic()
+        sent = 0
         for idx, part in enumerate(parts, 1):
             suffix = f"\n\n_{idx}/{total}_" if total > 1 else ""
+            sent += len((part + suffix).encode("utf-8"))
             await context.send_activity(part + suffix)
+        if parts:
+            PAYLOAD_BYTES.observe(sent, kind="markdown")
+            DELIVERY_SECONDS.observe(time.monotonic() - started, kind="markdown")
 
-    # -------------------- Genie Calls with Retry --------------------
+    # -------------------- Adaptive Card tables --------------------
 
     @staticmethod
-    def _is_retryable_error(e: Exception) -> bool:
+    def has_table(answer: Dict[str, Any]) -> bool:
+        """True when the answer carries a non-empty ResultTable."""
+        table = answer.get("table")
+        return isinstance(table, ResultTable) and table.num_cols > 0 and table.num_rows > 0
+
+    def _render_card_page(
+        self, result_id: str, answer: Dict[str, Any], page: int, settings: UserSettings
+    ) -> Activity:
+        """Build a message activity carrying one page of a cached answer as an Adaptive Card."""
+        page_size = clamp(min(GENIE_CARD_PAGE_ROWS, settings.rows), 1, HARD_MAX_ROWS)
+        content = cards.render_table_card(
+            answer["table"],
+            result_id=result_id,
+            page=page,
+            page_size=page_size,
+            cols_limit=settings.cols,
+            fmt_cell=lambda v, t: self._fmt_cell(v, t, settings.cell_chars),
+            description=(answer.get("query_description") or "").strip(),
+            sql=(answer.get("sql") or "").strip() if settings.sql_notes else "",
+        )
+        return Activity(
+            type=ActivityTypes.message,
+            attachments=[
+                Attachment(content_type=cards.ADAPTIVE_CARD_CONTENT_TYPE, content=content)
+            ],
+        )
+
+    async def send_answer(
+        self,
+        context: TurnContext,
+        answer: Dict[str, Any],
+        settings: UserSettings,
+        *,
+        preface: str = "",
+    ):
+        """Deliver an answer to the user.
+
+        Tables go out as a paginated card when enabled, otherwise as chunked
+        Markdown. Further query results ('sections') are delivered the same way, one after another.
+        """
+        if settings.cards and self.has_table(answer):
+            lead = "\n\n".join(x for x in (preface, (answer.get("message") or "").strip()) if x)
+            if lead:
+                await context.send_activity(lead)
+            await self.send_table_card(context, answer, settings)
+            for section in answer.get("sections") or []:
+                await self.send_answer(context, section, settings)
+            return
+        md = self.format_genie_answer_md(
+            answer,
+            rows_limit=settings.rows,
+            cols_limit=settings.cols,
+            cell_limit=settings.cell_chars,
+            show_sql=settings.sql_notes,
+        )
+        await self.send_markdown(
+            context, f"{preface}\n\n{md}" if preface else md, max_chars=settings.chars
+        )
+
+    async def send_table_card(
+        self, context: TurnContext, answer: Dict[str, Any], settings: UserSettings
+    ):
+        """Cache the answer server-side and send its first page as a single card activity.
+
+        An answer too large for the card cache could not be paged, so its table
+        is sent as Markdown instead (the message was already sent by the caller).
         """
-        Heuristic to decide if an exception should trigger a retry.
+        result_id = uuid.uuid4().hex[:16]
+        if not self._result_cache.put(
+            result_id, {**answer, "_owner_conv": _bf_conversation_id(context)}
+        ):
+            md = self.format_genie_answer_md(
+                {**answer, "message": "", "sections": []},
+                rows_limit=settings.rows,
+                cols_limit=settings.cols,
+                cell_limit=settings.cell_chars,
+                show_sql=settings.sql_notes,
+            )
+            await self.send_markdown(context, md, max_chars=settings.chars)
+            return
+        activity = self._render_card_page(result_id, answer, 0, settings)
+        started = time.monotonic()
+        await context.send_activity(activity)
+        DELIVERY_SECONDS.observe(time.monotonic() - started, kind="card")
+        PAYLOAD_BYTES.observe(
+            len(compact_json(activity.attachments[0].content).encode("utf-8")), kind="card"
+        )
+
+    async def handle_page_action(self, context: TurnContext, action: Dict[str, Any]):
+        """Serve a Prev/Next action from the result cache (no Genie round trip).
+
+        Replaces the existing card in place when the channel supports updates.
         """
+        answer = self._result_cache.get(action["result_id"])
+        if not answer or answer.get("_owner_conv") != _bf_conversation_id(context):
+            await context.send_activity(
+                "⌛ This result is no longer available. Please ask the question again."
+            )
+            return
+        user_id = context.activity.from_property.id
+        page_activity = self._render_card_page(
+            action["result_id"], answer, action["page"], self.get_settings(user_id)
+        )
+        reply_to = getattr(context.activity, "reply_to_id", None)
+        if reply_to:
+            page_activity.id = reply_to
+            try:
+                await context.update_activity(page_activity)
+                return
+            except Exception as e:
+                log_event(logging.WARNING, "card_update_failed", error=f"{type(e).__name__}: {e}")
+                page_activity.id = None
+        await context.send_activity(page_activity)
+
+    # -------------------- Genie Calls with Retry --------------------
+
+    @staticmethod
+    def _is_retryable_error(e: Exception) -> bool:
+        """Heuristic to decide if an exception should trigger a retry."""
         s = f"{type(e).__name__} {str(e)}".lower()
-        non_retry_signals = ("401", "403", "unauthorized", "forbidden", "invalid schema", "bad request")
+        non_retry_signals = (
+            "401", "403", "unauthorized", "forbidden", "invalid schema", "bad request"
+        )
         return not any(sig in s for sig in non_retry_signals)
 
-    async def _with_retry(self, func: Callable[[], Any], *, retries: int, timeout: Optional[float]) -> Any:
-        """
-        Execute an async function with exponential backoff (jitter) and a timeout.
+    async def _with_retry(
+        self,
+        func: Callable[[], Any],
+        *,
+        retries: int,
+        timeout: Optional[float],
+        deadline: Optional[Deadline] = None,
+        stage: str = "",
+    ) -> Any:
+        """Execute an async function with exponential backoff (jitter) and a timeout.
 
         Args:
             func: Zero-arg async callable or wrapper returning awaitable.
             retries: Max attempts.
             timeout: Overall timeout per attempt.
+            deadline: Turn deadline; each attempt is capped to what is left and a
+                retry is skipped when its backoff plus a minimal attempt no
+                longer fits.
+            stage: Stage name for deadline metrics.
 
         Returns:
             The function's result.
 
         Raises:
+            DeadlineExceeded: No budget left for a first attempt.
             The last exception if all retries fail or a non-retryable error occurs.
         """
         last_exc: Optional[Exception] = None
         _timeout = timeout if timeout and timeout > 0 else CALL_TIMEOUT_SECONDS_DEFAULT
         for attempt in range(retries):
+            attempt_timeout = deadline.cap(_timeout, stage=stage) if deadline else _timeout
             try:
-                return await asyncio.wait_for(func(), timeout=_timeout)
+                return await asyncio.wait_for(func(), timeout=attempt_timeout)
             except Exception as e:
                 last_exc = e
                 if not self._is_retryable_error(e) or attempt == retries - 1:
                     break
                 delay = (BASE_DELAY * (2 ** attempt)) + random.uniform(0, BASE_DELAY)
+                if deadline is not None and not deadline.fits(delay):
+                    RETRIES_SKIPPED.inc()
+                    break
                 await asyncio.sleep(delay)
         if last_exc:
             raise last_exc
@@ -889,44 +1769,164 @@ class GenieBot:
         conversation_id: Optional[str],
         *,
         timeout_text: int,
-        timeout_query: int
-    ) -> Tuple[str, str]:
+        timeout_query: int,
+        turn_key: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Ask Genie under the global concurrency limit (GENIE_MAX_CONCURRENCY).
+
+        The turn is tracked (under turn_key, e.g. the user id, or a unique key)
+        so its warehouse statements are cancelled if it is abandoned: on
+        timeout, `reset`, space switch, a newer question or shutdown.
+
+        The whole turn (queueing for a slot, every stage, retry and backoff)
+        runs against one deadline: the caller's, or max(timeout_text,
+        timeout_query) from now. timeout_text still caps the Genie wait and
+        timeout_query each statement fetch.
+
+        See `_ask_genie` for the process and return value.
+
+        Raises:
+            TurnCancelled: The turn was cancelled (reset/superseded/...) before it finished.
+            DeadlineExceeded: The turn's time budget ran out.
+        """
+        if deadline is None:
+            deadline = Deadline(max(timeout_text, timeout_query))
+        turn = self._inflight.begin(turn_key or uuid.uuid4().hex, space_id)
+
+        async def _turn() -> Tuple[Dict[str, Any], str]:
+            async with self._genie_slots:
+                turn.check()
+                return await self._inflight.run(turn, self._ask_genie(
+                    question, space_id, conversation_id,
+                    timeout_text=timeout_text, timeout_query=timeout_query,
+                    turn=turn, deadline=deadline,
+                ))
+
+        try:
+            return await asyncio.wait_for(_turn(), timeout=deadline.cap(stage="queue"))
+        except DeadlineExceeded:
+            self._inflight.cancel_turn(turn, "timeout", wake=False)
+            raise
+        except asyncio.TimeoutError as e:
+            self._inflight.cancel_turn(turn, "timeout", wake=False)
+            if deadline.fits(0):
+                raise  # a stage timed out on its own limit with budget to spare
+            raise deadline.exceeded("turn") from e
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. a runPrompts item deadline)
+            self._inflight.cancel_turn(turn, "timeout", wake=False)
+            raise
+        finally:
+            self._inflight.end(turn)
+
+    def cancel_inflight(self, user_id: str, reason: str) -> bool:
+        """Cancel the user's in-flight Genie turn (if any); e.g. superseded by a newer question."""
+        return self._inflight.cancel(user_id, reason)
+
+    async def shutdown_inflight(self):
+        """Cancel every in-flight turn and its statements (process shutdown)."""
+        await self._inflight.cancel_all("shutdown")
+
+    async def ask_batch(self, items: List[Dict[str, Any]], space_id: str) -> List[Dict[str, Any]]:
+        """Run independent prompts concurrently (each in a fresh conversation).
+
+        Every item gets its own deadline and status so one slow or failing prompt
+        does not fail the batch; concurrency is bounded by `ask_genie`.
+
+        Args:
+            items: Output of `parse_batch_prompts` ({id, prompt, timeout}).
+            space_id: Genie Space to ask in.
+
+        Returns:
+            One dict per item, in input order:
+            {id, status: ok|error|timeout, response, elapsedMs, error}.
         """
-        Ask Genie a question within a space, optionally continuing a conversation.
+        async def _one(item: Dict[str, Any]) -> Dict[str, Any]:
+            started = time.monotonic()
+            out: Dict[str, Any] = {"id": item["id"], "status": "ok", "response": "", "error": ""}
+            try:
+                answer, _ = await self.ask_genie(
+                    item["prompt"], space_id, None,
+                    timeout_text=item["timeout"], timeout_query=item["timeout"],
+                    deadline=Deadline(item["timeout"]),
+                )
+                out["response"] = self.answer_to_json(answer)
+                if "error" in answer:
+                    out["status"], out["error"] = "error", str(answer["error"])
+            except asyncio.TimeoutError:
+                out["status"], out["error"] = "timeout", f"Timed out after {item['timeout']}s"
+            except Exception as ex:
+                out["status"], out["error"] = "error", f"{type(ex).__name__}: {ex}"
+            out["elapsedMs"] = int((time.monotonic() - started) * 1000)
+            return out
+
+        return list(await asyncio.gather(*(_one(it) for it in items)))
+
+    async def _ask_genie(
+        self,
+        question: str,
+        space_id: str,
+        conversation_id: Optional[str],
+        *,
+        timeout_text: int,
+        timeout_query: int,
+        turn: InFlightTurn,
+        deadline: Deadline,
+    ) -> Tuple[Dict[str, Any], str]:
+        """Ask Genie a question within a space, optionally continuing a conversation.
+
+        Every stage timeout is capped by `deadline`; once it is spent the next
+        stage raises DeadlineExceeded instead of starting.
 
         Process:
             1) Start or continue the conversation; wait for initial message.
-            2) Retrieve attachments; prefer 'query' result over plain text.
-            3) If a query is present, try StatementExecution and attachment fallbacks.
-            4) Return a JSON string payload with columns/data/sql or message/error,
-               along with the (possibly new) conversation_id.
+            2) Retrieve attachments: every 'query' attachment plus any text.
+            3) Fetch all query results concurrently (StatementExecution and
+               attachment fallbacks per attachment, see `_fetch_query_attachment`).
+            4) Return an answer dict with columns/table/sql or message/error,
+               along with the (possibly new) conversation_id. The first
+               successful query result is the answer itself; further results
+               (or failures) are in 'sections' and text next to a table is in
+               'message'. Use `answer_to_json` to obtain the JSON wire format.
 
         Returns:
-            (json_string, conversation_id)
+            (answer, conversation_id)
         """
         assert self._genie_api is not None and self._workspace_client is not None
 
         # 1) Create/continue the conversation and wait
         async def _create_waiter():
             if conversation_id is None:
-                return await asyncio.to_thread(self._genie_api.start_conversation, space_id, question)
-            return await asyncio.to_thread(self._genie_api.create_message, space_id, conversation_id, question)
+                return await asyncio.to_thread(
+                    self._genie_api.start_conversation, space_id, question
+                )
+            return await asyncio.to_thread(
+                self._genie_api.create_message, space_id, conversation_id, question
+            )
 
-        waiter = await self._with_retry(_create_waiter, retries=MAX_RETRIES, timeout=timeout_text)
+        waiter = await self._with_retry(
+            _create_waiter,
+            retries=MAX_RETRIES,
+            timeout=timeout_text,
+            deadline=deadline,
+            stage="create",
+        )
         conversation_id = waiter.conversation_id
         message_id = waiter.message_id
+        turn.conversation_id, turn.message_id = conversation_id, message_id
 
         async def _failure_detail(fallback: str) -> str:
-            """
-            Try to enrich an error with details from the failed message.
-            """
+            """Try to enrich an error with details from the failed message."""
             detail = fallback
+            if not deadline.fits(0):
+                return detail
             try:
-                failed_message = await asyncio.to_thread(
-                    self._genie_api.get_message,
-                    space_id,
-                    conversation_id,
-                    message_id,
+                failed_message = await asyncio.wait_for(
+                    asyncio.to_thread(
+                        self._genie_api.get_message, space_id, conversation_id, message_id
+                    ),
+                    timeout=deadline.cap(timeout_text, stage="failure_detail"),
                 )
                 err_obj = getattr(failed_message, "error", None)
                 err_text = getattr(err_obj, "error", None) if err_obj else None
@@ -943,17 +1943,26 @@ class GenieBot:
                 )
             return detail
 
-        wait_timeout = max(5, timeout_text)
+        wait_timeout = deadline.cap(max(5, timeout_text), stage="wait")
         try:
+            # The SDK poller may overshoot its timeout by one poll interval; the outer
+            # bound keeps the grace inside the turn budget
             initial_message = await asyncio.wait_for(
-                asyncio.to_thread(waiter.result, timeout=timedelta(seconds=wait_timeout)),
-                timeout=wait_timeout + 5,
+                asyncio.to_thread(
+                    waiter.result,
+                    timeout=timedelta(seconds=wait_timeout),
+                    callback=turn.observe_message,
+                ),
+                timeout=min(wait_timeout + 5, deadline.remaining()),
             )
         except OperationFailed as op_err:
             detail = await _failure_detail(str(op_err))
             friendly = f"Genie couldn't complete the request: {detail}"
             if DBX_HAS_OAUTH:
-                friendly += " Please verify that the Databricks service principal has access to the Genie space and underlying data."
+                friendly += (
+                    " Please verify that the Databricks service principal has access to the"
+                    " Genie space and underlying data."
+                )
             log_event(
                 logging.ERROR,
                 "genie_conversation_failed",
@@ -962,8 +1971,11 @@ class GenieBot:
                 message_id=message_id,
                 error=detail,
             )
-            return json.dumps({"error": friendly}), conversation_id
-        except asyncio.TimeoutError:
+            return {"error": friendly}, conversation_id
+        except asyncio.TimeoutError as wait_err:
+            self._inflight.cancel_turn(turn, "timeout", wake=False)
+            if not deadline.fits(0):
+                raise deadline.exceeded("wait") from wait_err
             friendly = (
                 "Genie timed out before completing the request. Try increasing your "
                 "`timeout` or `query_timeout` limits with `config timeout=120 query_timeout=300`."
@@ -975,12 +1987,15 @@ class GenieBot:
                 conversation_id=conversation_id,
                 message_id=message_id,
             )
-            return json.dumps({"error": friendly}), conversation_id
+            return {"error": friendly}, conversation_id
         except Exception as wait_err:
             detail = await _failure_detail(str(wait_err))
             friendly = f"Genie couldn't complete the request: {detail}"
             if DBX_HAS_OAUTH:
-                friendly += " Please verify that the Databricks service principal has access to the Genie space and underlying data."
+                friendly += (
+                    " Please verify that the Databricks service principal has access to the"
+                    " Genie space and underlying data."
+                )
             log_event(
                 logging.ERROR,
                 "genie_conversation_wait_failed",
@@ -989,9 +2004,10 @@ class GenieBot:
                 message_id=message_id,
                 error=str(wait_err),
             )
-            return json.dumps({"error": friendly}), conversation_id
+            return {"error": friendly}, conversation_id
 
         conversation_id = initial_message.conversation_id
+        turn.mark_message_done()
 
         # 2) Get the full message (attachments, status, etc.)
         async def _get_msg():
@@ -1001,31 +2017,126 @@ class GenieBot:
                 conversation_id,
                 initial_message.id  # legacy field still populated
             )
-        message = await self._with_retry(_get_msg, retries=MAX_RETRIES, timeout=timeout_text)
-
-        # Prefer QUERY attachments over TEXT
-        query_attachment = None
-        text_attachment = None
-        if getattr(message, "attachments", None):
-            for att in message.attachments or []:
-                if getattr(att, "query", None):
-                    query_attachment = att
-                    break
-            if not query_attachment:
-                for att in message.attachments or []:
-                    if getattr(att, "text", None) and getattr(att.text, "content", None):
-                        text_attachment = att
-                        break
+        message = await self._with_retry(
+            _get_msg,
+            retries=MAX_RETRIES,
+            timeout=timeout_text,
+            deadline=deadline,
+            stage="get_message",
+        )
+
+        # Every QUERY attachment counts (Genie may answer with several, e.g. a
+        # breakdown plus a total); TEXT attachments are kept alongside them
+        attachments = list(getattr(message, "attachments", None) or [])
+        query_atts = [att for att in attachments if getattr(att, "query", None)]
+        texts = [
+            att.text.content for att in attachments
+            if getattr(att, "text", None) and getattr(att.text, "content", None)
+        ]
 
         # Pure text only?
-        if text_attachment and not query_attachment:
-            return json.dumps({"message": text_attachment.text.content}), conversation_id
+        if texts and not query_atts:
+            return {"message": "\n\n".join(texts)}, conversation_id
 
         # Query path
-        if not query_attachment:
+        if not query_atts:
             # No attachments we can handle; fall back to message content
-            return json.dumps({"message": getattr(message, "content", "") or ""}), conversation_id
+            return {"message": getattr(message, "content", "") or ""}, conversation_id
+
+        # Fetch every query's result concurrently (bounded) under the turn deadline;
+        # a failing attachment becomes an error section instead of failing the answer
+        slots = asyncio.Semaphore(max(1, GENIE_ATTACHMENT_CONCURRENCY))
+
+        async def _bounded_fetch(att: Any) -> Dict[str, Any]:
+            async with slots:
+                return await self._fetch_query_attachment(
+                    att,
+                    space_id=space_id,
+                    conversation_id=conversation_id,
+                    message_id=initial_message.id,
+                    timeout_query=timeout_query,
+                    turn=turn,
+                    deadline=deadline,
+                )
+
+        started = time.monotonic()
+        outcomes = await asyncio.gather(
+            *(_bounded_fetch(att) for att in query_atts), return_exceptions=True
+        )
+        sections: List[Dict[str, Any]] = []
+        expired: Optional[DeadlineExceeded] = None
+        for att, outcome in zip(query_atts, outcomes):
+            if isinstance(outcome, DeadlineExceeded):
+                expired = outcome
+                outcome = {
+                    "error": "Query result unavailable (time budget exhausted). Please try again."
+                }
+            elif isinstance(outcome, Exception):
+                log_event(
+                    logging.ERROR,
+                    "genie_attachment_failed",
+                    space_id=space_id,
+                    attachment_id=getattr(att, "attachment_id", None),
+                    error=f"{type(outcome).__name__}: {outcome}",
+                )
+                outcome = {
+                    "error": f"Query result unavailable ({type(outcome).__name__}: {outcome}). "
+                    "Please try again."
+                }
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            QUERY_ATTACHMENTS.inc(outcome="error" if "error" in outcome else "ok")
+            sections.append(outcome)
+        if len(sections) > 1:
+            log_event(
+                logging.INFO,
+                "genie_attachments_fetched",
+                space_id=space_id,
+                count=len(sections),
+                failed=sum("error" in s for s in sections),
+                duration_ms=int((time.monotonic() - started) * 1000),
+            )
+
+        ok = [s for s in sections if "error" not in s]
+        if not ok and not texts and expired is not None:
+            raise expired
+        if ok:
+            primary = ok[0]
+        elif texts:
+            primary = {"message": "\n\n".join(texts)}
+        else:
+            primary = sections[0]
+        answer = dict(primary)
+        rest = [s for s in sections if s is not primary]
+        if rest:
+            answer["sections"] = rest
+        if texts and "message" not in answer:
+            answer["message"] = "\n\n".join(texts)
+        return answer, conversation_id
+
+    async def _fetch_query_attachment(
+        self,
+        query_attachment: Any,
+        *,
+        space_id: str,
+        conversation_id: str,
+        message_id: str,
+        timeout_query: int,
+        turn: InFlightTurn,
+        deadline: Deadline,
+    ) -> Dict[str, Any]:
+        """Fetch one query attachment's result.
+
+        `get_statement` and the attachment query result race (see hedge.py); the
+        re-execution of the attachment query is the last resort.
 
+        Returns:
+            A section dict ({columns, table, query_description, sql?, _arrow?})
+            or {"error": ...}.
+
+        Raises:
+            DeadlineExceeded: The turn budget ran out.
+        """
         q = query_attachment.query
         attachment_id = getattr(query_attachment, "attachment_id", None)
         query_description = getattr(q, "description", "") or ""
@@ -1034,140 +2145,200 @@ class GenieBot:
 
         async def _fetch_statement(stmt_id: str):
             return await self._with_retry(
-                lambda: asyncio.to_thread(self._workspace_client.statement_execution.get_statement, stmt_id),
+                lambda: asyncio.to_thread(
+                    self._workspace_client.statement_execution.get_statement, stmt_id
+                ),
                 retries=MAX_RETRIES,
                 timeout=timeout_query,
+                deadline=deadline,
+                stage="statement",
             )
 
+        async def _resolve(resp: Any) -> Any:
+            """A usable StatementResponse as is, else fetch it by its statement id."""
+            if self._usable_statement(resp):
+                return resp
+            stmt_id = getattr(resp, "statement_id", None)
+            return await _fetch_statement(stmt_id) if stmt_id else None
+
+        async def _via_query_result():
+            qr = await self._with_retry(
+                lambda: asyncio.to_thread(
+                    self._genie_api.get_message_attachment_query_result,
+                    space_id, conversation_id, message_id, attachment_id,
+                ),
+                retries=MAX_RETRIES, timeout=timeout_query, deadline=deadline, stage="query_result",
+            )
+            return await _resolve(getattr(qr, "statement_response", None))
+
+        async def _via_rerun():
+            rerun = await self._with_retry(
+                lambda: asyncio.to_thread(
+                    self._genie_api.execute_message_attachment_query,
+                    space_id, conversation_id, message_id, attachment_id,
+                ),
+                retries=MAX_RETRIES, timeout=timeout_query, deadline=deadline, stage="rerun",
+            )
+            resp = getattr(rerun, "statement_response", None)
+            stmt_id = getattr(resp, "statement_id", None)
+            turn.add_statement(stmt_id)
+            try:
+                return await _resolve(resp)
+            finally:
+                turn.finish_statement(stmt_id)
+
+        # Cheap paths race (the attachment query result starts after a short
+        # stagger, or at once if get_statement fails); the re-execution runs a
+        # warehouse query and only starts once both cheap paths have failed.
+        cheap: List[Tuple[str, Callable[[], Any]]] = []
+        if statement_id:
+            cheap.append(("statement", lambda: _fetch_statement(statement_id)))
+        if attachment_id:
+            cheap.append(("query_result", _via_query_result))
+        stages = [cheap] + ([[("rerun", _via_rerun)]] if attachment_id else [])
         results = None
         fetch_errors: List[str] = []
-
-        async def _safe_fetch_statement(stmt_id: str):
+        for attempts in stages:
             try:
-                return await _fetch_statement(stmt_id)
-            except Exception as stmt_err:
-                fetch_errors.append(f"{type(stmt_err).__name__}: {stmt_err}")
-                log_event(
-                    logging.WARNING,
-                    "genie_stmt_fetch_failed",
-                    space_id=space_id,
-                    statement_id=stmt_id,
-                    error=str(stmt_err),
+                _, results = await race_staggered(
+                    attempts, stagger=GENIE_FETCH_STAGGER_SECONDS, usable=self._usable_statement
                 )
-                return None
-
-        if statement_id:
-            results = await _safe_fetch_statement(statement_id)
-
-        if results is None:
-            if not attachment_id:
-                details = fetch_errors[0] if fetch_errors else "missing attachment"
-                return json.dumps({"error": f"Query result unavailable ({details}). Please try again."}), conversation_id
-
-            async def _get_qr():
-                return await asyncio.to_thread(
-                    self._genie_api.get_message_attachment_query_result,
-                    space_id,
-                    conversation_id,
-                    initial_message.id,
-                    attachment_id,
+                break
+            except RaceFailed as rf:
+                expired = next(
+                    (e for e in rf.errors.values() if isinstance(e, DeadlineExceeded)), None
                 )
-
-            try:
-                qr = await self._with_retry(_get_qr, retries=MAX_RETRIES, timeout=timeout_query)
-            except Exception as qr_err:
-                fetch_errors.append(f"{type(qr_err).__name__}: {qr_err}")
+                if expired is not None:
+                    raise expired
+                fetch_errors.append(str(rf))
                 log_event(
                     logging.WARNING,
-                    "genie_attachment_fetch_failed",
+                    "genie_result_fetch_failed",
                     space_id=space_id,
                     attachment_id=attachment_id,
-                    error=str(qr_err),
+                    statement_id=statement_id,
+                    paths=[path for path, _ in attempts],
+                    error=str(rf),
                 )
-                qr = None
-
-            stmt_resp = getattr(qr, "statement_response", None) if qr else None
-            stmt_from_qr = getattr(stmt_resp, "statement_id", None)
-
-            if stmt_from_qr:
-                results = await _safe_fetch_statement(stmt_from_qr)
-
-            if results is None:
-                async def _exec_qr():
-                    return await asyncio.to_thread(
-                        self._genie_api.execute_message_attachment_query,
-                        space_id,
-                        conversation_id,
-                        initial_message.id,
-                        attachment_id,
-                    )
-
-                try:
-                    rerun = await self._with_retry(_exec_qr, retries=MAX_RETRIES, timeout=timeout_query)
-                except Exception as rerun_err:
-                    fetch_errors.append(f"{type(rerun_err).__name__}: {rerun_err}")
-                    log_event(
-                        logging.ERROR,
-                        "genie_attachment_rerun_failed",
-                        space_id=space_id,
-                        attachment_id=attachment_id,
-                        error=str(rerun_err),
-                    )
-                    details = ", ".join(fetch_errors) if fetch_errors else "unknown error"
-                    return json.dumps({"error": f"Query result unavailable ({details}). Please try again."}), conversation_id
-
-                stmt_resp2 = getattr(rerun, "statement_response", None)
-                stmt_from_rerun = getattr(stmt_resp2, "statement_id", None)
-
-                if not stmt_from_rerun:
-                    details = ", ".join(fetch_errors) if fetch_errors else "no statement id"
-                    return json.dumps({"error": f"Query result unavailable ({details}). Please try again."}), conversation_id
-
-                results = await _safe_fetch_statement(stmt_from_rerun)
-
-                if results is None:
-                    details = ", ".join(fetch_errors) if fetch_errors else "statement fetch failed"
-                    return json.dumps({"error": f"Query result unavailable ({details}). Please try again."}), conversation_id
+        if results is None:
+            details = ", ".join(fetch_errors) if fetch_errors else "missing attachment"
+            return {"error": f"Query result unavailable ({details}). Please try again."}
 
         # Try to extract SQL text from the statement if not already found
         sql_from_stmt = None
         try:
-            sql_from_stmt = getattr(results, "statement", None) or getattr(results, "origin_body", None)
+            sql_from_stmt = (
+                getattr(results, "statement", None) or getattr(results, "origin_body", None)
+            )
         except Exception:
             sql_from_stmt = None
 
-        # Build payload (accept schema/result variants)
+        # Build payload (accept schema/result variants); rows go straight from the
+        # SDK object into a columnar ResultTable without an as_dict() copy.
         schema_dict = {}
-        data_dict = {}
         try:
             schema_dict = results.manifest.schema.as_dict()
         except Exception:
             schema = getattr(getattr(results, "manifest", None), "schema", None)
             schema_dict = schema.as_dict() if schema else {}
 
-        try:
-            data_dict = results.result.as_dict()
-        except Exception:
-            data = getattr(results, "result", None)
-            data_dict = data.as_dict() if data else {}
+        sql_final = sql_text_found or sql_from_stmt
+        table: Optional[ResultTable] = None
+        arrow_table = None
+        # The Arrow refetch is an optimisation: only start it when the budget leaves room for it
+        if sql_final and self._wants_arrow(results) and deadline.fits(ARROW_MIN_BUDGET_SECONDS):
+            fetched = await self._fetch_arrow(
+                space_id, str(sql_final), deadline.cap(timeout_query, stage="arrow"), turn
+            )
+            if fetched:
+                schema_dict, table, arrow_table = fetched
+        if table is None:
+            table = ResultTable.from_result_dict(schema_dict, getattr(results, "result", None))
 
-        payload = {
+        payload: Dict[str, Any] = {
             "columns": schema_dict,
-            "data": data_dict,
+            "table": table,
             "query_description": query_description
         }
-        sql_final = sql_text_found or sql_from_stmt
         if sql_final:
             payload["sql"] = str(sql_final)
+        if arrow_table is not None:
+            payload["_arrow"] = arrow_table  # complete result; exports reuse it
+        elif result_incomplete(results):
+            payload["_incomplete"] = True  # inline rows are a prefix: no local sort/filter/top
+
+        return payload
+
+    @staticmethod
+    def _usable_statement(statement: Any) -> bool:
+        """True for a StatementResponse that finished and carries a result manifest."""
+        if statement is None or getattr(statement, "manifest", None) is None:
+            return False
+        state = getattr(getattr(statement, "status", None), "state", None)
+        return state is None or getattr(state, "value", state) == "SUCCEEDED"
+
+    @staticmethod
+    def _wants_arrow(statement: Any) -> bool:
+        """Whether to refetch a statement's result through the Arrow path."""
+        if GENIE_ARROW_FETCH not in ("auto", "always") or not arrow_available():
+            return False
+        return GENIE_ARROW_FETCH == "always" or result_incomplete(statement)
+
+    async def _fetch_arrow(
+        self, space_id: str, sql: str, timeout: float, turn: InFlightTurn
+    ) -> Optional[Tuple[Dict[str, Any], ResultTable, Any]]:
+        """Re-run Genie's SQL with ARROW_STREAM/EXTERNAL_LINKS; None means "use the JSON result"."""
+        warehouse_id = await self._space_warehouse_id(space_id)
+        if not warehouse_id:
+            return None
+        started = time.monotonic()
+        submitted: List[str] = []
+
+        def _on_statement(statement_id: str):
+            submitted.append(statement_id)
+            turn.add_statement(statement_id)
 
-        return json.dumps(payload), conversation_id
+        try:
+            # `timeout` bounds the statement wait; the outer bound also covers the download
+            fetched = await asyncio.wait_for(
+                asyncio.to_thread(
+                    fetch_arrow_result,
+                    self._workspace_client,
+                    sql=sql,
+                    warehouse_id=warehouse_id,
+                    timeout=timeout,
+                    max_rows=GENIE_ARROW_MAX_ROWS,
+                    on_statement=_on_statement,
+                ),
+                timeout=timeout,
+            )
+        except Exception as e:
+            ARROW_FETCHES.inc(outcome="error")
+            log_event(
+                logging.WARNING,
+                "genie_arrow_fetch_failed",
+                space_id=space_id,
+                error=f"{type(e).__name__}: {e}",
+            )
+            return None
+        finally:
+            for statement_id in submitted:
+                turn.finish_statement(statement_id)
+        if fetched:
+            log_event(
+                logging.INFO,
+                "genie_arrow_fetch",
+                space_id=space_id,
+                rows=fetched[1].num_rows,
+                complete=fetched[2] is not None,
+                duration_ms=int((time.monotonic() - started) * 1000),
+            )
+        return fetched
 
     # -------------------- Space / conversations UX --------------------
 
     async def list_spaces_md(self) -> str:
-        """
-        Return a markdown list of available Genie Spaces (and cache their titles).
-        """
+        """Return a markdown list of available Genie Spaces (and cache their titles)."""
         try:
             spaces = await self._fetch_spaces()
             if not spaces:
@@ -1182,16 +2353,68 @@ class GenieBot:
         except Exception as e:
             return f"⚠️ Couldn't list spaces: {type(e).__name__}"
 
-    async def space_title(self, space_id: str) -> str:
-        """
-        Resolve a space id into its title, using local cache and API if needed.
+    # -------------------- Schema index --------------------
+
+    async def load_space_schema(self, space_id: str) -> List[TableSchema]:
+        """Schema index loader: the space's tables, described from Unity Catalog."""
+        return await asyncio.to_thread(self._load_space_schema_sync, space_id)
+
+    def _load_space_schema_sync(self, space_id: str) -> List[TableSchema]:
+        if not self._workspace_client:
+            raise RuntimeError("Databricks is not configured")
+        # The pinned SDK's GenieSpace has no table list; the serialized space does
+        res = self._workspace_client.api_client.do(
+            "GET", f"/api/2.0/genie/spaces/{space_id}", query={"include_serialized_space": "true"}
+        )
+        names = _space_table_names((res or {}).get("serialized_space"))[:SCHEMA_INDEX_MAX_TABLES]
+        tables: List[TableSchema] = []
+        for name in names:
+            try:
+                info = self._workspace_client.tables.get(name)
+            except Exception as e:
+                log_event(
+                    logging.INFO,
+                    "schema_table_unavailable",
+                    space_id=space_id,
+                    table=name,
+                    error=str(e),
+                )
+                tables.append(TableSchema(name))
+                continue
+            cols = [
+                ColumnSchema(c.name or "", c.type_text or "", c.comment or "")
+                for c in sorted(
+                    info.columns or [], key=lambda c: c.position if c.position is not None else 0
+                )
+            ]
+            tables.append(TableSchema(info.full_name or name, info.comment or "", cols))
+        return tables
+
+    def schema_answer_md(self, user_id: str, text: str) -> Optional[str]:
+        """Answer a metadata question from the schema index.
+
+        Returns None when it is not one, or the space is not indexed yet (ask Genie).
         """
+        if not SCHEMA_INDEX_ENABLED:
+            return None
+        space_id = self.get_user_space_id(user_id)
+        schema = SCHEMA.get(space_id)
+        match = match_metadata_question(text, schema) if schema else None
+        if not match:
+            return None
+        intent, table = match
+        SCHEMA_ANSWERS.inc(intent=intent)
+        if intent == "tables":
+            title = self._space_title_cache.get(space_id) or "this space"
+            return render_tables_md(schema, title)
+        return render_columns_md(table)
+
+    async def space_title(self, space_id: str) -> str:
+        """Resolve a space id into its title, using local cache and API if needed."""
         return await self._ensure_space_title(space_id)
 
     async def list_conversations_md(self, space_id: str) -> str:
-        """
-        Produce a markdown list of conversations in the given space with metadata.
-        """
+        """Produce a markdown list of conversations in the given space with metadata."""
         assert self._genie_api is not None
 
         def _list():
@@ -1209,7 +2432,7 @@ class GenieBot:
             convs = await asyncio.to_thread(_list)
             if not convs:
                 return "_No conversations found in this space._"
-            lines = [f"**Conversations in this space:**", ""]
+            lines = ["**Conversations in this space:**", ""]
             for c in convs:
                 created_str = fmt_epoch_ms_to_local(c["created"])
                 lines.append(f"- **{c['title']}**  (`{c['id']}`) • created: {created_str}")
@@ -1261,7 +2484,7 @@ class GenieBot:
                 lines.append(f"- **user** · `{uid}`:")
                 lines.append(f"> {u if u else '(empty)'}")
                 if m["assistant_replies"]:
-                    lines.append(f"- **assistant**")
+                    lines.append("- **assistant**")
                     for idx, rep in enumerate(m["assistant_replies"], 1):
                         desc = (rep.get("desc") or "").strip()
                         sql = (rep.get("sql") or "").strip() or None
@@ -1275,32 +2498,422 @@ class GenieBot:
             return f"⚠️ Couldn't list messages: {type(e).__name__}"
 
 
+# Export spool shared by the bot (writes) and the web host (signed downloads)
+EXPORTS = ExportStore(
+    EXPORT_DIR,
+    max_bytes=EXPORT_MAX_DISK_MB * 1024 * 1024,
+    max_file_bytes=EXPORT_MAX_FILE_MB * 1024 * 1024,
+    ttl_seconds=EXPORT_TTL_SECONDS,
+    signing_key=EXPORT_SIGNING_KEY,
+)
+
+# Request limiter (token buckets per user/tenant/space/global; Redis shares state across workers)
+LIMITER = TokenBucketLimiter(
+    {
+        "user": RATE_LIMIT_USER,
+        "tenant": RATE_LIMIT_TENANT,
+        "space": RATE_LIMIT_SPACE,
+        "global": RATE_LIMIT_GLOBAL,
+    },
+    store=(
+        RedisBucketStore(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_BACKEND == "redis"
+        else MemoryBucketStore()
+    ),
+)
+
+async def _deliver_proactive(msg: OutboundMessage):
+    """Send a queued message into its conversation (proactive turn)."""
+    async def _send(ctx: TurnContext):
+        if callable(msg.payload):
+            await msg.payload(ctx)  # renders into the proactive turn (e.g. send_answer)
+        else:
+            await ctx.send_activity(msg.payload)
+
+    await ADAPTER.continue_conversation(
+        BOT_APP_ID, msg.reference.get_continuation_activity(), _send
+    )
+
+
+def _outbound_failed(msg: OutboundMessage, error: BaseException):
+    """Log a proactive message the outbound worker gave up on."""
+    log_event(logging.WARNING, "outbound_failed", kind=msg.kind, key=msg.key, attempts=msg.attempts,
+              error=f"{type(error).__name__}: {error}")
+
+
+# Paced proactive delivery (welcomes, scheduled results); the worker is started by main.py
+OUTBOUND = OutboundQueue(
+    _deliver_proactive,
+    rate_per_second=OUTBOUND_RATE_PER_SECOND,
+    burst=OUTBOUND_BURST,
+    max_queue=OUTBOUND_MAX_QUEUE,
+    cooldown_seconds=WELCOME_COOLDOWN_SECONDS,
+    on_failure=_outbound_failed,
+)
+
+# Idempotency ledger (activity ids and in-flight questions)
+LEDGER = TurnLedger(
+    RedisLedgerStore(IDEMPOTENCY_REDIS_URL) if IDEMPOTENCY_BACKEND == "redis"
+    else MemoryLedgerStore(max_entries=USER_STATE_MAX_ENTRIES, max_ttl=IDEMPOTENCY_TTL_SECONDS),
+    done_ttl=IDEMPOTENCY_TTL_SECONDS,
+    replay_ttl=DEDUP_WINDOW_SECONDS,
+    max_answer_bytes=IDEMPOTENCY_MAX_ANSWER_BYTES,
+)
+
 # Singleton bot instance
 BOT = GenieBot()
 
+# Per-space schema index for local metadata answers (refresh loop started by main.py)
+SCHEMA = SchemaIndex(BOT.load_space_schema, ttl_seconds=SCHEMA_INDEX_TTL_SECONDS)
+
+
+def _deliver_subscription(
+    sub: Subscription, answer: Dict[str, Any], on_done: Callable[[bool], Any]
+) -> bool:
+    """Queue a changed subscription result for its subscriber (paced by OUTBOUND)."""
+    try:
+        reference = ConversationReference.model_validate(sub.reference)
+    except Exception as e:
+        log_event(
+            logging.WARNING,
+            "subscription_bad_reference",
+            subscription_id=sub.id,
+            user_id=sub.user_id,
+            error=str(e),
+        )
+        return False
+    settings = BOT.get_settings(sub.user_id)
+    preface = f"🔔 **{sub.question}** — updated ({sub.schedule}, `unsubscribe {sub.id}` to stop)"
+    return OUTBOUND.submit(
+        f"subscription:{sub.id}:{int(time.time())}",
+        "schedule",
+        reference,
+        lambda ctx: BOT.send_answer(ctx, answer, settings, preface=preface),
+        on_done=on_done,
+    )
+
+
+# Scheduled subscriptions (loop started by main.py when SUBSCRIPTIONS_ENABLED)
+SUBSCRIPTIONS = SubscriptionScheduler(
+    RedisSubscriptionStore(SUBSCRIPTIONS_REDIS_URL) if SUBSCRIPTIONS_BACKEND == "redis"
+    else FileSubscriptionStore(SUBSCRIPTIONS_FILE),
+    BOT.prefetch_answer,  # fresh conversation, default timeouts
+    lambda answer: result_fingerprint(GenieBot._answer_wire(answer)),
+    _deliver_subscription,
+    tz=USER_TZ,
+    max_per_user=SUBSCRIPTIONS_MAX_PER_USER,
+    concurrency=SUBSCRIPTIONS_CONCURRENCY,
+)
+
+# Popular-question prefetcher (background loop started by the web host when enabled)
+PREFETCH = PrefetchScheduler(
+    BOT.prefetch_answer,
+    top_n=PREFETCH_TOP_N,
+    interval_seconds=PREFETCH_INTERVAL_SECONDS,
+    peak_times=PREFETCH_PEAK_TIMES,
+    tz=USER_TZ,
+    result_ttl_seconds=PREFETCH_RESULT_TTL_SECONDS,
+    budget_seconds_per_hour=PREFETCH_BUDGET_SECONDS_PER_HOUR,
+)
+REGISTRY.gauge(
+    "genie_prefetch_budget_used_seconds", "Prefetch seconds spent in the rolling last hour."
+).set_function(PREFETCH.spent_last_hour)
+
+# ------------------------------------------------------------------------------
+# Chat commands (registered on the first-token dispatch table)
+# ------------------------------------------------------------------------------
+
+@COMMANDS.command("version", exact=True)
+async def _cmd_version(context: TurnContext, user_id: str, args: CommandArgs):
+    """`version`."""
+    await context.send_activity(f"Running on version {VERSION}")
+
+
+@COMMANDS.command("help", "/help", exact=True)
+async def _cmd_help(context: TurnContext, user_id: str, args: CommandArgs):
+    """`help`."""
+    await context.send_activity(await BOT.help_text(user_id))
+
+
+@COMMANDS.command("space", parse=parse_space, before_inline_settings=True)
+async def _cmd_space(context: TurnContext, user_id: str, args: CommandArgs):
+    """`space show` | `space set <space-id or title>`."""
+    if args.action == "show":
+        sid = BOT.get_user_space_id(user_id)
+        title = await BOT.space_title(sid)
+        await context.send_activity(f"**Current Genie Space:** {title} (`{sid}`)")
+        return
+    if args.action == "set":
+        wanted = args.value
+        spaces = await BOT._fetch_spaces()
+        chosen = None
+        for s in spaces:
+            if s["id"] == wanted:
+                chosen = s
+                break
+        if not chosen:
+            wl = wanted.lower()
+            for s in spaces:
+                if (s["title"] or "").lower() == wl:
+                    chosen = s
+                    break
+        if not chosen:
+            await context.send_activity(
+                f"Space `{wanted}` not found. Use `spaces list` to see options."
+            )
+            return
+        BOT.set_user_space_id(user_id, chosen["id"])
+        BOT._space_title_cache[chosen["id"]] = chosen["title"]
+        await context.send_activity(
+            f"✅ Switched to **{chosen['title']}** (`{chosen['id']}`). "
+            "Conversation context cleared."
+        )
+        return
+    await context.send_activity("Use `space show` or `space set <space-id or title>`.")
+
+
+@COMMANDS.command("spaces", parse=parse_list, before_inline_settings=True)
+async def _cmd_spaces(context: TurnContext, user_id: str, args: CommandArgs):
+    """`spaces list`."""
+    if args.action == "list":
+        await context.send_activity(await BOT.list_spaces_md())
+        return
+    await context.send_activity("Try `spaces list`.")
+
+
+@COMMANDS.command("conversations", "conversation", parse=parse_list, before_inline_settings=True)
+async def _cmd_conversations(context: TurnContext, user_id: str, args: CommandArgs):
+    """`conversations list`."""
+    if args.action == "list":
+        sid = BOT.get_user_space_id(user_id)
+        await context.send_activity(await BOT.list_conversations_md(sid))
+        return
+    await context.send_activity("Try `conversations list`.")
+
+
+@COMMANDS.command("messages", "message", parse=parse_messages, before_inline_settings=True)
+async def _cmd_messages(context: TurnContext, user_id: str, args: CommandArgs):
+    """`messages <conversation-id> [N]` (N defaults to 3)."""
+    if not args.value:
+        await context.send_activity("Usage: `messages <conversation-id> [N]`")
+        return
+    sid = BOT.get_user_space_id(user_id)
+    await context.send_activity(await BOT.list_messages_md(sid, args.value, limit=args.limit or 3))
+
+
+@COMMANDS.command("config", "settings", "setting", "set", parse=parse_config, inline_settings=True)
+async def _cmd_config(context: TurnContext, user_id: str, args: CommandArgs):
+    """`config show` | `config defaults` | `config rows=.. cols=.. ...` (or inline `key=value`)."""
+    sid = BOT.get_user_space_id(user_id)
+    title = await BOT.space_title(sid)
+    if args.action == "defaults":
+        BOT._user_settings[user_id] = UserSettings()
+        await context.send_activity("✅ Defaults restored.")
+        await context.send_activity(BOT.get_settings(user_id).pretty(title, sid))
+        return
+    if args.action == "set":
+        s = BOT.apply_overrides(user_id, args.overrides)
+        await context.send_activity("✅ Settings updated.")
+        await context.send_activity(s.pretty(title, sid))
+        return
+    await context.send_activity(BOT.get_settings(user_id).pretty(title, sid))
+    if args.action == "help":
+        await context.send_activity(
+            "To adjust: `config rows=100 cols=20 timeout=90 query_timeout=180 sql=on` • "
+            "Fields: rows, cols/columns, chars, cell/cell_chars, timeout, query_timeout (qt), "
+            "sql/sql_notes, cards"
+        )
+
+
+@COMMANDS.command(
+    "tables", parse=lambda a: parse_tables(a, known=SCHEMA.knows_table), before_inline_settings=True
+)
+async def _cmd_tables(context: TurnContext, user_id: str, args: CommandArgs):
+    """`tables` | `tables <name>` (from the schema index)."""
+    space_id = BOT.get_user_space_id(user_id)
+    schema = SCHEMA.get(space_id) if BOT.is_enabled() else None
+    if schema is None and BOT.is_enabled():
+        schema = await SCHEMA.refresh(space_id)
+    if not schema or not schema.tables:
+        await context.send_activity(
+            "No table metadata is available for this space yet. "
+            "Ask Genie: _Which tables do you have?_"
+        )
+        return
+    if not args.value:
+        SCHEMA_ANSWERS.inc(intent="tables")
+        await context.send_activity(render_tables_md(schema, await BOT.space_title(space_id)))
+        return
+    table = schema.find(args.value)
+    if table is None:
+        await context.send_activity(
+            f"No table named `{args.value}` in this space. Type `tables` to list them."
+        )
+        return
+    SCHEMA_ANSWERS.inc(intent="columns")
+    await context.send_activity(render_columns_md(table))
+
+
+@COMMANDS.command("subscriptions", "/subscriptions", exact=True)
+async def _cmd_subscriptions(context: TurnContext, user_id: str, args: CommandArgs):
+    """`subscriptions`."""
+    if not SUBSCRIPTIONS_ENABLED:
+        await context.send_activity(
+            "Subscriptions are not available: proactive messaging is not configured."
+        )
+        return
+    subs = await SUBSCRIPTIONS.list_for(user_id)
+    if not subs:
+        await context.send_activity(
+            'You have no subscriptions. Try `subscribe "<question>" daily 08:00`.'
+        )
+        return
+    lines = [f"**Your subscriptions** (times in {USER_TZ.key})"]
+    for sub in subs:
+        next_at = datetime.fromtimestamp(sub.next_run, USER_TZ).strftime("%a %d/%m %H:%M")
+        lines.append(f"- `{sub.id}` • {sub.schedule} • _{sub.question}_ • next: {next_at}")
+    await context.send_activity("\n".join(lines))
+
+
+@COMMANDS.command("subscribe", parse=parse_subscribe, before_inline_settings=True)
+async def _cmd_subscribe(context: TurnContext, user_id: str, args: CommandArgs):
+    """`subscribe "<question>" daily 08:00`."""
+    if not SUBSCRIPTIONS_ENABLED:
+        await context.send_activity(
+            "Subscriptions are not available: proactive messaging is not configured."
+        )
+        return
+    try:
+        schedule = Schedule.parse(args.when)
+        sub = await SUBSCRIPTIONS.add(
+            user_id,
+            BOT.get_user_space_id(user_id),
+            args.value,
+            schedule,
+            context.activity.get_conversation_reference().model_dump(
+                mode="json", by_alias=True, exclude_none=True
+            ),
+        )
+    except ValueError as e:
+        await context.send_activity(f"⚠️ Cannot subscribe: {e}.")
+        return
+    next_at = datetime.fromtimestamp(sub.next_run, USER_TZ).strftime("%a %d/%m %H:%M")
+    await context.send_activity(
+        f"🔔 Subscribed (`{sub.id}`): _{sub.question}_ • {sub.schedule} ({USER_TZ.key}). "
+        f"First run: {next_at}; afterwards you only hear back when the result changes."
+    )
+
+
+@COMMANDS.command("unsubscribe", parse=parse_unsubscribe, before_inline_settings=True)
+async def _cmd_unsubscribe(context: TurnContext, user_id: str, args: CommandArgs):
+    """`unsubscribe <id>`."""
+    if await SUBSCRIPTIONS.remove(user_id, args.value):
+        await context.send_activity(f"🔕 Unsubscribed `{args.value}`.")
+    else:
+        await context.send_activity(
+            f"No subscription `{args.value}`. Type `subscriptions` to list yours."
+        )
+
+
+@COMMANDS.command("prefetch", parse=parse_prefetch)
+async def _cmd_prefetch(context: TurnContext, user_id: str, args: CommandArgs):
+    """`prefetch [list|pin|unpin|run] ...` (admins only)."""
+    if not _is_admin(context.activity):
+        await context.send_activity("⛔ `prefetch` commands are restricted to admins.")
+        return
+    await context.send_activity(await BOT.prefetch_command_md(user_id, args.action, args.value))
+
+
+@COMMANDS.command("export", parse=parse_export)
+async def _cmd_export(context: TurnContext, user_id: str, args: CommandArgs):
+    """`export csv` | `export parquet`."""
+    fmt = args.value
+    if fmt not in EXPORT_FORMATS:
+        await context.send_activity("Usage: `export csv` or `export parquet`")
+        return
+    if not BOT.is_enabled():
+        await context.send_activity(BOT.health_summary())
+        return
+    async with BOT.get_lock(user_id):
+        await context.send_activity(f"⏳ Preparing your {fmt.upper()} export…")
+        md = await BOT.export_last_query(
+            user_id, fmt, timeout=BOT.get_settings(user_id).query_timeout
+        )
+    await context.send_activity(md)
+
+
+@COMMANDS.command("sql", "/sql", "show sql", exact=True)
+async def _cmd_sql(context: TurnContext, user_id: str, args: CommandArgs):
+    """`sql` → generated SQL of the last table answer."""
+    sql_text = BOT.last_sql(user_id)
+    if not sql_text:
+        await context.send_activity("No SQL available for your last answer.")
+        return
+    await context.send_activity(f"```sql\n{sql_text}\n```")
+
+
+@COMMANDS.command(
+    "reset", "/reset", "restart", "/restart", "clear", "/clear", "start", "/start",
+    parse=parse_reset,
+)
+async def _cmd_reset(context: TurnContext, user_id: str, args: CommandArgs):
+    """`reset` | `restart` | `clear` | `start over`."""
+    BOT.reset_conversation(user_id)
+    await context.send_activity("🔄 New conversation started. Send your next question.")
+
+
 # ------------------------------------------------------------------------------
 # Handlers (Microsoft Agents decorators)
 # ------------------------------------------------------------------------------
 
 @AGENT_APP.conversation_update("membersAdded")
 async def on_members_added(context: TurnContext, _state: TurnState):
-    """
-    Welcome flow for new members added to the conversation.
+    """Welcome flow for new members added to the conversation.
 
     Skips sending a welcome when invoked as a Skill (to avoid duplicate greetings).
+
+    Welcomes go through the paced outbound queue (OUTBOUND_ENABLED), at most
+    one per conversation per WELCOME_COOLDOWN_SECONDS. In channels and group
+    chats, additions of more than WELCOME_CHANNEL_MAX_MEMBERS members are not
+    welcomed (installing the bot itself still is).
     """
-    if _is_skill_invocation(context.activity):
+    activity = context.activity
+    if _is_skill_invocation(activity):
         return  # avoid welcome messages in skill conversations
-    msg = await BOT.welcome_text(context.activity.from_property.id)
-    if not (DBX_ENABLED and BOT._genie_api and BOT._workspace_client):
+
+    conv_type = (
+        getattr(getattr(activity, "conversation", None), "conversation_type", None) or "personal"
+    ).lower()
+    bot_id = getattr(getattr(activity, "recipient", None), "id", None)
+    added = list(getattr(activity, "members_added", None) or [])
+    bot_added = any(getattr(m, "id", None) == bot_id for m in added)
+    members = sum(1 for m in added if getattr(m, "id", None) != bot_id)
+    if conv_type != "personal" and not bot_added and members > WELCOME_CHANNEL_MAX_MEMBERS:
+        log_event(
+            logging.INFO,
+            "welcome_skipped",
+            conv_id=_bf_conversation_id(context),
+            conv_type=conv_type,
+            members=members,
+        )
+        return
+
+    msg = await BOT.welcome_text(activity.from_property.id)
+    if not BOT.is_enabled():
         msg += "\n\n⚠️ Note: the data connection isn’t set up yet. Please contact your admin."
-    await context.send_activity(msg)
+    if not OUTBOUND_ENABLED:
+        await context.send_activity(msg)
+        return
+    OUTBOUND.submit(
+        f"welcome:{_bf_conversation_id(context)}",
+        "welcome",
+        activity.get_conversation_reference(),
+        msg,
+    )
 
 
 @AGENT_APP.activity("message")
 async def on_message(context: TurnContext, _state: TurnState):
-    """
-    Core message handler for free-form prompts and control commands.
+    """Core message handler for free-form prompts and control commands.
 
     Supported commands (case-insensitive):
       - version
@@ -1309,14 +2922,41 @@ async def on_message(context: TurnContext, _state: TurnState):
       - spaces list
       - conversations list
       - messages <conversation-id> [N]
-      - config show | config defaults | config rows=.. cols=.. timeout=.. query_timeout=.. sql=on/off
+      - tables [name]
+      - subscribe "<question>" daily HH:MM | subscriptions | unsubscribe <id>
+      - config show | config defaults
+      - config rows=.. cols=.. timeout=.. query_timeout=.. sql=on/off cards=on/off
+      - export csv | export parquet
+      - sql
       - reset | restart | clear | start over
 
     Otherwise, forwards the text to Genie in the selected space.
+
+    Channel redeliveries of an activity already received are dropped, and a
+    double-sent question attaches to the turn already running it.
     """
     # Do not generate a free-form reply when acting as a Skill
     if _is_skill_invocation(context.activity):
         return
+
+    activity_id = getattr(context.activity, "id", None)
+    if not await BOT.claim_activity(activity_id, context.activity.from_property.id):
+        log_event(logging.INFO, "activity_redelivery_dropped", correlation_id=activity_id)
+        return
+    try:
+        await _handle_message(context)
+    finally:
+        await BOT.finish_activity(activity_id)
+
+
+async def _handle_message(context: TurnContext):
+    """Process a message activity received for the first time (see `on_message`)."""
+    # Adaptive Card pagination (Action.Submit) is served from the result cache
+    page_action = cards.parse_page_action(getattr(context.activity, "value", None))
+    if page_action:
+        await BOT.handle_page_action(context, page_action)
+        return
+
     text = (context.activity.text or "").strip()
     if not text:
         await context.send_activity("Send a message to get started. 🙂")
@@ -1327,183 +2967,185 @@ async def on_message(context: TurnContext, _state: TurnState):
     conv_id_bf = getattr(getattr(context.activity, "conversation", None), "id", "") or ""
 
     text_hash = sha256_hex(" ".join(text.split()))
-    log_event(logging.INFO, "msg_received", user_id=user_id, correlation_id=corr_id, conv_id=conv_id_bf, text_hash=text_hash)
-
-    lower = text.lower()
-
-    # Basic utility commands
-    if lower == "version":
-        await context.send_activity(f"Running on version {VERSION}")
-        return
+    log_event(
+        logging.INFO,
+        "msg_received",
+        user_id=user_id,
+        correlation_id=corr_id,
+        conv_id=conv_id_bf,
+        text_hash=text_hash,
+    )
 
-    if lower in ("help", "/help"):
-        await context.send_activity(await BOT.help_text(user_id))
+    # Chat commands (first-token dispatch; see src/commands.py)
+    resolved = COMMANDS.resolve(text)
+    if resolved:
+        command, args = resolved
+        await command.handler(context, user_id, args)
         return
 
-    # ----- Space (singular) management FIRST -----
-    if GenieBot.RE_SPACE.match(text):
-        if re.search(r"\bshow\b", text, flags=re.I):
-            sid = BOT.get_user_space_id(user_id)
-            title = await BOT.space_title(sid)
-            await context.send_activity(f"**Current Genie Space:** {title} (`{sid}`)")
-            return
-        m = re.search(r"\bset\b\s+(.+)$", text, flags=re.I)
-        if m:
-            wanted = m.group(1).strip()
-            spaces = await BOT._fetch_spaces()
-            chosen = None
-            for s in spaces:
-                if s["id"] == wanted:
-                    chosen = s
-                    break
-            if not chosen:
-                wl = wanted.lower()
-                for s in spaces:
-                    if (s["title"] or "").lower() == wl:
-                        chosen = s
-                        break
-            if not chosen:
-                await context.send_activity(f"Space `{wanted}` not found. Use `spaces list` to see options.")
-                return
-            BOT.set_user_space_id(user_id, chosen["id"])
-            BOT._space_title_cache[chosen["id"]] = chosen["title"]
-            await context.send_activity(f"✅ Switched to **{chosen['title']}** (`{chosen['id']}`). Conversation context cleared.")
-            return
-        await context.send_activity("Use `space show` or `space set <space-id or title>`.")
+    # Presentation-only follow-ups are answered from the previous result
+    local_answer = BOT.try_local_followup(user_id, text)
+    if local_answer:
+        await BOT.send_answer(context, local_answer, BOT.get_settings(user_id))
         return
 
-    # Spaces (plural)
-    if GenieBot.RE_SPACES.match(text):
-        if re.search(r"\blist\b", text, flags=re.I):
-            md = await BOT.list_spaces_md()
-            await context.send_activity(md)
-            return
-        await context.send_activity("Try `spaces list`.")
+    # Health
+    if not BOT.is_enabled():
+        await context.send_activity(BOT.health_summary())
         return
 
-    # Conversations listing
-    if GenieBot.RE_CONVERSATIONS.match(text):
-        if re.search(r"\blist\b", text, flags=re.I):
-            sid = BOT.get_user_space_id(user_id)
-            md = await BOT.list_conversations_md(sid)
-            await context.send_activity(md)
-            return
-        await context.send_activity("Try `conversations list`.")
+    # Metadata questions ("which tables do you have?") are answered from the schema index
+    schema_answer = BOT.schema_answer_md(user_id, text)
+    if schema_answer:
+        log_event(logging.INFO, "schema_index_answer", user_id=user_id, correlation_id=corr_id)
+        await context.send_activity(schema_answer)
         return
 
-    # Messages listing for a conversation: supports optional limit (default 3)
-    if GenieBot.RE_MESSAGES.match(text):
-        m = re.search(r"messages?\s+([A-Za-z0-9\-\_]+)(?:\s+(\d+))?", text, flags=re.I)
-        if not m:
-            await context.send_activity("Usage: `messages <conversation-id> [N]`")
-            return
-        conv_id = m.group(1)
-        try:
-            limit = int(m.group(2)) if m.group(2) else 3
-        except Exception:
-            limit = 3
-        limit = max(1, min(limit, 20))
-        sid = BOT.get_user_space_id(user_id)
-        md = await BOT.list_messages_md(sid, conv_id, limit=limit)
-        await context.send_activity(md)
+    # De-duplication
+    cached_answer = BOT.check_dedup(user_id, text)
+    if cached_answer:
+        await BOT.send_answer(
+            context,
+            cached_answer,
+            BOT.get_settings(user_id),
+            preface=(
+                "↩️ Reusing previous response "
+                f"(duplicate message within {int(DEDUP_WINDOW_SECONDS)}s):"
+            ),
+        )
         return
 
-    # Settings / config
-    if GenieBot.RE_CONFIG_CMD.match(text) or BOT.parse_config_overrides(text):
-        if re.search(r"\bdefaults\b", text, flags=re.I):
-            BOT._user_settings[user_id] = UserSettings()
-            sid = BOT.get_user_space_id(user_id)
-            title = await BOT.space_title(sid)
-            await context.send_activity("✅ Defaults restored.")
-            await context.send_activity(BOT.get_settings(user_id).pretty(title, sid))
-            return
-        if re.search(r"\bshow\b", text, flags=re.I):
-            sid = BOT.get_user_space_id(user_id)
-            title = await BOT.space_title(sid)
-            await context.send_activity(BOT.get_settings(user_id).pretty(title, sid))
-            return
-
-        overrides = BOT.parse_config_overrides(text) or {}
-        if overrides:
-            s = BOT.apply_overrides(user_id, overrides)
-            sid = BOT.get_user_space_id(user_id)
-            title = await BOT.space_title(sid)
-            await context.send_activity("✅ Settings updated.")
-            await context.send_activity(s.pretty(title, sid))
-        else:
-            sid = BOT.get_user_space_id(user_id)
-            title = await BOT.space_title(sid)
-            await context.send_activity(BOT.get_settings(user_id).pretty(title, sid))
-            await context.send_activity(
-                "To adjust: `config rows=100 cols=20 timeout=90 query_timeout=180 sql=on` • "
-                "Fields: rows, cols/columns, chars, cell/cell_chars, timeout, query_timeout (qt), sql/sql_notes"
+    # Context-free questions (fresh conversation) may already be warm from prefetching
+    if BOT.get_conversation_id(user_id) is None:
+        space_id = BOT.get_user_space_id(user_id)
+        warm = None
+        if PREFETCH_ENABLED:
+            PREFETCH.observe(space_id, text_hash, text)
+            warm = PREFETCH.lookup(space_id, text_hash)
+        if warm:
+            settings = BOT.get_settings(user_id)
+            BOT.store_dedup(user_id, text, warm)
+            BOT.remember_result(user_id, space_id, None, warm, 0.0)
+            as_of = datetime.fromtimestamp(warm.get("_prefetched_at") or time.time(), tz=USER_TZ)
+            await BOT.send_answer(
+                context,
+                warm,
+                settings,
+                preface=(
+                    f"⚡ Prepared answer as of {as_of:%Y-%m-%d %H:%M} "
+                    "(cached; data loaded since then is not included):"
+                ),
             )
-        return
+            log_event(
+                logging.INFO,
+                "genie_prefetch_hit",
+                user_id=user_id,
+                correlation_id=corr_id,
+                space_id=space_id,
+            )
+            return
 
-    # Reset conversation
-    if GenieBot.RE_RESET.match(text):
-        BOT.reset_conversation(user_id)
-        await context.send_activity("🔄 New conversation started. Send your next question.")
+    # The same question sent again while it runs attaches to that turn (no new
+    # Genie work, and it does not supersede it); one that just finished on
+    # another worker is replayed from the shared ledger. The claim is keyed by
+    # the space the question was asked in, so a `space` switch never replays
+    # another space's answer
+    asked_space = BOT.get_user_space_id(user_id)
+    claim, replayed = await BOT.claim_question(user_id, asked_space, text)
+    if claim == "running":
+        log_event(logging.INFO, "genie_duplicate_attached", user_id=user_id, correlation_id=corr_id)
+        await context.send_activity(
+            "⏳ Still working on that question; the answer will arrive here."
+        )
         return
-
-    # Health
-    if not (DBX_ENABLED and BOT._genie_api and BOT._workspace_client):
-        await context.send_activity(BOT.health_summary())
+    if claim == "replay" and replayed is not None:
+        await BOT.send_answer(
+            context,
+            replayed,
+            BOT.get_settings(user_id),
+            preface=(
+                "↩️ Reusing previous response "
+                f"(duplicate message within {int(LEDGER.replay_ttl)}s):"
+            ),
+        )
         return
 
-    # Rate limit
-    remaining = BOT.check_rate_limit(user_id)
-    if remaining is not None:
-        await context.send_activity(f"⏱️ You're sending too fast. Try again in ~{remaining}s.")
+    # Rate limit (only turns that reach Genie spend tokens)
+    limited = await BOT.check_rate_limit(user_id, _tenant_id(context.activity), asked_space)
+    if limited:
+        await BOT.settle_question(user_id, asked_space, text, None)
+        await context.send_activity(limited)
         return
 
-    # De-duplication
-    cached_md = BOT.check_dedup(user_id, text)
-    if cached_md:
-        await BOT.send_markdown(
-            context,
-            f"↩️ Reusing previous response (duplicate message within {int(DEDUP_WINDOW_SECONDS)}s):\n\n{cached_md}",
-            max_chars=BOT.get_settings(user_id).chars
-        )
-        return
+    # A newer question supersedes the user's pending one (its statements are cancelled)
+    if BOT.cancel_inflight(user_id, "superseded"):
+        log_event(logging.INFO, "genie_superseded", user_id=user_id, correlation_id=corr_id)
 
     # Call Genie
+    answer: Optional[Dict[str, Any]] = None
     async with BOT.get_lock(user_id):
-        BOT.note_rate(user_id)
         question = text
         settings = BOT.get_settings(user_id)
         space_id = BOT.get_user_space_id(user_id)
 
         start_ts = time.time()
         try:
-            answer_json_str, new_conv = await BOT.ask_genie(
-                question,
+            conv_id, prompt = BOT.conversation_for_turn(user_id, question)
+            answer, new_conv = await BOT.ask_genie(
+                prompt,
                 space_id,
-                BOT.get_conversation_id(user_id),
+                conv_id,
                 timeout_text=settings.timeout,
-                timeout_query=settings.query_timeout
+                timeout_query=settings.query_timeout,
+                turn_key=user_id,
             )
             if new_conv:
                 BOT.set_conversation_id(user_id, new_conv)
+                BOT.record_conversation_turn(user_id, question, time.time() - start_ts)
 
-            try:
-                parsed = json.loads(answer_json_str)
-            except Exception:
-                parsed = {"message": answer_json_str}
-
-            md = BOT.format_genie_answer_md(
-                parsed,
-                rows_limit=settings.rows,
-                cols_limit=settings.cols,
-                cell_limit=settings.cell_chars,
-                show_sql=settings.sql_notes,
-            )
-
-            BOT.store_dedup(user_id, text, md)
-            await BOT.send_markdown(context, md, max_chars=settings.chars)
+            BOT.store_dedup(user_id, text, answer)
+            await BOT.settle_question(user_id, asked_space, text, answer)
+            BOT.remember_result(user_id, space_id, new_conv, answer, time.time() - start_ts)
+            await BOT.send_answer(context, answer, settings)
 
             dur_ms = int((time.time() - start_ts) * 1000)
-            log_event(logging.INFO, "genie_ok", user_id=user_id, correlation_id=corr_id, conv_id=new_conv, duration_ms=dur_ms, space_id=space_id)
+            log_event(
+                logging.INFO,
+                "genie_ok",
+                user_id=user_id,
+                correlation_id=corr_id,
+                conv_id=new_conv,
+                duration_ms=dur_ms,
+                space_id=space_id,
+            )
+        except TurnCancelled as tc:
+            log_event(
+                logging.INFO,
+                "genie_cancelled",
+                user_id=user_id,
+                correlation_id=corr_id,
+                reason=tc.reason,
+                duration_ms=int((time.time() - start_ts) * 1000),
+            )
+            if tc.reason == "superseded":
+                await context.send_activity(
+                    "⏭️ Skipped your previous question to answer the newer one."
+                )
+        except DeadlineExceeded as de:
+            log_event(
+                logging.WARNING,
+                "genie_deadline_exceeded",
+                user_id=user_id,
+                correlation_id=corr_id,
+                stage=de.stage,
+                budget_s=de.budget,
+                duration_ms=int((time.time() - start_ts) * 1000),
+            )
+            await context.send_activity(
+                f"⏱️ Genie didn't finish within {de.budget:g}s. Try a more specific question, "
+                "or raise the limit with `config query_timeout=300` "
+                "(`timeout` caps the wait for Genie's reply)."
+            )
         except Exception as e:
             error_id = str(uuid.uuid4())[:8]
             dur_ms = int((time.time() - start_ts) * 1000)
@@ -1525,20 +3167,31 @@ async def on_message(context: TurnContext, _state: TurnState):
             await context.send_activity(
                 f"⚠️ Sorry, I couldn't process that (error `{error_id}`).\n{hint}"
             )
+        finally:
+            if answer is None:
+                # No answer: a resend of the question runs again
+                await BOT.settle_question(user_id, asked_space, text, None)
 
 
 @AGENT_APP.activity("event")
 async def on_event(context: TurnContext, _state: TurnState):
-    """
-    Handle Copilot Studio 'runPrompt' events.
+    """Handle Copilot Studio 'runPrompt' and 'runPrompts' events.
 
     Contract:
       - Always return an EndOfConversation activity with a payload containing
         at least: response, traceId, elapsedMs, status, error (even if empty).
       - On success: status='ok', error=''
       - On error: status='error', error='<message>'
+      - runPrompts additionally returns 'responses' (one entry per prompt with
+        id/status/response/elapsedMs/error); 'response' holds the same list as
+        a JSON string and status may be 'partial'.
+      - Callers sending `acceptEncoding: "gzip"` may get 'response' as base64
+        gzip; 'responseEncoding' is then "gzip+base64" (otherwise "").
+      - runPrompt honours an optional `timeoutSeconds` (the caller's budget,
+        default GENIE_TIMEOUT): the whole turn finishes or fails within it.
     """
-    if (getattr(context.activity, "name", "") or "").lower() != "runprompt":
+    name = (getattr(context.activity, "name", "") or "").lower()
+    if name not in ("runprompt", "runprompts"):
         return
 
     trace_id = str(uuid.uuid4())
@@ -1549,13 +3202,17 @@ async def on_event(context: TurnContext, _state: TurnState):
 
     # ✅ Always include all fields required by Copilot Studio output binding
     def _end_of_conversation(value: Dict[str, Any], code: EndOfConversationCodes) -> Activity:
-        """
-        Build an EndOfConversation activity with a payload that ALWAYS includes:
-          response, traceId, elapsedMs, status, error
+        """Build an EndOfConversation activity for a batch result.
+
+        The payload ALWAYS includes: response, traceId, elapsedMs, status, error.
         Copilot Studio will fail the action if any bound property is missing.
         """
+        response, encoding = encode_response(
+            value.get("response", "") or "", payload.get("acceptEncoding")
+        )
         result = {
-            "response": value.get("response", "") or "",
+            "response": response,
+            "responseEncoding": encoding,
             "traceId": trace_id,
             # send integer milliseconds (safer for some clients)
             "elapsedMs": int(_elapsed_ms()),
@@ -1564,6 +3221,9 @@ async def on_event(context: TurnContext, _state: TurnState):
             # Always include 'error' key (empty on success)
             "error": value.get("error") or ""
         }
+        if "responses" in value:
+            result["responses"] = value["responses"]
+        PAYLOAD_BYTES.observe(len(response), kind="json")
         return Activity(
             # EndOfConversation (Python flavor is snake_case in the Agents SDK)
             type=ActivityTypes.end_of_conversation,
@@ -1572,6 +3232,55 @@ async def on_event(context: TurnContext, _state: TurnState):
         )
 
     payload: Dict[str, Any] = getattr(context.activity, "value", {}) or {}
+    if not isinstance(payload, dict):
+        payload = {}
+    user_id = context.activity.from_property.id
+    space_id = BOT.get_user_space_id(user_id)
+
+    if name == "runprompts":
+        items, err = parse_batch_prompts(payload)
+        if err:
+            await context.send_activity(_end_of_conversation(
+                {"response": "", "status": "error", "error": err, "responses": []},
+                code=EndOfConversationCodes.unknown
+            ))
+            return
+        limited = await BOT.check_rate_limit(
+            user_id, _tenant_id(context.activity), space_id, cost=len(items)
+        )
+        if limited:
+            await context.send_activity(_end_of_conversation(
+                {"response": "", "status": "error", "error": limited, "responses": []},
+                code=EndOfConversationCodes.unknown
+            ))
+            return
+        results = await BOT.ask_batch(items, space_id)
+        status = batch_status(results)
+        log_event(
+            logging.INFO,
+            "runprompts_done",
+            user_id=user_id,
+            space_id=space_id,
+            traceId=trace_id,
+            count=len(results),
+            status=status,
+            elapsed_ms=int(_elapsed_ms()),
+        )
+        failed = sum(r["status"] != "ok" for r in results)
+        await context.send_activity(_end_of_conversation(
+            {
+                "response": compact_json(results),
+                "responses": results,
+                "status": status,
+                "error": "" if status == "ok" else f"{failed} prompt(s) failed",
+            },
+            code=(
+                EndOfConversationCodes.completed_successfully if status != "error"
+                else EndOfConversationCodes.unknown
+            ),
+        ))
+        return
+
     prompt = payload.get("prompt")
     if not isinstance(prompt, str) or not prompt.strip():
         await context.send_activity(_end_of_conversation(
@@ -1580,26 +3289,49 @@ async def on_event(context: TurnContext, _state: TurnState):
         ))
         return
 
+    limited = await BOT.check_rate_limit(user_id, _tenant_id(context.activity), space_id)
+    if limited:
+        await context.send_activity(_end_of_conversation(
+            {"response": "", "status": "error", "error": limited},
+            code=EndOfConversationCodes.unknown
+        ))
+        return
+
     prompt = prompt.strip()
-    user_id = context.activity.from_property.id
-    space_id = BOT.get_user_space_id(user_id)
     text_timeout = CALL_TIMEOUT_SECONDS_DEFAULT
     query_timeout = CALL_TIMEOUT_SECONDS_DEFAULT
+    # The caller's budget (Copilot Studio action timeout) bounds the turn; time
+    # already spent in this handler counts against it
+    try:
+        budget = clamp(
+            int(payload.get("timeoutSeconds") or CALL_TIMEOUT_SECONDS_DEFAULT), 5, HARD_MAX_TIMEOUT
+        )
+    except (TypeError, ValueError):
+        budget = CALL_TIMEOUT_SECONDS_DEFAULT
+    deadline = Deadline(budget - _elapsed_ms() / 1000)
 
     try:
-        reply_json, _ = await BOT.ask_genie(
+        answer, _ = await BOT.ask_genie(
             prompt, space_id,
             conversation_id=None,
             timeout_text=text_timeout,
-            timeout_query=query_timeout
+            timeout_query=query_timeout,
+            deadline=deadline,
         )
         await context.send_activity(_end_of_conversation(
-            {"response": reply_json or "", "status": "ok"},
+            {"response": BOT.answer_to_json(answer), "status": "ok"},
             code=EndOfConversationCodes.completed_successfully
         ))
     except Exception as ex:
         err_msg = f"{type(ex).__name__}: {ex}"
-        log_event(logging.ERROR, "runprompt_error", user_id=user_id, space_id=space_id, traceId=trace_id, error=err_msg)
+        log_event(
+            logging.ERROR,
+            "runprompt_error",
+            user_id=user_id,
+            space_id=space_id,
+            traceId=trace_id,
+            error=err_msg,
+        )
         await context.send_activity(_end_of_conversation(
             {"response": "", "status": "error", "error": err_msg},
             code=EndOfConversationCodes.unknown
@@ -0,0 +1,148 @@
+"""Arrow-native statement result fetch.
+
+Module: arrow_results.py
+Purpose: Fetch a (large) statement result as Arrow record batches and decode it
+         into a ResultTable without building per-cell Python objects.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/arrow_results.py
+# License: MIT
+# Description: `get_statement` returns only the first JSON_ARRAY chunk of a
+#              result, as strings in nested lists. When that chunk is
+#              incomplete (or GENIE_ARROW_FETCH=always), `fetch_arrow_result()`
+#              re-executes Genie's SQL through Statement Execution with
+#              EXTERNAL_LINKS + ARROW_STREAM, reads the IPC stream batch by
+#              batch (up to a row cap) and wraps the Arrow buffers in a
+#              ResultTable. The Arrow table is kept so exports can be written
+#              without running the query again. Without pyarrow the JSON path is
+#              used unchanged.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from databricks.sdk import WorkspaceClient
+from databricks.sdk.service.sql import Disposition, ExecuteStatementRequestOnWaitTimeout, Format
+
+from .exports import ExportStore
+from .metrics import REGISTRY
+from .result_table import ResultTable
+
+try:  # optional: the Arrow path is skipped without pyarrow
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - depends on deployment
+    pa = None
+
+ARROW_FETCHES = REGISTRY.counter(
+    "genie_arrow_fetch_total",
+    "Arrow result fetches by outcome (complete|capped|empty|error).",
+    ["outcome"],
+)
+ARROW_FETCH_SECONDS = REGISTRY.histogram(
+    "genie_arrow_fetch_seconds",
+    "Arrow result fetch time by phase (execute|download|decode).",
+    ["phase"],
+)
+
+
+def arrow_available() -> bool:
+    """True when pyarrow is installed."""
+    return pa is not None
+
+
+def result_incomplete(statement: Any) -> bool:
+    """True when a statement response's inline result does not hold every row.
+
+    That is: truncated, more chunks to fetch, or fewer rows than the manifest
+    reports.
+    """
+    manifest = getattr(statement, "manifest", None)
+    if manifest is None:
+        return False
+    chunks = getattr(manifest, "total_chunk_count", None) or 0
+    if getattr(manifest, "truncated", False) or chunks > 1:
+        return True
+    total = getattr(manifest, "total_row_count", None)
+    inline = getattr(getattr(statement, "result", None), "data_array", None)
+    return total is not None and inline is not None and total > len(inline)
+
+
+def fetch_arrow_result(
+    ws: WorkspaceClient,
+    *,
+    sql: str,
+    warehouse_id: str,
+    timeout: float,
+    max_rows: int,
+    on_statement: Optional[Callable[[str], None]] = None,
+) -> Optional[Tuple[Dict[str, Any], ResultTable, Optional[Any]]]:
+    """Execute SQL with ARROW_STREAM + EXTERNAL_LINKS and decode it into a ResultTable.
+
+    Blocking; call through `asyncio.to_thread`.
+
+    Args:
+        ws: Databricks WorkspaceClient.
+        sql: Statement to execute (Genie's generated SQL).
+        warehouse_id: SQL warehouse to run on.
+        timeout: Seconds to wait for the statement to finish.
+        max_rows: Stop downloading after this many rows.
+        on_statement: Called with the statement id right after submission
+            (lets the caller cancel it; see inflight.py).
+
+    Returns:
+        (schema_dict, table, arrow_table) where arrow_table is the complete
+        pyarrow.Table (None when the result was capped at max_rows), or None when
+        the statement produced no data.
+
+    Raises:
+        ExportError / SDK errors on failure (callers fall back to the JSON path).
+    """
+    started = time.monotonic()
+    stmt = ws.statement_execution.execute_statement(
+        statement=sql,
+        warehouse_id=warehouse_id,
+        disposition=Disposition.EXTERNAL_LINKS,
+        format=Format.ARROW_STREAM,
+        wait_timeout="30s",
+        on_wait_timeout=ExecuteStatementRequestOnWaitTimeout.CONTINUE,
+    )
+    if on_statement is not None:
+        on_statement(stmt.statement_id)
+    stmt = ExportStore.wait_statement(ws, stmt, timeout)
+    ARROW_FETCH_SECONDS.observe(time.monotonic() - started, phase="execute")
+
+    started = time.monotonic()
+    batches: List[Any] = []
+    schema = None
+    rows = 0
+    capped = False
+    for link in ExportStore.iter_links(ws, stmt):
+        with ExportStore.open_link(link) as resp:
+            reader = pa.ipc.open_stream(resp)
+            schema = schema or reader.schema
+            for batch in reader:
+                batches.append(batch)
+                rows += batch.num_rows
+                if rows > max_rows:
+                    capped = True
+                    break
+        if capped:
+            break
+    ARROW_FETCH_SECONDS.observe(time.monotonic() - started, phase="download")
+    if schema is None:
+        ARROW_FETCHES.inc(outcome="empty")
+        return None
+
+    started = time.monotonic()
+    arrow_table = pa.Table.from_batches(batches, schema=schema)
+    if capped:
+        arrow_table = arrow_table.slice(0, max_rows)
+    schema_obj = getattr(getattr(stmt, "manifest", None), "schema", None)
+    schema_dict = schema_obj.as_dict() if schema_obj else {}
+    meta = schema_dict.get("columns") or [{"name": f.name} for f in schema]
+    table = ResultTable.from_arrow(meta, arrow_table)
+    ARROW_FETCH_SECONDS.observe(time.monotonic() - started, phase="decode")
+    ARROW_FETCHES.inc(outcome="capped" if capped else "complete")
+    return schema_dict, table, (None if capped else arrow_table)
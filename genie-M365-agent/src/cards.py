@@ -0,0 +1,165 @@
+"""Adaptive Card rendering for Genie query results.
+
+Module: cards.py
+Purpose: One-page-at-a-time table cards with server-side pagination actions.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/cards.py
+# License: MIT
+# Description: Builds Adaptive Card (schema 1.5) payloads for a single page of a
+#              cached `ResultTable`. Prev/Next buttons are `Action.Submit`
+#              actions carrying only a result id and page number; the rows for
+#              the next page are served from the bot's result cache.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import math
+from typing import Any, Callable, Dict, List, Optional
+
+from .result_table import ResultTable
+
+ADAPTIVE_CARD_CONTENT_TYPE = "application/vnd.microsoft.card.adaptive"
+PAGE_ACTION = "genie_page"
+
+
+def page_count(total_rows: int, page_size: int) -> int:
+    """Number of pages needed for total_rows (at least 1)."""
+    return max(1, math.ceil(total_rows / max(1, page_size)))
+
+
+def page_action_data(result_id: str, page: int) -> Dict[str, Any]:
+    """Submit payload for a page navigation button."""
+    return {"action": PAGE_ACTION, "resultId": result_id, "page": page}
+
+
+def parse_page_action(value: Any) -> Optional[Dict[str, Any]]:
+    """Extract {result_id, page} from an incoming Action.Submit value.
+
+    Returns:
+        Dict with 'result_id' and 'page', or None if this is not a page action.
+    """
+    if not isinstance(value, dict) or value.get("action") != PAGE_ACTION:
+        return None
+    result_id = value.get("resultId")
+    try:
+        page = int(value.get("page", 0))
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(result_id, str) or not result_id:
+        return None
+    return {"result_id": result_id, "page": max(0, page)}
+
+
+def render_table_card(
+    table: ResultTable,
+    *,
+    result_id: str,
+    page: int,
+    page_size: int,
+    cols_limit: int,
+    fmt_cell: Callable[[Any, str], str],
+    description: str = "",
+    sql: str = "",
+) -> Dict[str, Any]:
+    """Render one page of a result table as an Adaptive Card.
+
+    Args:
+        table: Full (cached) result table.
+        result_id: Cache key used by the navigation actions.
+        page: Zero-based page to render (clamped to the valid range).
+        page_size: Rows per page.
+        cols_limit: Max columns to display.
+        fmt_cell: Callable(value, type_name) -> display string.
+        description: Optional query description shown above the table.
+        sql: Optional generated SQL, shown in a collapsed section.
+
+    Returns:
+        Adaptive Card content (dict) ready to wrap in an attachment.
+    """
+    pages = page_count(table.num_rows, page_size)
+    page = min(max(0, page), pages - 1)
+    start = page * page_size
+    view = table.window(rows=slice(start, start + page_size))
+    hidden_cols = max(0, view.num_cols - cols_limit)
+    if hidden_cols:
+        view = view.window(cols=slice(0, cols_limit))
+
+    type_names = [c.get("type_name") or "" for c in view.columns]
+    header_row = {
+        "type": "TableRow",
+        "style": "accent",
+        "cells": [_cell(name, weight="Bolder") for name in view.column_names],
+    }
+    rows: List[Dict[str, Any]] = [header_row]
+    for row in view.iter_rows():
+        rows.append({
+            "type": "TableRow",
+            "cells": [_cell(fmt_cell(v, t)) for v, t in zip(row, type_names)],
+        })
+
+    body: List[Dict[str, Any]] = []
+    if description:
+        body.append({"type": "TextBlock", "text": description, "wrap": True})
+    if view.num_cols:
+        body.append({
+            "type": "Table",
+            "firstRowAsHeader": True,
+            "showGridLines": True,
+            "columns": [{"width": 1} for _ in range(view.num_cols)],
+            "rows": rows,
+        })
+    else:
+        body.append({"type": "TextBlock", "text": "_No columns to display._", "wrap": True})
+
+    shown_to = min(start + page_size, table.num_rows)
+    first = start + 1 if table.num_rows else 0
+    footer = f"Rows {first}–{shown_to} of {table.num_rows} • page {page + 1}/{pages}"
+    if hidden_cols:
+        footer += f" • {hidden_cols} hidden column(s)"
+    body.append(
+        {"type": "TextBlock", "text": footer, "isSubtle": True, "size": "Small", "wrap": True}
+    )
+
+    actions: List[Dict[str, Any]] = []
+    if sql:
+        body.append({
+            "type": "Container",
+            "id": "sql",
+            "isVisible": False,
+            "items": [{
+                "type": "TextBlock",
+                "text": sql,
+                "fontType": "Monospace",
+                "wrap": True,
+                "size": "Small",
+            }],
+        })
+        actions.append(
+            {"type": "Action.ToggleVisibility", "title": "SQL", "targetElements": ["sql"]}
+        )
+    if page > 0:
+        prev_data = page_action_data(result_id, page - 1)
+        actions.append({"type": "Action.Submit", "title": "◀ Prev", "data": prev_data})
+    if page < pages - 1:
+        next_data = page_action_data(result_id, page + 1)
+        actions.append({"type": "Action.Submit", "title": "Next ▶", "data": next_data})
+
+    card: Dict[str, Any] = {
+        "type": "AdaptiveCard",
+        "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+        "version": "1.5",
+        "msteams": {"width": "Full"},
+        "body": body,
+    }
+    if actions:
+        card["actions"] = actions
+    return card
+
+
+def _cell(text: str, *, weight: Optional[str] = None) -> Dict[str, Any]:
+    """A TableCell holding a single wrapped TextBlock."""
+    block: Dict[str, Any] = {"type": "TextBlock", "text": text, "wrap": True}
+    if weight:
+        block["weight"] = weight
+    return {"type": "TableCell", "items": [block]}
@@ -0,0 +1,338 @@
+"""Declarative chat command registry.
+
+Module: commands.py
+Purpose: Map the first token of a message to a command handler and parse the
+         command's arguments once into a `CommandArgs` struct.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/commands.py
+# License: MIT
+# Description: Handlers register with `@COMMANDS.command(...)` (see agent.py).
+#              `CommandRegistry.resolve()` does one dict lookup on the first
+#              token, so ordinary questions reach Genie without running any
+#              command regex. The parsers below reproduce the historical
+#              command syntax exactly (including inline `key=value` settings,
+#              which turn any message into a `config` command).
+# ─────────────────────────────────────────────────────────────────────────────
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# First token: optional leading slash, then a run of word characters
+_FIRST_TOKEN = re.compile(r"/?\w+")
+
+# Settings pairs (may appear anywhere in the text)
+RE_PAIR_NUM = re.compile(
+    r"(?i)\b(rows|cols|columns|timeout|chars|cell|cell_chars|query_timeout|qt)\s*[:=]\s*(\d+)"
+)
+RE_PAIR_BOOL = re.compile(
+    r"(?i)\b(sql|sql_notes|cards)\s*[:=]\s*(on|off|true|false|yes|no|enable|disable|enabled|disabled|0|1)\b"
+)
+
+# Normalization maps for config keys
+KEYMAP_NUM = {
+    "rows": "rows",
+    "cols": "cols", "columns": "cols",
+    "timeout": "timeout",
+    "chars": "chars",
+    "cell": "cell_chars", "cell_chars": "cell_chars",
+    "query_timeout": "query_timeout", "qt": "query_timeout",
+}
+KEYMAP_BOOL = {
+    "sql": "sql_notes", "sql_notes": "sql_notes",
+    "cards": "cards",
+}
+
+_RE_SHOW = re.compile(r"\bshow\b", re.I)
+_RE_LIST = re.compile(r"\blist\b", re.I)
+_RE_DEFAULTS = re.compile(r"\bdefaults\b", re.I)
+_RE_SPACE_SET = re.compile(r"\bset\b\s+(.+)$", re.I)
+_RE_MESSAGES = re.compile(r"messages?\s+([A-Za-z0-9\-\_]+)(?:\s+(\d+))?", re.I)
+_RE_PREFETCH = re.compile(r"\s*(?:(list|pin|unpin|run)\b)?\s*(.*)$", re.I | re.S)
+_RE_EXPORT = re.compile(r"\s*(csv|parquet)?\s*$", re.I)
+_RE_OVER = re.compile(r"\s+over\b", re.I)
+_RE_TABLE_ARG = re.compile(r"\s*`?([A-Za-z0-9_.\-]+)`?\s*$")
+_RE_SUBSCRIBE = re.compile(
+    r'\s*["“”](.+?)["“”]\s+((?:daily|weekdays|(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*)\s+\d{1,2}:\d{2})\s*$',
+    re.I | re.S,
+)
+_RE_SUBSCRIPTION_ID = re.compile(r"\s*`?([0-9a-f]{6})`?\s*$", re.I)
+
+
+def truthy(s: str) -> Optional[bool]:
+    """Parse a truthy/falsey string value into a boolean.
+
+    Recognized tokens (case-insensitive):
+      True-like: 1, true, on, yes, y, enable, enabled
+      False-like: 0, false, off, no, n, disable, disabled
+
+    Args:
+        s: String to parse.
+
+    Returns:
+        True/False if recognized, otherwise None.
+    """
+    if s is None:
+        return None
+    t = s.strip().lower()
+    if t in ("1", "true", "on", "yes", "y", "enable", "enabled"):
+        return True
+    if t in ("0", "false", "off", "no", "n", "disable", "disabled"):
+        return False
+    return None
+
+
+def parse_settings_pairs(text: str) -> Dict[str, Any]:
+    """Extract settings overrides such as `rows=100 cols=20 sql=on` from anywhere in text.
+
+    Returns:
+        Normalized overrides ({} when none are present).
+    """
+    out: Dict[str, Any] = {}
+    if "=" not in text and ":" not in text:
+        return out
+    for k, v in RE_PAIR_NUM.findall(text):
+        nk = KEYMAP_NUM.get(k.lower())
+        if nk:
+            out[nk] = max(1, int(v))
+    for k, v in RE_PAIR_BOOL.findall(text):
+        nk = KEYMAP_BOOL.get(k.lower())
+        val = truthy(v)
+        if nk and val is not None:
+            out[nk] = val
+    return out
+
+
+@dataclass
+class CommandArgs:
+    """Parsed command invocation.
+
+    Fields:
+        name: Canonical command name.
+        token: First token as typed (lower-cased).
+        text: Full message text.
+        rest: Text after the first token.
+        action: Sub-command (show, set, list, defaults, pin...).
+        value: Free argument (space id/title, conversation id, export format...).
+        limit: Numeric argument (e.g. `messages <id> N`).
+        overrides: Settings overrides (config).
+        when: Schedule spec (`subscribe "<question>" daily 08:00`).
+    """
+    name: str
+    token: str
+    text: str
+    rest: str = ""
+    action: str = ""
+    value: str = ""
+    limit: Optional[int] = None
+    overrides: Dict[str, Any] = field(default_factory=dict)
+    when: str = ""
+
+
+Parser = Callable[[CommandArgs], Optional[CommandArgs]]
+Handler = Callable[[Any, str, CommandArgs], Awaitable[None]]  # (TurnContext, user_id, args)
+
+
+@dataclass
+class Command:
+    """A registered command.
+
+    Fields:
+        name: Canonical name.
+        handler: async (context, user_id, args) -> None.
+        parse: Argument parser; returning None means "not this command".
+        inline_settings: Also triggered by `key=value` settings anywhere in a message.
+        before_inline_settings: Wins over inline settings in the same message.
+    """
+    name: str
+    handler: Handler
+    parse: Parser
+    inline_settings: bool = False
+    before_inline_settings: bool = False
+
+
+class CommandRegistry:
+    """First-token command dispatch table."""
+
+    def __init__(self):
+        self._by_token: Dict[str, Command] = {}
+        self._exact: Dict[str, Command] = {}
+        self._inline: Optional[Command] = None
+
+    def command(
+        self,
+        *tokens: str,
+        parse: Optional[Parser] = None,
+        exact: bool = False,
+        inline_settings: bool = False,
+        before_inline_settings: bool = False,
+    ) -> Callable[[Handler], Handler]:
+        """Decorator registering a handler under one or more tokens.
+
+        Args:
+            tokens: Trigger tokens (lower-case; the first is the canonical name).
+            parse: Argument parser (default: accept with no arguments).
+            exact: Match the whole message instead of the first token.
+            inline_settings: See `Command.inline_settings` (at most one command).
+            before_inline_settings: See `Command.before_inline_settings`.
+        """
+        def decorator(fn: Handler) -> Handler:
+            cmd = Command(
+                name=tokens[0].lstrip("/"),
+                handler=fn,
+                parse=parse or (lambda a: a),
+                inline_settings=inline_settings,
+                before_inline_settings=before_inline_settings or exact,
+            )
+            table = self._exact if exact else self._by_token
+            for t in tokens:
+                table[t] = cmd
+            if inline_settings:
+                self._inline = cmd
+            return fn
+        return decorator
+
+    def resolve(self, text: str) -> Optional[Tuple[Command, CommandArgs]]:
+        """Find the command for a message (None means "ask Genie").
+
+        Args:
+            text: Stripped message text.
+        """
+        lower = text.lower()
+        cmd = self._exact.get(lower)
+        if cmd:
+            return cmd, CommandArgs(cmd.name, lower, text)
+
+        parsed: Optional[CommandArgs] = None
+        m = _FIRST_TOKEN.match(text)
+        if m:
+            token = m.group(0).lower()
+            cmd = self._by_token.get(token)
+            if cmd:
+                parsed = cmd.parse(CommandArgs(cmd.name, token, text, text[m.end():]))
+                if parsed and cmd.before_inline_settings:
+                    return cmd, parsed
+
+        inline = self._inline
+        if inline and not (parsed and cmd is inline):
+            overrides = parse_settings_pairs(text)
+            if overrides:
+                token = m.group(0).lower() if m else ""
+                rest = text[m.end():] if m else text
+                args = inline.parse(CommandArgs(inline.name, token, text, rest))
+                if args:
+                    return inline, args
+        if parsed:
+            return cmd, parsed
+        return None
+
+
+# ------------------------------------------------------------------------------
+# Argument parsers (historical syntax)
+# ------------------------------------------------------------------------------
+
+def parse_space(a: CommandArgs) -> CommandArgs:
+    """`space show` | `space set <id or title>` (anything else: usage)."""
+    if _RE_SHOW.search(a.rest):
+        a.action = "show"
+    else:
+        m = _RE_SPACE_SET.search(a.rest)
+        if m:
+            a.action, a.value = "set", m.group(1).strip()
+    return a
+
+
+def parse_list(a: CommandArgs) -> CommandArgs:
+    """`<command> list` (anything else: usage)."""
+    if _RE_LIST.search(a.rest):
+        a.action = "list"
+    return a
+
+
+def parse_messages(a: CommandArgs) -> CommandArgs:
+    """`messages <conversation-id> [N]` with N in 1..20 (default 3)."""
+    m = _RE_MESSAGES.search(a.text)
+    if m:
+        a.value = m.group(1)
+        a.limit = max(1, min(int(m.group(2)) if m.group(2) else 3, 20))
+    return a
+
+
+def parse_config(a: CommandArgs) -> CommandArgs:
+    """`config show` | `config defaults` | `config key=value ...` (no pairs: help)."""
+    a.overrides = parse_settings_pairs(a.text)
+    if _RE_DEFAULTS.search(a.text):
+        a.action = "defaults"
+    elif _RE_SHOW.search(a.text):
+        a.action = "show"
+    elif a.overrides:
+        a.action = "set"
+    else:
+        a.action = "help"
+    return a
+
+
+def parse_prefetch(a: CommandArgs) -> Optional[CommandArgs]:
+    """`prefetch [list|run]` | `prefetch pin|unpin <argument>` (anything else goes to Genie)."""
+    m = _RE_PREFETCH.match(a.rest)
+    if not m:
+        return None
+    action, value = (m.group(1) or "list").lower(), m.group(2).strip()
+    if value and action in ("list", "run"):
+        return None
+    a.action, a.value = action, value
+    return a
+
+
+def parse_export(a: CommandArgs) -> Optional[CommandArgs]:
+    """`export` | `export csv` | `export parquet` (anything else is a question for Genie)."""
+    m = _RE_EXPORT.match(a.rest)
+    if not m:
+        return None
+    a.value = (m.group(1) or "").lower()
+    return a
+
+
+def parse_tables(
+    a: CommandArgs, known: Optional[Callable[[str], bool]] = None
+) -> Optional[CommandArgs]:
+    """`tables` | `tables <known table name>` (anything else is a question for Genie)."""
+    if not a.rest.strip():
+        return a
+    m = _RE_TABLE_ARG.match(a.rest)
+    if not m or known is None or not known(m.group(1)):
+        return None
+    a.value = m.group(1)
+    return a
+
+
+def parse_subscribe(a: CommandArgs) -> Optional[CommandArgs]:
+    """`subscribe "<question>" <daily|weekdays|day> HH:MM` (anything else goes to Genie)."""
+    m = _RE_SUBSCRIBE.match(a.rest)
+    if not m or not m.group(1).strip():
+        return None
+    a.action, a.value, a.when = "add", m.group(1).strip(), m.group(2).strip()
+    return a
+
+
+def parse_unsubscribe(a: CommandArgs) -> Optional[CommandArgs]:
+    """`unsubscribe <6-hex id>` (anything else is a question for Genie)."""
+    m = _RE_SUBSCRIPTION_ID.match(a.rest)
+    if not m:
+        return None
+    a.value = m.group(1).lower()
+    return a
+
+
+def parse_reset(a: CommandArgs) -> Optional[CommandArgs]:
+    """`reset` | `restart` | `clear` | `start over` (optionally with a leading slash)."""
+    if a.token.lstrip("/") == "start" and not _RE_OVER.match(a.rest):
+        return None
+    return a
+
+
+# Process-wide registry (handlers are registered in agent.py)
+COMMANDS = CommandRegistry()
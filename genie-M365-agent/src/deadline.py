@@ -0,0 +1,88 @@
+"""Per-turn deadlines.
+
+Module: deadline.py
+Purpose: One time budget per Genie turn that every stage, retry and backoff
+         sleep draws from.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/deadline.py
+# License: MIT
+# Description: Stage timeouts used to be independent (create, wait, get_message
+#              and up to three statement fetch chains, each retried), so a turn
+#              could run for several multiples of the configured limit. A
+#              `Deadline` is created once per turn; `cap()` shrinks each
+#              stage's timeout to what is left, `fits()` decides whether a retry
+#              (backoff included) can still finish, and `DeadlineExceeded` (an
+#              asyncio.TimeoutError) is raised once the budget is spent.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import time
+from typing import Callable, Optional
+
+from .metrics import REGISTRY
+
+DEADLINE_EXCEEDED = REGISTRY.counter(
+    "genie_deadline_exceeded_total", "Turns that ran out of their time budget, by stage.", ["stage"]
+)
+RETRIES_SKIPPED = REGISTRY.counter(
+    "genie_retries_skipped_total",
+    "Retries skipped because the remaining turn budget could not fit them.",
+)
+
+# A stage is not started (or retried) with less than this many seconds left
+MIN_STAGE_SECONDS = 1.0
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The turn's time budget is spent."""
+
+    def __init__(self, budget: float, stage: str = ""):
+        super().__init__(f"Time budget of {budget:g}s exhausted" + (f" ({stage})" if stage else ""))
+        self.budget = budget
+        self.stage = stage
+
+
+class Deadline:
+    """Absolute deadline for one turn.
+
+    Args:
+        seconds: Total budget from now.
+        clock: Monotonic clock (injectable for tests).
+    """
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.budget = max(0.0, float(seconds))
+        self._clock = clock
+        self.expires_at = clock() + self.budget
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)."""
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        """True once the budget is used up."""
+        return self.remaining() <= 0.0
+
+    def fits(self, seconds: float) -> bool:
+        """True if `seconds` of work plus a minimal stage still fits in the budget."""
+        return self.remaining() >= seconds + MIN_STAGE_SECONDS
+
+    def cap(self, timeout: Optional[float] = None, *, stage: str = "") -> float:
+        """Timeout for the next stage: min(timeout, remaining).
+
+        Raises:
+            DeadlineExceeded: Less than MIN_STAGE_SECONDS left.
+        """
+        left = self.remaining()
+        if left < MIN_STAGE_SECONDS:
+            raise self.exceeded(stage)
+        return left if timeout is None or timeout <= 0 else min(float(timeout), left)
+
+    def exceeded(self, stage: str) -> DeadlineExceeded:
+        """Count and build the DeadlineExceeded for a stage that ran out of budget."""
+        DEADLINE_EXCEEDED.inc(stage=stage or "unknown")
+        return DeadlineExceeded(self.budget, stage)
@@ -0,0 +1,472 @@
+"""Full-result exports (CSV / Parquet) served through signed, expiring URLs.
+
+Module: exports.py
+Purpose: Stream a statement result to disk and hand out time-limited download links.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/exports.py
+# License: MIT
+# Description: Re-executes a Genie-generated SQL statement through Statement
+#              Execution with the EXTERNAL_LINKS disposition and copies the
+#              result chunks byte-for-byte into a spool file (CSV), or converts
+#              Arrow record batches to Parquet when pyarrow is installed. Files
+#              live under a quota-limited directory, are addressed by HMAC-
+#              signed URLs and removed when their TTL expires.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from databricks.sdk import WorkspaceClient
+from databricks.sdk.service.sql import (
+    Disposition,
+    ExecuteStatementRequestOnWaitTimeout,
+    Format,
+    StatementState,
+)
+
+try:  # Parquet export is optional
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on deployment
+    pa = None
+    pacsv = None
+    pq = None
+
+EXPORT_FORMATS = ("csv", "parquet")
+_COPY_BUFSIZE = 1024 * 1024
+_ID_RE = re.compile(r"^[a-f0-9]{32}$")
+
+
+class ExportError(Exception):
+    """User-facing export failure (message is safe to show)."""
+
+
+@dataclass
+class ExportFile:
+    """A finished export on disk.
+
+    Fields:
+        export_id: Random hex id (also the on-disk file stem).
+        path: Absolute file path.
+        filename: Download filename presented to the user.
+        content_type: MIME type for the download response.
+        size: File size in bytes.
+        rows: Total row count reported by the warehouse (if known).
+        expires_at: Epoch seconds after which the link and file expire.
+    """
+    export_id: str
+    path: Path
+    filename: str
+    content_type: str
+    size: int
+    rows: Optional[int]
+    expires_at: float
+
+
+class _QuotaWriter:
+    """File wrapper that aborts once the byte budget is exhausted."""
+
+    def __init__(self, fh: BinaryIO, budget: int):
+        self._fh = fh
+        self.budget = budget
+        self.written = 0
+
+    def write(self, b: Any) -> int:
+        n = len(b) if not isinstance(b, memoryview) else b.nbytes
+        if self.written + n > self.budget:
+            raise ExportError("The export exceeds the available download quota. Refine your query.")
+        self.written += n
+        return self._fh.write(b)
+
+    def flush(self):
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+    def seekable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        return self.written
+
+    @property
+    def closed(self) -> bool:
+        return self._fh.closed
+
+
+class ExportStore:
+    """Quota- and TTL-bounded spool directory plus URL signing for exports.
+
+    Args:
+        directory: Where export files are written (created if missing).
+        max_bytes: Disk quota for all live exports.
+        max_file_bytes: Upper bound for a single export.
+        ttl_seconds: Lifetime of a download link and its file.
+        signing_key: HMAC key; a random per-process key is used when empty.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        max_bytes: int,
+        max_file_bytes: int,
+        ttl_seconds: float,
+        signing_key: str = "",
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.ttl_seconds = ttl_seconds
+        self._key = signing_key.encode("utf-8") if signing_key else secrets.token_bytes(32)
+        self._files: Dict[str, ExportFile] = {}
+        self._reserved = 0  # budget held by exports still being written
+        self._lock = threading.Lock()
+
+    # -------------------- Signing --------------------
+
+    def _signature(self, export_id: str, expires: int) -> str:
+        msg = f"{export_id}:{expires}".encode("ascii")
+        return hmac.new(self._key, msg, hashlib.sha256).hexdigest()
+
+    def signed_path(self, mount: str, f: ExportFile) -> str:
+        """Relative URL (mount/id/filename?exp=..&sig=..) for an export."""
+        exp = int(f.expires_at)
+        sig = self._signature(f.export_id, exp)
+        return f"{mount.rstrip('/')}/{f.export_id}/{f.filename}?exp={exp}&sig={sig}"
+
+    def resolve(self, export_id: str, exp: str, sig: str) -> Optional[ExportFile]:
+        """Validate a signed request and return the export if it is still live.
+
+        Returns:
+            The ExportFile, or None for bad signatures, expired links or missing files.
+        """
+        if not _ID_RE.match(export_id or ""):
+            return None
+        try:
+            expires = int(exp)
+        except (TypeError, ValueError):
+            return None
+        if expires < time.time():
+            return None
+        if not hmac.compare_digest(self._signature(export_id, expires), sig or ""):
+            return None
+        f = self._files.get(export_id)
+        if not f or not f.path.exists():
+            return None
+        return f
+
+    # -------------------- Spool management --------------------
+
+    def used_bytes(self) -> int:
+        """Bytes currently held by live exports."""
+        return sum(f.size for f in self._files.values())
+
+    def cleanup(self, *, now: Optional[float] = None) -> int:
+        """Delete expired exports (and stray files from earlier runs).
+
+        Returns:
+            Number of files removed.
+        """
+        now = now or time.time()
+        removed = 0
+        for export_id, f in list(self._files.items()):
+            if f.expires_at <= now:
+                self._files.pop(export_id, None)
+                removed += self._unlink(f.path)
+        if self.directory.exists():
+            known = {f.path.name for f in self._files.values()}
+            for p in self.directory.iterdir():
+                if p.name not in known and p.stat().st_mtime + self.ttl_seconds <= now:
+                    removed += self._unlink(p)
+        return removed
+
+    @staticmethod
+    def _unlink(p: Path) -> int:
+        try:
+            p.unlink()
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def _reserve(self) -> int:
+        """Free space for a new export; return the byte budget it may use."""
+        self.cleanup()
+        with self._lock:
+            budget = min(self.max_file_bytes, self.max_bytes - self.used_bytes() - self._reserved)
+            if budget <= 0:
+                raise ExportError(
+                    "The export area is full right now. Please try again in a few minutes."
+                )
+            self._reserved += budget
+        return budget
+
+    async def run_janitor(self, interval: float = 60.0):
+        """Background task: periodically remove expired exports."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.cleanup)
+            except Exception:
+                pass
+
+    # -------------------- Export --------------------
+
+    def export_statement(
+        self,
+        ws: WorkspaceClient,
+        *,
+        sql: str,
+        warehouse_id: str,
+        fmt: str,
+        timeout: float,
+        basename: str = "genie-results",
+    ) -> ExportFile:
+        """Execute SQL with EXTERNAL_LINKS disposition and stream the result to disk.
+
+        Blocking; call through `asyncio.to_thread`.
+
+        Args:
+            ws: Databricks WorkspaceClient.
+            sql: Statement to execute (Genie's generated SQL).
+            warehouse_id: SQL warehouse to run on.
+            fmt: 'csv' or 'parquet'.
+            timeout: Seconds to wait for the statement to finish.
+            basename: Download filename stem.
+
+        Returns:
+            The registered ExportFile.
+
+        Raises:
+            ExportError: With a user-facing message on any failure.
+        """
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ExportError(f"Unsupported export format `{fmt}`. Use `csv` or `parquet`.")
+        if fmt == "parquet" and pa is None:
+            raise ExportError(
+                "Parquet export is not available on this deployment (pyarrow missing). "
+                "Try `export csv`."
+            )
+
+        budget = self._reserve()
+        try:
+            return self._export(ws, sql=sql, warehouse_id=warehouse_id, fmt=fmt, timeout=timeout,
+                                basename=basename, budget=budget)
+        finally:
+            with self._lock:
+                self._reserved -= budget
+
+    def export_arrow(self, table: Any, *, fmt: str, basename: str = "genie-results") -> ExportFile:
+        """Write an already fetched Arrow table (see arrow_results.py).
+
+        The query is not run again. Blocking; call through `asyncio.to_thread`.
+
+        Raises:
+            ExportError: With a user-facing message on any failure.
+        """
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ExportError(f"Unsupported export format `{fmt}`. Use `csv` or `parquet`.")
+        if pa is None:
+            raise ExportError(
+                "Arrow exports are not available on this deployment (pyarrow missing)."
+            )
+
+        budget = self._reserve()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            export_id = secrets.token_hex(16)
+            path = self.directory / f"{export_id}.{fmt}"
+            try:
+                with open(path, "wb") as fh:
+                    sink = pa.PythonFile(_QuotaWriter(fh, budget), mode="w")
+                    if fmt == "csv":
+                        pacsv.write_csv(table, sink, pacsv.WriteOptions(quoting_style="needed"))
+                    else:
+                        pq.write_table(table, sink)
+            except ExportError:
+                self._unlink(path)
+                raise
+            except Exception as e:
+                self._unlink(path)
+                raise ExportError(f"Export failed ({type(e).__name__}).") from e
+        finally:
+            with self._lock:
+                self._reserved -= budget
+
+        f = ExportFile(
+            export_id=export_id,
+            path=path,
+            filename=f"{basename}.{fmt}",
+            content_type="text/csv" if fmt == "csv" else "application/vnd.apache.parquet",
+            size=path.stat().st_size,
+            rows=table.num_rows,
+            expires_at=time.time() + self.ttl_seconds,
+        )
+        self._files[export_id] = f
+        return f
+
+    def _export(
+        self,
+        ws: WorkspaceClient,
+        *,
+        sql: str,
+        warehouse_id: str,
+        fmt: str,
+        timeout: float,
+        basename: str,
+        budget: int,
+    ) -> ExportFile:
+        """Run the statement and spool its result within the given byte budget."""
+        wire_format = Format.CSV if fmt == "csv" else Format.ARROW_STREAM
+        try:
+            stmt = ws.statement_execution.execute_statement(
+                statement=sql,
+                warehouse_id=warehouse_id,
+                disposition=Disposition.EXTERNAL_LINKS,
+                format=wire_format,
+                wait_timeout="30s",
+                on_wait_timeout=ExecuteStatementRequestOnWaitTimeout.CONTINUE,
+            )
+            stmt = self.wait_statement(ws, stmt, timeout)
+        except ExportError:
+            raise
+        except Exception as e:
+            # Stopped warehouse, missing permission, network error, ...
+            raise ExportError(f"The export query could not be run ({type(e).__name__}).") from e
+
+        schema = getattr(stmt.manifest, "schema", None)
+        columns = [c.name for c in (getattr(schema, "columns", None) or [])]
+        rows = getattr(stmt.manifest, "total_row_count", None)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        export_id = secrets.token_hex(16)
+        path = self.directory / f"{export_id}.{fmt}"
+        try:
+            with open(path, "wb") as fh:
+                out = _QuotaWriter(fh, budget)
+                links = self.iter_links(ws, stmt)
+                if fmt == "csv":
+                    self._write_csv(out, links, columns)
+                else:
+                    self._write_parquet(out, links)
+        except ExportError:
+            self._unlink(path)
+            raise
+        except Exception as e:
+            self._unlink(path)
+            raise ExportError(f"Export failed ({type(e).__name__}).") from e
+
+        f = ExportFile(
+            export_id=export_id,
+            path=path,
+            filename=f"{basename}.{fmt}",
+            content_type="text/csv" if fmt == "csv" else "application/vnd.apache.parquet",
+            size=path.stat().st_size,
+            rows=rows,
+            expires_at=time.time() + self.ttl_seconds,
+        )
+        self._files[export_id] = f
+        return f
+
+    @staticmethod
+    def wait_statement(ws: WorkspaceClient, stmt: Any, timeout: float) -> Any:
+        """Poll until the statement reaches a terminal state or the timeout elapses."""
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+        while True:
+            state = getattr(getattr(stmt, "status", None), "state", None)
+            if state == StatementState.SUCCEEDED:
+                return stmt
+            if state in (StatementState.FAILED, StatementState.CANCELED, StatementState.CLOSED):
+                err = getattr(getattr(stmt.status, "error", None), "message", None) or state.value
+                raise ExportError(f"The export query did not complete: {err}")
+            if time.monotonic() >= deadline:
+                try:
+                    ws.statement_execution.cancel_execution(stmt.statement_id)
+                except Exception:
+                    pass
+                raise ExportError(
+                    "The export query timed out. Increase `query_timeout` or narrow the question."
+                )
+            time.sleep(delay)
+            delay = min(delay * 1.5, 5.0)
+            stmt = ws.statement_execution.get_statement(stmt.statement_id)
+
+    @staticmethod
+    def iter_links(ws: WorkspaceClient, stmt: Any) -> Iterator[Any]:
+        """Yield every ExternalLink of the result, following next_chunk_index."""
+        result = getattr(stmt, "result", None)
+        links: List[Any] = list(getattr(result, "external_links", None) or [])
+        while links:
+            yield from links
+            nxt = getattr(links[-1], "next_chunk_index", None)
+            if nxt is None:
+                return
+            chunk = ws.statement_execution.get_statement_result_chunk_n(stmt.statement_id, nxt)
+            links = list(getattr(chunk, "external_links", None) or [])
+
+    @staticmethod
+    def open_link(link: Any):
+        """Open a presigned chunk URL (no Databricks auth header; extra headers if required)."""
+        headers = dict(getattr(link, "http_headers", None) or {})
+        req = urllib.request.Request(link.external_link, headers=headers)
+        return urllib.request.urlopen(req, timeout=120)
+
+    def _write_csv(self, out: _QuotaWriter, links: Iterator[Any], columns: List[str]):
+        """Copy CSV chunks byte-for-byte, writing a single header row."""
+        header = (",".join(_csv_field(c) for c in columns) + "\r\n").encode("utf-8")
+        out.write(header)
+        for link in links:
+            with self.open_link(link) as resp:
+                first = resp.readline()
+                if first.rstrip(b"\r\n") != header.rstrip(b"\r\n"):
+                    out.write(first)
+                shutil.copyfileobj(resp, out, _COPY_BUFSIZE)
+
+    def _write_parquet(self, out: _QuotaWriter, links: Iterator[Any]):
+        """Convert Arrow IPC chunks to a single Parquet file, batch by batch."""
+        writer = None
+        try:
+            for link in links:
+                with self.open_link(link) as resp:
+                    reader = pa.ipc.open_stream(resp)
+                    if writer is None:
+                        writer = pq.ParquetWriter(pa.PythonFile(out, mode="w"), reader.schema)
+                    for batch in reader:
+                        writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ExportError("The query returned no data to export.")
+
+
+def _csv_field(value: str) -> str:
+    """Quote a CSV header field when needed (RFC 4180)."""
+    if any(ch in value for ch in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def default_export_dir() -> str:
+    """Default spool directory under the system temp dir."""
+    return os.path.join(tempfile.gettempdir(), "genie-exports")
@@ -0,0 +1,201 @@
+"""Presentation-only follow-up recognition and local evaluation.
+
+Module: followups.py
+Purpose: Answer "show more", "sort by X", "top 10", "show column X"... from the
+         previous ResultTable instead of sending a new question to Genie.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/followups.py
+# License: MIT
+# Description: A small, anchored grammar for follow-ups that only change how an
+#              existing result is presented (sort, filter, limit, projection,
+#              paging). Anything not matched in full goes to Genie as usual.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+
+from .result_table import ResultTable
+
+_END = r"\s*[.!?]*\s*$"
+_SHOW = r"(?:(?:please\s+)?(?:show|give|list|display)\s+(?:me\s+)?)?(?:only\s+)?(?:the\s+)?"
+
+RE_MORE = re.compile(
+    r"^(?:(?:show|give)\s+(?:me\s+)?)?(?:some\s+)?more(?:\s+rows)?" + _END
+    + r"|^next\s+(?:rows|page)" + _END,
+    re.I,
+)
+RE_TOP_BY = re.compile(r"^" + _SHOW + r"(top|bottom)\s+(\d{1,5})\s+by\s+(.+?)" + _END, re.I)
+RE_LIMIT = re.compile(
+    r"^(?:" + _SHOW + r"(?:top|first)\s+(\d{1,5})(?:\s+rows?)?"
+    r"|limit(?:\s+to)?\s+(\d{1,5})(?:\s+rows?)?|"
+    r"(?:show|give)\s+(?:me\s+)?(?:only\s+)?(\d{1,5})\s+rows?)" + _END,
+    re.I,
+)
+RE_SORT = re.compile(
+    r"^(?:sort|order)(?:\s+(?:it|them|that|this|the\s+results?))?\s+by\s+(.+?)"
+    r"(?:\s+(asc|ascending|desc|descending))?" + _END,
+    re.I,
+)
+RE_PROJECT = re.compile(r"^" + _SHOW + r"columns?\s+(.+?)" + _END, re.I)
+RE_FILTER = re.compile(
+    r"^(?:(?:only\s+|show\s+(?:me\s+)?(?:only\s+)?)?rows\s+where|filter(?:\s+by)?|where)\s+"
+    r"(.+?)\s*(==|=|!=|<>|>=|<=|>|<|\bcontains\b)\s*(.+?)" + _END,
+    re.I,
+)
+_SPLIT_COLS = re.compile(r"\s*(?:,|\band\b|&)\s*", re.I)
+
+
+@dataclass
+class FollowUp:
+    """A recognized presentation-only follow-up.
+
+    Fields:
+        kind: 'more' | 'limit' | 'sort' | 'project' | 'filter'
+        n: Row count for 'limit' (and for top/bottom-N sorts).
+        columns: Column names as typed by the user.
+        descending: Sort direction.
+        op: Comparison operator for 'filter'.
+        value: Right-hand side for 'filter'.
+        label: Human-readable description used in the reply.
+    """
+    kind: str
+    n: Optional[int] = None
+    columns: List[str] = field(default_factory=list)
+    descending: bool = False
+    op: str = ""
+    value: str = ""
+    label: str = ""
+
+
+def parse_followup(text: str) -> Optional[FollowUp]:
+    """Recognize a presentation-only follow-up; None means "ask Genie"."""
+    t = " ".join((text or "").split())
+    if not t or len(t) > 200:
+        return None
+    if RE_MORE.match(t):
+        return FollowUp(kind="more", label="more rows")
+    m = RE_TOP_BY.match(t)
+    if m:
+        n = int(m.group(2))
+        desc = m.group(1).lower() == "top"
+        return FollowUp(kind="sort", n=n, columns=[m.group(3)], descending=desc,
+                        label=f"{m.group(1).lower()} {n} by {m.group(3)}")
+    m = RE_LIMIT.match(t)
+    if m:
+        n = int(next(g for g in m.groups() if g))
+        return FollowUp(kind="limit", n=n, label=f"first {n} rows")
+    m = RE_SORT.match(t)
+    if m:
+        desc = (m.group(2) or "").lower().startswith("desc")
+        return FollowUp(kind="sort", columns=[m.group(1)], descending=desc,
+                        label=f"sorted by {m.group(1)}{' desc' if desc else ''}")
+    m = RE_PROJECT.match(t)
+    if m:
+        cols = [c for c in _SPLIT_COLS.split(m.group(1)) if c]
+        return FollowUp(kind="project", columns=cols, label="columns " + ", ".join(cols))
+    m = RE_FILTER.match(t)
+    if m:
+        op = m.group(2).lower()
+        value = m.group(3).strip().strip("'\"")
+        return FollowUp(kind="filter", columns=[m.group(1)], op=op, value=value,
+                        label=f"{m.group(1)} {op} {m.group(3)}")
+    return None
+
+
+def _as_float(v: Any) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def make_predicate(op: str, raw: str) -> Callable[[Any], bool]:
+    """Build a cell predicate.
+
+    Numbers compare numerically when both sides parse, text compares
+    case-insensitively; NULL never matches.
+    """
+    rhs_num = _as_float(raw)
+    rhs_txt = raw.casefold()
+
+    def pred(v: Any) -> bool:
+        if v is None:
+            return False
+        if op == "contains":
+            return rhs_txt in str(v).casefold()
+        lhs_num = _as_float(v) if rhs_num is not None else None
+        if lhs_num is not None:
+            a, b = lhs_num, rhs_num
+        else:
+            a, b = str(v).casefold(), rhs_txt
+        if op in ("=", "=="):
+            return a == b
+        if op in ("!=", "<>"):
+            return a != b
+        if op == ">":
+            return a > b
+        if op == "<":
+            return a < b
+        if op == ">=":
+            return a >= b
+        if op == "<=":
+            return a <= b
+        return False
+
+    return pred
+
+
+def apply_followup(
+    base: ResultTable, view: ResultTable, shown: int, f: FollowUp, page_rows: int
+) -> Optional[Tuple[ResultTable, int, ResultTable]]:
+    """Evaluate a follow-up against the previous result.
+
+    Args:
+        base: The full result returned by Genie.
+        view: The currently presented view (after earlier follow-ups).
+        shown: Rows of `view` already shown to the user.
+        f: Parsed follow-up.
+        page_rows: Rows per reply (the user's `rows` setting).
+
+    Returns:
+        (rows_to_display, new_shown, new_view) or None when the follow-up
+        cannot be answered locally (unknown column, nothing more to show...).
+    """
+    if f.kind == "more":
+        if shown >= view.num_rows:
+            return None
+        page = view.window(rows=slice(shown, shown + page_rows))
+        return page, shown + page.num_rows, view
+
+    if f.kind == "limit":
+        new_view = view.head(f.n or page_rows)
+        return new_view, new_view.num_rows, new_view
+
+    if f.kind == "sort":
+        c = base.find_column(f.columns[0])
+        if c is None:
+            return None
+        new_view = view.sort(c, descending=f.descending)
+        if f.n:
+            new_view = new_view.head(f.n)
+        return new_view, min(new_view.num_rows, page_rows), new_view
+
+    if f.kind == "project":
+        cols = [base.find_column(name) for name in f.columns]
+        if not cols or any(c is None for c in cols):
+            return None
+        new_view = view.select(cols)
+        return new_view, min(new_view.num_rows, page_rows), new_view
+
+    if f.kind == "filter":
+        c = base.find_column(f.columns[0])
+        if c is None:
+            return None
+        new_view = view.filter(c, make_predicate(f.op, f.value))
+        return new_view, min(new_view.num_rows, page_rows), new_view
+
+    return None
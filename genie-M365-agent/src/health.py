@@ -0,0 +1,147 @@
+"""Background dependency health probing.
+
+Module: health.py
+Purpose: Periodically verify that a dependency (the Databricks workspace and
+         its Genie API) is reachable and authorized, and expose the result.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/health.py
+# License: MIT
+# Description: `HealthProber` runs an async check on a jittered interval (faster
+#              while unhealthy) and flips availability after a number of
+#              consecutive failures, so a transient blip at boot or at runtime
+#              never disables the bot until a restart. State is exported as
+#              metrics and consumed by /readyz.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .metrics import REGISTRY
+
+DEPENDENCY_UP = REGISTRY.gauge(
+    "genie_dependency_up",
+    "Dependency health (1 healthy, 0 unhealthy, -1 not probed yet).",
+    ["dependency"],
+)
+PROBE_RESULTS = REGISTRY.counter(
+    "genie_dependency_probes_total",
+    "Health probes by dependency and outcome (ok|error).",
+    ["dependency", "outcome"],
+)
+PROBE_SECONDS = REGISTRY.histogram(
+    "genie_dependency_probe_seconds", "Health probe latency.", ["dependency"]
+)
+
+
+class HealthProber:
+    """Periodic async health check with hysteresis.
+
+    Args:
+        name: Dependency label (metrics / readiness output).
+        check: async () -> Any; raising (or timing out) counts as a failure.
+        interval_seconds: Probe period while healthy.
+        unhealthy_interval_seconds: Probe period while unhealthy (faster recovery).
+        jitter: Relative random spread applied to every sleep (0.2 = ±20%).
+        timeout_seconds: Per-probe timeout.
+        failure_threshold: Consecutive failures before flipping to unhealthy.
+        on_change: Optional callback(healthy, snapshot) on state transitions.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        check: Callable[[], Awaitable[Any]],
+        *,
+        interval_seconds: float = 30.0,
+        unhealthy_interval_seconds: float = 5.0,
+        jitter: float = 0.2,
+        timeout_seconds: float = 10.0,
+        failure_threshold: int = 2,
+        on_change: Optional[Callable[[bool, Dict[str, Any]], None]] = None,
+    ):
+        self.name = name
+        self._check = check
+        self.interval_seconds = interval_seconds
+        self.unhealthy_interval_seconds = unhealthy_interval_seconds
+        self.jitter = jitter
+        self.timeout_seconds = timeout_seconds
+        self.failure_threshold = max(1, failure_threshold)
+        self._on_change = on_change
+        self.healthy: Optional[bool] = None  # None until the first probe completes
+        self.consecutive_failures = 0
+        self.last_ok: Optional[float] = None  # wall-clock seconds
+        self.last_error: str = ""
+        self.last_latency_ms: Optional[int] = None
+        DEPENDENCY_UP.set_function(
+            lambda: -1.0 if self.healthy is None else float(self.healthy), dependency=name
+        )
+
+    @property
+    def available(self) -> bool:
+        """Optimistic availability: only a confirmed failure makes the dependency unavailable."""
+        return self.healthy is not False
+
+    async def probe_once(self) -> bool:
+        """Run the check once and update state; returns the probe outcome."""
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._check(), timeout=self.timeout_seconds)
+            ok, error = True, ""
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            ok, error = False, f"timeout after {self.timeout_seconds:g}s"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        elapsed = time.monotonic() - started
+        self.last_latency_ms = int(elapsed * 1000)
+        PROBE_SECONDS.observe(elapsed, dependency=self.name)
+        PROBE_RESULTS.inc(dependency=self.name, outcome="ok" if ok else "error")
+
+        previous = self.healthy
+        if ok:
+            self.consecutive_failures = 0
+            self.last_ok = time.time()
+            self.last_error = ""
+            self.healthy = True
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error[:300]
+            if previous is None or self.consecutive_failures >= self.failure_threshold:
+                self.healthy = False
+        if self.healthy != previous and self._on_change:
+            try:
+                self._on_change(bool(self.healthy), self.snapshot())
+            except Exception:
+                pass
+        return ok
+
+    def _next_sleep(self) -> float:
+        base = self.interval_seconds if self.healthy else self.unhealthy_interval_seconds
+        return max(0.5, base * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def run_forever(self):
+        """Probe immediately, then on a jittered interval until cancelled."""
+        while True:
+            try:
+                await self.probe_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            await asyncio.sleep(self._next_sleep())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly state for readiness output."""
+        return {
+            "healthy": self.healthy,
+            "consecutive_failures": self.consecutive_failures,
+            "last_ok": int(self.last_ok) if self.last_ok else None,
+            "last_error": self.last_error,
+            "latency_ms": self.last_latency_ms,
+        }
@@ -0,0 +1,114 @@
+"""Staggered (hedged) races between alternative fetch paths.
+
+Module: hedge.py
+Purpose: Start alternative ways of getting the same result a short stagger
+         apart, keep the first usable one and cancel the rest.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/hedge.py
+# License: MIT
+# Description: A query attachment's result can be read through several APIs
+#              (get_statement, the attachment query result, a re-execution).
+#              Running them strictly one after another means each fallback
+#              only starts once the previous path has burned its whole retry
+#              budget. `race_staggered()` starts the first path immediately,
+#              each further path after `stagger` seconds (or at once when every
+#              running path has failed), returns the first usable result and
+#              cancels the losers. Attempts and wins are counted per path.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from .metrics import REGISTRY
+
+FETCH_PATH_TOTAL = REGISTRY.counter(
+    "genie_fetch_path_total",
+    "Result-fetch path attempts by path and outcome (win|failed|lost|cancelled).",
+    ["path", "outcome"],
+)
+FETCH_PATH_SECONDS = REGISTRY.histogram(
+    "genie_fetch_path_seconds",
+    "Time for the winning result-fetch path to produce a usable result, by path.",
+    ["path"],
+)
+
+
+class RaceFailed(Exception):
+    """No path produced a usable result."""
+
+    def __init__(self, errors: Dict[str, Optional[BaseException]]):
+        details = ", ".join(
+            f"{path}: {type(e).__name__}: {e}" if e is not None else f"{path}: no usable result"
+            for path, e in errors.items()
+        )
+        super().__init__(details or "no fetch path available")
+        self.errors = errors
+
+
+async def race_staggered(
+    attempts: Sequence[Tuple[str, Callable[[], Awaitable[Any]]]],
+    *,
+    stagger: float,
+    usable: Callable[[Any], bool] = lambda result: result is not None,
+) -> Tuple[str, Any]:
+    """Race alternative fetch paths, started `stagger` seconds apart.
+
+    Args:
+        attempts: (path name, zero-arg coroutine factory), cheapest/preferred first.
+        stagger: Seconds to give the running paths before starting the next one
+            (0 starts all at once). The next path also starts as soon as every
+            running path has failed.
+        usable: Whether a result counts as a win (failed and unusable results
+            let the race continue).
+
+    Returns:
+        (path, result) of the first usable result.
+
+    Raises:
+        RaceFailed: Every path failed or returned an unusable result.
+    """
+    pending: Dict["asyncio.Future[Any]", Tuple[str, float]] = {}
+    errors: Dict[str, Optional[BaseException]] = {}
+    queue = list(attempts)
+
+    def _launch():
+        path, factory = queue.pop(0)
+        pending[asyncio.ensure_future(factory())] = (path, time.monotonic())
+
+    if queue:
+        _launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                set(pending),
+                timeout=stagger if queue else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                _launch()  # stagger elapsed: hedge with the next path
+                continue
+            for task in done:
+                path, started = pending.pop(task)
+                exc = task.exception()
+                if exc is None and usable(task.result()):
+                    FETCH_PATH_TOTAL.inc(path=path, outcome="win")
+                    FETCH_PATH_SECONDS.observe(time.monotonic() - started, path=path)
+                    return path, task.result()
+                FETCH_PATH_TOTAL.inc(path=path, outcome="failed")
+                errors[path] = exc
+            if not pending and queue:
+                _launch()
+        raise RaceFailed(errors)
+    finally:
+        for task, (path, _) in pending.items():
+            if task.done():
+                FETCH_PATH_TOTAL.inc(path=path, outcome="lost")
+                if not task.cancelled():
+                    task.exception()  # mark retrieved (no "exception was never retrieved" warning)
+            else:
+                task.cancel()
+                FETCH_PATH_TOTAL.inc(path=path, outcome="cancelled")
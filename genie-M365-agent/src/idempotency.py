@@ -0,0 +1,203 @@
+"""Idempotent turn processing.
+
+Module: idempotency.py
+Purpose: Recognise redelivered activities and double-sent questions so they
+         attach to (or replay) the turn already running instead of starting
+         new Genie / warehouse work.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/idempotency.py
+# License: MIT
+# Description: The Bot Connector redelivers an activity when the reply takes
+#              longer than its timeout, and users double-send while waiting.
+#              `TurnLedger` claims two kinds of keys with set-if-absent:
+#              the activity id (a redelivery is dropped) and the user's
+#              normalised question (a duplicate attaches to the running turn,
+#              or replays its stored answer once done). Running claims are
+#              leases that expire with the turn budget, so a crashed worker
+#              never blocks a question for long. Records live in a
+#              `LedgerStore`: in-process (default) or Redis, shared by all
+#              workers (`IDEMPOTENCY_BACKEND=redis`).
+# ─────────────────────────────────────────────────────────────────────────────
+
+import abc
+import hashlib
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import REGISTRY
+from .state import BoundedStateMap
+
+IDEMPOTENCY_HITS = REGISTRY.counter(
+    "genie_idempotency_hits_total",
+    "Turns not re-run because they were already running or done, "
+    "by kind (redelivery|running|replayed).",
+    ["kind"],
+)
+
+
+def question_key(user_id: str, space_id: str, text: str) -> str:
+    """Ledger key of a user's question in a space (whitespace and case normalised)."""
+    norm = " ".join((text or "").split()).casefold()
+    return f"q:{user_id}:{space_id}:{hashlib.sha256(norm.encode('utf-8')).hexdigest()[:32]}"
+
+
+class LedgerStore(abc.ABC):
+    """Interface: string records with per-key expiry."""
+
+    shared = False  # True when records are visible to other workers
+
+    @abc.abstractmethod
+    async def add(self, key: str, value: str, ttl: float) -> Optional[str]:
+        """Store value unless key exists; return the existing value (None when stored)."""
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        """Store value under key, replacing any existing record."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """Drop a record (no error when it does not exist)."""
+
+    async def close(self):
+        """Release backend resources."""
+        return None
+
+
+class MemoryLedgerStore(LedgerStore):
+    """In-process records (one event loop, so add() is atomic)."""
+
+    def __init__(self, max_entries: int = 50000, max_ttl: float = 3600.0, clock=time.monotonic):
+        self._clock = clock
+        self._map: BoundedStateMap[str, Tuple[str, float]] = BoundedStateMap(
+            "idempotency", max_entries=max_entries, ttl_seconds=max_ttl, clock=clock
+        )
+
+    async def add(self, key: str, value: str, ttl: float) -> Optional[str]:
+        """Store value unless an unexpired record exists; return that record."""
+        item = self._map.get(key)
+        if item is not None and item[1] > self._clock():
+            return item[0]
+        self._map[key] = (value, self._clock() + ttl)
+        return None
+
+    async def set(self, key: str, value: str, ttl: float):
+        """Store value with a fresh expiry."""
+        self._map[key] = (value, self._clock() + ttl)
+
+    async def delete(self, key: str):
+        """Drop the record."""
+        self._map.pop(key)
+
+
+class RedisLedgerStore(LedgerStore):
+    """Records in Redis, shared by all workers/instances (SET NX PX).
+
+    Requires the optional `redis` package (redis.asyncio).
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "genie:idem:"):
+        try:
+            import redis.asyncio as aioredis  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("IDEMPOTENCY_BACKEND=redis requires the 'redis' package.") from e
+        self._client = aioredis.from_url(url)
+        self._prefix = prefix
+
+    async def add(self, key: str, value: str, ttl: float) -> Optional[str]:
+        """SET NX with expiry; on conflict return the existing record."""
+        full = self._prefix + key
+        for _ in range(2):  # the existing record may expire between SET NX and GET
+            if await self._client.set(full, value, nx=True, px=max(1, int(ttl * 1000))):
+                return None
+            existing = await self._client.get(full)
+            if existing is not None:
+                return existing.decode("utf-8") if isinstance(existing, bytes) else str(existing)
+        return None
+
+    async def set(self, key: str, value: str, ttl: float):
+        """SET with expiry."""
+        await self._client.set(self._prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        """DEL the record."""
+        await self._client.delete(self._prefix + key)
+
+    async def close(self):
+        """Close the Redis connection pool."""
+        await self._client.aclose()
+
+
+class TurnLedger:
+    """Claims for activity ids and questions.
+
+    Args:
+        store: Record store.
+        done_ttl: Retention of a finished activity id (redeliveries within it are dropped).
+        replay_ttl: Retention of a finished question's answer for duplicates.
+        max_answer_bytes: Larger answers are not stored for replay.
+    """
+
+    def __init__(
+        self, store: LedgerStore, *, done_ttl: float, replay_ttl: float, max_answer_bytes: int
+    ):
+        self.store = store
+        self.done_ttl = done_ttl
+        self.replay_ttl = replay_ttl
+        self.max_answer_bytes = max_answer_bytes
+
+    async def claim_activity(self, activity_id: str, lease: float) -> bool:
+        """True if this worker should process the activity (False: redelivery)."""
+        existing = await self.store.add(f"a:{activity_id}", "running", lease)
+        if existing is None:
+            return True
+        IDEMPOTENCY_HITS.inc(kind="redelivery")
+        return False
+
+    async def finish_activity(self, activity_id: str):
+        """Mark an activity done (redeliveries within `done_ttl` are dropped)."""
+        await self.store.set(f"a:{activity_id}", "done", self.done_ttl)
+
+    async def claim_question(
+        self, user_id: str, space_id: str, text: str, lease: float
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Claim a question for this turn.
+
+        Returns:
+            ("new", None) when the caller runs it, ("running", None) while
+            another turn runs it, or ("replay", answer) with the stored
+            wire-format answer of a turn that just finished.
+        """
+        key = question_key(user_id, space_id, text)
+        existing = await self.store.add(key, json.dumps({"state": "running"}), lease)
+        if existing is None:
+            return "new", None
+        record = json.loads(existing)
+        if record.get("state") == "done" and isinstance(record.get("answer"), dict):
+            IDEMPOTENCY_HITS.inc(kind="replayed")
+            return "replay", record["answer"]
+        if record.get("state") == "running":
+            IDEMPOTENCY_HITS.inc(kind="running")
+            return "running", None
+        # Done without a stored answer (too large, or not shared): run it again
+        await self.store.set(key, json.dumps({"state": "running"}), lease)
+        return "new", None
+
+    async def complete_question(
+        self, user_id: str, space_id: str, text: str, answer_json: Optional[str]
+    ):
+        """Mark a question done; the answer is kept for replay when the store is shared."""
+        record = '{"state":"done"}'
+        fits = answer_json and len(answer_json.encode("utf-8")) <= self.max_answer_bytes
+        if fits and self.store.shared:
+            record = '{"state":"done","answer":' + answer_json + "}"
+        await self.store.set(question_key(user_id, space_id, text), record, self.replay_ttl)
+
+    async def release_question(self, user_id: str, space_id: str, text: str):
+        """Drop a question claim (the turn failed or was cancelled; a resend runs again)."""
+        await self.store.delete(question_key(user_id, space_id, text))
@@ -0,0 +1,221 @@
+"""In-flight Genie turn tracking and warehouse statement cancellation.
+
+Module: inflight.py
+Purpose: Know which Genie message / SQL statements each running turn owns, and
+         cancel them when nobody will read the answer.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/inflight.py
+# License: MIT
+# Description: Giving up on the Python side (timeout, `reset`, space switch, a
+#              newer question, shutdown) used to leave the warehouse statement
+#              running. `InFlightRegistry` keeps one `InFlightTurn` per key (the
+#              user id for chat turns), learns statement ids from the Genie
+#              message while it is polled, and on cancellation stops the poller
+#              and calls Statement Execution `cancel_execution` for every
+#              statement still running. Cancelled statements and their elapsed
+#              warehouse seconds are counted by reason.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from .metrics import REGISTRY
+
+CANCELLED_STATEMENTS = REGISTRY.counter(
+    "genie_cancelled_statements_total",
+    "Warehouse statements cancelled because their turn was abandoned, by reason.",
+    ["reason"],
+)
+CANCELLED_WAREHOUSE_SECONDS = REGISTRY.counter(
+    "genie_cancelled_warehouse_seconds_total",
+    "Seconds cancelled statements had been running when cancelled, by reason.",
+    ["reason"],
+)
+CANCELLED_TURNS = REGISTRY.counter(
+    "genie_cancelled_turns_total",
+    "Genie turns abandoned, by reason (timeout|reset|space_switch|superseded|shutdown).",
+    ["reason"],
+)
+
+
+class TurnCancelled(Exception):
+    """Raised inside a turn (and by the SDK poller callback) once the turn was cancelled."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"turn cancelled ({reason})")
+        self.reason = reason
+
+
+class InFlightTurn:
+    """One running Genie turn.
+
+    Attributes:
+        key: Registry key (user id for chat turns).
+        space_id: Genie Space of the turn.
+        conversation_id / message_id: Genie identifiers once known.
+        statements: Running statement id -> monotonic time first seen.
+        reason: Cancellation reason (None while active).
+    """
+
+    def __init__(self, key: str, space_id: str):
+        self.key = key
+        self.space_id = space_id
+        self.started = time.monotonic()
+        self.conversation_id: Optional[str] = None
+        self.message_id: Optional[str] = None
+        self.statements: Dict[str, float] = {}
+        self.reason: Optional[str] = None
+        self.message_done = False
+        self.cancelled = asyncio.Event()
+
+    def check(self):
+        """Raise TurnCancelled if the turn was cancelled."""
+        if self.reason:
+            raise TurnCancelled(self.reason)
+
+    def add_statement(self, statement_id: Optional[str]):
+        """Track a statement this turn started (may be called from worker threads)."""
+        if statement_id and statement_id not in self.statements:
+            self.statements[statement_id] = time.monotonic()
+
+    def finish_statement(self, statement_id: Optional[str]):
+        """Forget a statement that reached a terminal state."""
+        if statement_id:
+            self.statements.pop(statement_id, None)
+
+    def observe_message(self, message: Any):
+        """SDK poller callback: record ids and stop polling once cancelled.
+
+        Runs in the polling thread.
+        """
+        self.check()
+        self.record(message)
+
+    def record(self, message: Any):
+        """Record conversation/message/statement ids from a GenieMessage."""
+        self.conversation_id = getattr(message, "conversation_id", None) or self.conversation_id
+        message_id = getattr(message, "id", None) or getattr(message, "message_id", None)
+        self.message_id = message_id or self.message_id
+        for att in getattr(message, "attachments", None) or []:
+            self.add_statement(getattr(getattr(att, "query", None), "statement_id", None))
+
+    def mark_message_done(self):
+        """The Genie message completed: its query statement is no longer running."""
+        self.message_done = True
+        self.statements.clear()
+
+
+class InFlightRegistry:
+    """Running turns by key, with cancellation.
+
+    Args:
+        cancel_statement: Blocking callable(statement_id) (runs in a thread).
+        lookup_message: Optional async (turn) -> message used at cancel time
+            when no statement id was observed yet (the query may have started
+            between two polls).
+    """
+
+    def __init__(
+        self,
+        cancel_statement: Callable[[str], Any],
+        lookup_message: Optional[Callable[[InFlightTurn], Awaitable[Any]]] = None,
+    ):
+        self._cancel_statement = cancel_statement
+        self._lookup_message = lookup_message
+        self._turns: Dict[str, InFlightTurn] = {}
+        self._pending: Set["asyncio.Task[None]"] = set()
+        REGISTRY.gauge("genie_inflight_turns", "Genie turns currently in flight.").set_function(
+            lambda: float(len(self._turns))
+        )
+
+    def begin(self, key: str, space_id: str) -> InFlightTurn:
+        """Register a new turn under key (an older turn with the same key is superseded)."""
+        self.cancel(key, "superseded")
+        turn = InFlightTurn(key, space_id)
+        self._turns[key] = turn
+        return turn
+
+    def end(self, turn: InFlightTurn):
+        """Unregister a finished turn."""
+        if self._turns.get(turn.key) is turn:
+            del self._turns[turn.key]
+
+    def get(self, key: str) -> Optional[InFlightTurn]:
+        """The turn registered under key, if any."""
+        return self._turns.get(key)
+
+    def cancel(self, key: str, reason: str) -> bool:
+        """Cancel the turn registered under key, if any (non-blocking)."""
+        turn = self._turns.get(key)
+        if turn is None:
+            return False
+        self.cancel_turn(turn, reason)
+        return True
+
+    def cancel_turn(self, turn: InFlightTurn, reason: str, *, wake: bool = True):
+        """Mark a turn cancelled and cancel its statements in the background.
+
+        Args:
+            turn: The registered turn.
+            reason: Cancellation reason (metric label and `TurnCancelled.reason`).
+            wake: Abandon the turn's awaiting caller (`run` raises TurnCancelled).
+                False when the turn itself gave up and reports its own error.
+        """
+        if turn.reason:
+            return
+        turn.reason = reason
+        if wake:
+            turn.cancelled.set()
+        self.end(turn)
+        CANCELLED_TURNS.inc(reason=reason)
+        task = asyncio.get_running_loop().create_task(self._cancel_statements(turn, reason))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _cancel_statements(self, turn: InFlightTurn, reason: str):
+        unknown = not turn.statements and not turn.message_done
+        if unknown and turn.message_id and self._lookup_message:
+            try:
+                turn.record(await self._lookup_message(turn))
+            except Exception:
+                pass
+        now = time.monotonic()
+        for statement_id, since in list(turn.statements.items()):
+            try:
+                await asyncio.to_thread(self._cancel_statement, statement_id)
+            except Exception:
+                continue
+            turn.statements.pop(statement_id, None)
+            CANCELLED_STATEMENTS.inc(reason=reason)
+            CANCELLED_WAREHOUSE_SECONDS.inc(max(0.0, now - since), reason=reason)
+
+    async def cancel_all(self, reason: str, *, timeout: float = 5.0):
+        """Cancel every turn and wait (bounded) for the cancel calls to go out (shutdown)."""
+        for turn in list(self._turns.values()):
+            self.cancel_turn(turn, reason)
+        if self._pending:
+            await asyncio.wait(list(self._pending), timeout=timeout)
+
+    async def run(self, turn: InFlightTurn, work: Awaitable[Any]) -> Any:
+        """Await work for a turn, abandoning it as soon as the turn is cancelled.
+
+        Raises:
+            TurnCancelled: The turn was cancelled before work finished.
+        """
+        task = asyncio.ensure_future(work)
+        waiter = asyncio.ensure_future(turn.cancelled.wait())
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            waiter.cancel()
+        if task.done():
+            return task.result()
+        task.cancel()
+        raise TurnCancelled(turn.reason or "cancelled")
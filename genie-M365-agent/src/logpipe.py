@@ -0,0 +1,225 @@
+"""Asynchronous, batched structured logging.
+
+Module: logpipe.py
+Purpose: Keep JSON encoding and log stream writes off the event loop.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/logpipe.py
+# License: MIT
+# Description: `install_logging()` routes every logger through a bounded
+#              `QueueHandler`; a `QueueListener` thread encodes records (dict
+#              payloads become one JSON line each) and writes them to stderr in
+#              batches. A full queue drops records instead of blocking the loop,
+#              and high-volume events can be sampled; both are counted.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Union
+
+from .metrics import REGISTRY
+
+try:  # optional fast encoder
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_MAX = int(os.getenv("LOG_BATCH_MAX", "256"))
+# Per-event sampling, e.g. "access_probe=0.01,genie_retry=0.5"
+# (warnings and errors are never sampled)
+LOG_SAMPLE_RATES: Dict[str, float] = {}
+for _pair in os.getenv("LOG_SAMPLE_RATES", "access_probe=0.01").split(","):
+    _k, _, _v = _pair.partition("=")
+    try:
+        if _k.strip():
+            LOG_SAMPLE_RATES[_k.strip()] = max(0.0, min(1.0, float(_v)))
+    except ValueError:
+        continue
+
+LOG_DROPPED = REGISTRY.counter(
+    "genie_log_records_dropped_total",
+    "Log records not written, by reason (queue_full|sampled).",
+    ["reason"],
+)
+LOG_WRITTEN = REGISTRY.counter(
+    "genie_log_records_written_total", "Log records written by the listener."
+)
+LOG_BATCHES = REGISTRY.counter("genie_log_batches_total", "Batched writes to the log stream.")
+
+_queue: Optional["queue.Queue[logging.LogRecord]"] = None
+_listener: Optional[QueueListener] = None
+
+
+def dumps(payload: Dict[str, Any]) -> str:
+    """Encode a structured payload as one JSON line (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode("utf-8")
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def structured(payload: Dict[str, Any]) -> Union[Dict[str, Any], str]:
+    """Prepare a payload for `logger.log()`.
+
+    With the pipeline installed the dict itself is logged and encoded on the
+    listener thread; otherwise it is encoded here, as before.
+    """
+    return payload if _listener is not None else dumps(payload)
+
+
+def sampled(key: str, level: int = logging.INFO) -> bool:
+    """True if a record for `key` should be logged (per LOG_SAMPLE_RATES).
+
+    Records at WARNING and above are always kept.
+    """
+    rate = LOG_SAMPLE_RATES.get(key)
+    if rate is None or level >= logging.WARNING or random.random() < rate:
+        return True
+    LOG_DROPPED.inc(reason="sampled")
+    return False
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Formats dict messages as JSON and everything else as '%(message)s'."""
+
+    def __init__(self):
+        super().__init__("%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Render one record (dict messages as a JSON line, exception text appended)."""
+        if isinstance(record.msg, dict):
+            line = dumps(record.msg)
+            if record.exc_text:
+                line += "\n" + record.exc_text
+            return line
+        return super().format(record)
+
+
+class _BoundedQueueHandler(QueueHandler):
+    """Never blocks: records are dropped (and counted) when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if isinstance(record.msg, dict):
+            # Defer JSON encoding to the listener thread; only materialize tracebacks here.
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(reason="queue_full")
+
+
+class _BatchingStreamHandler(logging.StreamHandler):
+    """Listener-side handler that coalesces records into one write.
+
+    A batch is written when it reaches LOG_BATCH_MAX lines or when the queue
+    has drained, so idle latency stays at one record while bursts cost one
+    syscall per batch.
+    """
+
+    def __init__(self, source: "queue.Queue[logging.LogRecord]", stream=None, max_batch: int = 256):
+        super().__init__(stream or sys.stderr)
+        self._source = source
+        self._max_batch = max(1, max_batch)
+        self._buf: list = []
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self._buf.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._buf) >= self._max_batch or self._source.empty():
+            self.flush()
+
+    def flush(self):
+        if not self._buf:
+            return
+        lines, self._buf = self._buf, []
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+            LOG_WRITTEN.inc(len(lines))
+            LOG_BATCHES.inc()
+        except Exception:
+            pass
+
+
+def log_queue_stats() -> Dict[str, Any]:
+    """Queue depth/capacity and drop count (cheap; for readiness output)."""
+    q = _queue
+    return {
+        "depth": q.qsize() if q is not None else 0,
+        "capacity": q.maxsize if q is not None else 0,
+        "dropped": int(LOG_DROPPED.value(reason="queue_full")),
+    }
+
+
+def install_logging(level: int = logging.INFO, stream=None) -> QueueListener:
+    """Route all logging through the bounded queue and start the listener thread.
+
+    Replaces handlers on the root logger and removes handlers previously
+    attached to named loggers that also propagate to root (they printed every
+    line twice). Idempotent.
+    """
+    global _queue, _listener
+    if _listener is not None:
+        return _listener
+    _queue = queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE))
+    REGISTRY.gauge(
+        "genie_log_queue_depth", "Log records waiting to be written."
+    ).set_function(_queue.qsize)
+
+    out = _BatchingStreamHandler(_queue, stream=stream, max_batch=LOG_BATCH_MAX)
+    out.setFormatter(JsonLineFormatter())
+    _listener = QueueListener(_queue, out, respect_handler_level=False)
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(_BoundedQueueHandler(_queue))
+    root.setLevel(level)
+    for name in list(logging.root.manager.loggerDict):
+        lg = logging.getLogger(name)
+        if lg.propagate:
+            for h in list(lg.handlers):
+                if isinstance(h, logging.StreamHandler):
+                    lg.removeHandler(h)
+
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Stop the listener, writing everything still queued."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    try:
+        listener.stop()
+    finally:
+        for h in listener.handlers:
+            h.flush()
+        # Anything logged after shutdown goes straight to stderr again
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            if isinstance(h, _BoundedQueueHandler):
+                root.removeHandler(h)
+        fallback = logging.StreamHandler()
+        fallback.setFormatter(JsonLineFormatter())
+        root.addHandler(fallback)
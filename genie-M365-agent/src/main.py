@@ -1,5 +1,4 @@
-"""
-Microsoft Agents (`microsoft_agents`) application for use with M365 (Teams / Playground / Copilot Studio).
+"""Microsoft Agents (`microsoft_agents`) application for M365 (Teams / Playground / Copilot Studio).
 
 Module: main.py
 Purpose: Web application host for a Microsoft Agents-based bot (Databricks Genie – M365 Agents).
@@ -17,48 +16,77 @@ Purpose: Web application host for a Microsoft Agents-based bot (Databricks Genie
 #              Playground/Copilot Studio integration.
 # ─────────────────────────────────────────────────────────────────────────────
 
-import logging
+import asyncio
 import json
+import logging
 import time
 import uuid
 from dataclasses import dataclass, field
-from typing import Callable, Awaitable, Optional, Dict, Any, List
 from os import environ
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from aiohttp import web
-from aiohttp.web import Request, Response, Application
+from aiohttp.web import Application, Request, Response
 from aiohttp.web_middlewares import normalize_path_middleware
-
-from microsoft_agents.hosting.core import AgentApplication
 from microsoft_agents.hosting.aiohttp import (
-    start_agent_process,
-    jwt_authorization_middleware,
     CloudAdapter,
+    jwt_authorization_middleware,
+    start_agent_process,
+)
+from microsoft_agents.hosting.core import AgentApplication
+
+from .agent import (
+    AGENT_APP,
+    BOT,
+    CONNECTION_MANAGER,
+    DATABRICKS_SPACE_ID,
+    EXPORT_MOUNT,
+    EXPORTS,
+    LEDGER,
+    LIMITER,
+    OUTBOUND,
+    OUTBOUND_ENABLED,
+    PREFETCH,
+    PREFETCH_ENABLED,
+    SCHEMA,
+    SCHEMA_INDEX_ENABLED,
+    SUBSCRIPTIONS,
+    SUBSCRIPTIONS_ENABLED,
+    batch_status,
+    parse_batch_prompts,
+)
+from .agent import (
+    VERSION as AGENT_VERSION,
 )
 
 # Agent artifacts (import from local package)
-from .agent import AGENT_APP, CONNECTION_MANAGER, VERSION as AGENT_VERSION
+from .logpipe import install_logging, log_queue_stats, sampled, structured
+from .metrics import REGISTRY
+from .payload import COMPRESS_MIN_BYTES, PAYLOAD_BYTES, compact_json
+from .static_files import StaticAssets
 
 # ------------------------------------------------------------------------------
 # Logging
 # ------------------------------------------------------------------------------
+# Every logger goes through the bounded queue; encoding and writes happen on
+# the listener thread (see src/logpipe.py).
+install_logging(logging.INFO)
+
 ms_agents_logger = logging.getLogger("microsoft_agents")
-ms_agents_logger.addHandler(logging.StreamHandler())
 ms_agents_logger.setLevel(logging.INFO)
 
 logger = logging.getLogger("app")
-handler = logging.StreamHandler()
-handler.setFormatter(logging.Formatter("%(message)s"))
-logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+# Access logs for these paths are sampled (LOG_SAMPLE_RATES "access_probe")
+PROBE_PATHS = frozenset({"/healthz", "/readyz", "/livez", "/metrics"})
+
 
 # ------------------------------------------------------------------------------
 # Environment helpers
 # ------------------------------------------------------------------------------
 def _env_bool(name: str, default: bool = False) -> bool:
-    """
-    Parse a boolean configuration value from an environment variable.
+    """Parse a boolean configuration value from an environment variable.
 
     Truthy values (case-insensitive): {"1", "true", "yes", "on", "y"}
 
@@ -76,8 +104,7 @@ def _env_bool(name: str, default: bool = False) -> bool:
 
 
 def _env_int(name: str, default: int) -> int:
-    """
-    Parse an integer configuration value from an environment variable.
+    """Parse an integer configuration value from an environment variable.
 
     Args:
         name: Environment variable name.
@@ -93,8 +120,7 @@ def _env_int(name: str, default: int) -> int:
 
 
 def _env_csv(name: str, default: str = "") -> List[str]:
-    """
-    Parse a comma-separated list from an environment variable.
+    """Parse a comma-separated list from an environment variable.
 
     Args:
         name: Environment variable name.
@@ -112,22 +138,26 @@ def _env_csv(name: str, default: str = "") -> List[str]:
 # ------------------------------------------------------------------------------
 @dataclass
 class AppConfig:
-    """
-    Application configuration loaded from environment variables.
+    """Application configuration loaded from environment variables.
 
     Environment variables and defaults:
         HOST: Host interface to bind to (default "0.0.0.0").
         PORT: Primary HTTP port (default 8000).
         BASE_API: Base path to mount the API sub-app (default "/api").
         MESSAGES_PATH: Relative path under BASE_API for bot messages (default "/messages").
+        PROMPTS_PATH: Relative path under BASE_API for batch prompts (default "/prompts").
         PUBLIC_MOUNT: URL path prefix for static files (default "/public").
         PUBLIC_DIR: Filesystem directory serving static assets (default "./public").
 
         CLIENT_MAX_SIZE_MB: Max request size in megabytes for the root app (default 10).
         ENABLE_CORS: Enable CORS responses (default False).
         ALLOWED_ORIGINS: CSV list of allowed origins for CORS (default empty).
-        STATIC_CACHE_SECONDS: Cache duration for static assets (default 3600).
-        ENABLE_METRICS: Toggle metrics (placeholder; not used in this module).
+        STATIC_CACHE_SECONDS: Cache duration for unversioned static asset URLs (default 3600).
+        STATIC_WATCH: Reload changed files under PUBLIC_DIR while running (dev; default DEBUG).
+        ENABLE_METRICS: Expose Prometheus-format metrics on /metrics (default False).
+        READY_REQUIRES_GENIE: Report not-ready (503) on /readyz while the Genie health
+                              probe is failing (default True).
+        READYZ_CACHE_MS: How long a /readyz body is reused (default 1000).
         LOG_LEVEL: Application log level (default "INFO").
         DEBUG: Enable debug responses in error payloads (default False).
 
@@ -139,6 +169,7 @@ class AppConfig:
     port: int = _env_int("PORT", 8000)
     base_api: str = environ.get("BASE_API", "/api")
     messages_path: str = environ.get("MESSAGES_PATH", "/messages")
+    prompts_path: str = environ.get("PROMPTS_PATH", "/prompts")
     public_mount: str = environ.get("PUBLIC_MOUNT", "/public")
     public_dir: str = environ.get("PUBLIC_DIR", "./public")
 
@@ -146,7 +177,10 @@ class AppConfig:
     enable_cors: bool = _env_bool("ENABLE_CORS", False)
     allowed_origins: List[str] = field(default_factory=lambda: _env_csv("ALLOWED_ORIGINS", ""))
     static_cache_seconds: int = _env_int("STATIC_CACHE_SECONDS", 3600)
+    static_watch: bool = _env_bool("STATIC_WATCH", _env_bool("DEBUG", False))
     enable_metrics: bool = _env_bool("ENABLE_METRICS", False)
+    ready_requires_genie: bool = _env_bool("READY_REQUIRES_GENIE", True)
+    readyz_cache_seconds: float = float(_env_int("READYZ_CACHE_MS", 1000)) / 1000.0
     log_level: str = environ.get("LOG_LEVEL", "INFO").upper()
     debug: bool = _env_bool("DEBUG", False)
 
@@ -154,8 +188,7 @@ class AppConfig:
     compat_listen_3978: bool = _env_bool("COMPAT_LISTEN_3978", True)
 
     def client_max_size_bytes(self) -> int:
-        """
-        Convert the client_max_size_mb setting to bytes.
+        """Convert the client_max_size_mb setting to bytes.
 
         Returns:
             The request size limit in bytes (minimum 1 MB).
@@ -170,8 +203,7 @@ class AppConfig:
 async def error_middleware(
     request: Request, handler: Callable[[Request], Awaitable[Response]]
 ) -> Response:
-    """
-    Global error translator.
+    """Global error translator.
 
     - Converts uncaught web.HTTPException into JSON with {error, status, detail?}.
     - Converts any other Exception into 500 JSON payload.
@@ -194,7 +226,7 @@ async def error_middleware(
     except Exception as e:
         req_id = request.get("request_id", "")
         logger.error(
-            json.dumps(
+            structured(
                 {
                     "event": "unhandled_exception",
                     "request_id": req_id,
@@ -204,7 +236,8 @@ async def error_middleware(
             )
         )
         payload = {"error": "Internal server error", "status": 500}
-        if isinstance(request, Request) and request.app.get("config", None) and request.app["config"].debug:
+        app_config = request.app.get("config", None) if isinstance(request, Request) else None
+        if app_config and app_config.debug:
             payload["detail"] = str(e)
         return web.json_response(payload, status=500)
 
@@ -213,8 +246,7 @@ async def error_middleware(
 async def request_logger_middleware(
     request: Request, handler: Callable[[Request], Awaitable[Response]]
 ) -> Response:
-    """
-    Access logger and request ID injector.
+    """Access logger and request ID injector.
 
     - Assigns/propagates an X-Request-ID for correlation.
     - Logs JSON line with method, path, status, duration, remote, user agent.
@@ -233,20 +265,22 @@ async def request_logger_middleware(
         if "resp" in locals():
             status_code = getattr(resp, "status", status_code)
 
-        logger.info(
-            json.dumps(
-                {
-                    "event": "access",
-                    "request_id": req_id,
-                    "method": getattr(request, "method", "<no-method>"),
-                    "path": getattr(request, "path", "<no-path>"),
-                    "status": status_code,
-                    "duration_ms": duration_ms,
-                    "remote": request.remote,
-                    "user_agent": request.headers.get("User-Agent", ""),
-                }
+        path = getattr(request, "path", "<no-path>")
+        if path not in PROBE_PATHS or sampled("access_probe"):
+            logger.info(
+                structured(
+                    {
+                        "event": "access",
+                        "request_id": req_id,
+                        "method": getattr(request, "method", "<no-method>"),
+                        "path": path,
+                        "status": status_code,
+                        "duration_ms": duration_ms,
+                        "remote": request.remote,
+                        "user_agent": request.headers.get("User-Agent", ""),
+                    }
+                )
             )
-        )
 
         # Best-effort header injection
         try:
@@ -260,8 +294,7 @@ async def request_logger_middleware(
 async def security_headers_middleware(
     request: Request, handler: Callable[[Request], Awaitable[Response]]
 ) -> Response:
-    """
-    Apply a minimal set of security-related response headers.
+    """Apply a minimal set of security-related response headers.
 
     Sets:
         X-Content-Type-Options=nosniff
@@ -280,8 +313,7 @@ async def security_headers_middleware(
 
 
 def cors_middleware_factory(config: AppConfig):
-    """
-    Build a CORS middleware driven by AppConfig.
+    """Build a CORS middleware driven by AppConfig.
 
     Behavior:
         - If ENABLE_CORS is false, simply delegates to next handler.
@@ -326,8 +358,7 @@ def cors_middleware_factory(config: AppConfig):
 # Request handlers
 # ------------------------------------------------------------------------------
 async def handle_root(request: Request) -> Response:
-    """
-    Simple landing page with pointers to health endpoints and API path.
+    """Simple landing page with pointers to health endpoints and API path.
 
     Args:
         request: Incoming HTTP request.
@@ -352,41 +383,67 @@ async def handle_root(request: Request) -> Response:
     return web.Response(text=html, content_type="text/html")
 
 
+# Precomputed probe bodies (served by probe_fastpath_middleware)
+_HEALTHZ_BODY = b'{"status": "ok"}'
+_LIVEZ_BODY = b'{"status": "alive"}'
+
+
+def _probe_response(body: bytes, status: int = 200) -> Response:
+    return web.Response(
+        body=body,
+        status=status,
+        content_type="application/json",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
 async def healthz(_req: Request) -> Response:
-    """
-    Liveness-style health endpoint.
+    """Liveness-style health endpoint.
 
     Returns:
         JSON {'status': 'ok'}
     """
-    return web.json_response({"status": "ok"})
+    return _probe_response(_HEALTHZ_BODY)
 
 
 async def livez(_req: Request) -> Response:
-    """
-    Process heartbeat endpoint (alias of health in this app).
+    """Process heartbeat endpoint (alias of health in this app).
 
     Returns:
         JSON {'status': 'alive'}
     """
-    return web.json_response({"status": "alive"})
+    return _probe_response(_LIVEZ_BODY)
 
 
-async def readiness_check(app: Application) -> Dict[str, Any]:
+async def metrics_endpoint(_req: Request) -> Response:
+    """Prometheus text exposition of the in-process metrics registry.
+
+    Returns:
+        text/plain metrics payload (format version 0.0.4).
     """
-    Internal readiness probe, verifying required objects are mounted.
+    return web.Response(
+        text=REGISTRY.render_prometheus(),
+        content_type="text/plain",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+async def readiness_check(app: Application) -> Dict[str, Any]:
+    """Internal readiness probe, verifying required objects are mounted.
 
     Checks:
         - 'agent_app' (AgentApplication)
         - 'adapter' (CloudAdapter)
         - 'api_app' (API sub-application presence)
+        - Genie health from the background prober (cached; no remote call here).
+          Only gates readiness when READY_REQUIRES_GENIE is on.
 
     Args:
         app: The root aiohttp application.
 
     Returns:
         Dict with readiness fields:
-            ready (bool), reasons (list[str]), version (str)
+            ready (bool), reasons (list[str]), version (str), dependencies (dict)
     """
     ready = True
     reasons: List[str] = []
@@ -399,23 +456,112 @@ async def readiness_check(app: Application) -> Dict[str, Any]:
     if "api_app" not in app:
         ready = False
         reasons.append("api subapp missing")
-    return {"ready": ready, "reasons": reasons, "version": AGENT_VERSION}
+    dependencies: Dict[str, Any] = {
+        "state_store": LIMITER.health(),
+        "log_queue": log_queue_stats(),
+        "genie_slots": BOT.genie_slots_snapshot(),
+        "outbound": OUTBOUND.stats(),
+        "subscriptions": SUBSCRIPTIONS.stats(),
+    }
+    if BOT.is_configured():
+        dependencies["genie"] = BOT.health.snapshot()
+        dependencies["schema_index"] = SCHEMA.describe()
+        config: Optional[AppConfig] = app.get("config")
+        if BOT.health.healthy is False and (config is None or config.ready_requires_genie):
+            ready = False
+            reasons.append(f"genie unreachable: {BOT.health.last_error}")
+    return {
+        "ready": ready,
+        "reasons": reasons,
+        "version": AGENT_VERSION,
+        "dependencies": dependencies,
+    }
 
 
 async def readyz(req: Request) -> Response:
-    """
-    Public readiness endpoint.
+    """Public readiness endpoint.
+
+    The body only reflects cached state (the Genie prober, rate-limit store,
+    queues) and is rebuilt at most once per READYZ_CACHE_SECONDS.
 
     Returns:
         200 with readiness JSON when ready, else 503.
     """
-    status = await readiness_check(req.app)
-    return web.json_response(status, status=200 if status["ready"] else 503)
+    app = req.app
+    cached = app.get("_readyz_cache")
+    now = time.monotonic()
+    if cached is None or now - cached[0] >= app["config"].readyz_cache_seconds:
+        status = await readiness_check(app)
+        cached = (now, json.dumps(status).encode("utf-8"), 200 if status["ready"] else 503)
+        app["_readyz_cache"] = cached
+    return _probe_response(cached[1], cached[2])
 
 
-async def entry_point(req: Request) -> Response:
+_PROBES = {"/healthz": healthz, "/livez": livez, "/readyz": readyz}
+
+
+@web.middleware
+async def probe_fastpath_middleware(
+    request: Request, handler: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """Serve /healthz, /livez and /readyz ahead of every other middleware.
+
+    Probes arrive every few seconds from several regions; they skip path
+    normalization, request-id generation, CORS and security headers, and are
+    access-logged only when sampled (LOG_SAMPLE_RATES "access_probe").
     """
-    Bot Framework entry point that forwards incoming activities to the agent.
+    probe = _PROBES.get(request.path)
+    if probe is None or request.method not in ("GET", "HEAD"):
+        return await handler(request)
+    start = time.monotonic()
+    resp = await probe(request)
+    if sampled("access_probe"):
+        logger.info(
+            structured(
+                {
+                    "event": "access",
+                    "request_id": request.headers.get("X-Request-ID", ""),
+                    "method": request.method,
+                    "path": request.path,
+                    "status": resp.status,
+                    "duration_ms": int((time.monotonic() - start) * 1000),
+                    "remote": request.remote,
+                    "user_agent": request.headers.get("User-Agent", ""),
+                }
+            )
+        )
+    return resp
+
+
+async def export_download(req: Request) -> web.StreamResponse:
+    """Serve a finished export through its signed, expiring URL.
+
+    The file is streamed with aiohttp's FileResponse, which uses the kernel
+    `sendfile` path when available (chunked, no copy through Python buffers).
+
+    Returns:
+        The file as an attachment, or 404 for unknown/expired/tampered links.
+    """
+    f = EXPORTS.resolve(
+        req.match_info.get("export_id", ""),
+        req.query.get("exp", ""),
+        req.query.get("sig", ""),
+    )
+    if f is None:
+        raise web.HTTPNotFound(reason="Export not found or expired")
+    return web.FileResponse(
+        f.path,
+        chunk_size=256 * 1024,
+        headers={
+            "Content-Type": f.content_type,
+            "Content-Disposition": f'attachment; filename="{f.filename}"',
+            "Cache-Control": "private, no-store",
+        },
+    )
+
+
+async def entry_point(req: Request) -> Response:
+    """Bot Framework entry point that forwards incoming activities to the agent.
 
     The request is validated by the JWT authorization middleware at the API
     sub-app level before reaching this handler.
@@ -431,16 +577,66 @@ async def entry_point(req: Request) -> Response:
     return await start_agent_process(req, agent, adapter)
 
 
+def _batch_error(trace_id: str, error: str) -> Dict[str, Any]:
+    """Batch response body for a request rejected before any prompt ran."""
+    return {"traceId": trace_id, "elapsedMs": 0, "status": "error", "error": error, "responses": []}
+
+
+async def prompts_entry_point(req: Request) -> Response:
+    """Batch prompt endpoint for automation callers (JWT-protected like /messages).
+
+    Body:
+        {"prompts": [str | {"id", "prompt", "timeoutSeconds"}], "timeoutSeconds"?, "spaceId"?}
+
+    Returns:
+        JSON {traceId, elapsedMs, status (ok|partial|error), error, responses[]},
+        where each response has id/status/response/elapsedMs/error. Large bodies
+        are compressed when the caller sends Accept-Encoding.
+    """
+    trace_id = str(uuid.uuid4())
+    started = time.monotonic()
+    try:
+        payload = await req.json()
+    except Exception:
+        raise web.HTTPBadRequest(reason="Body must be JSON")
+    items, err = parse_batch_prompts(payload)
+    if err:
+        return web.json_response(_batch_error(trace_id, err), status=400)
+    if not BOT.is_enabled():
+        return web.json_response(_batch_error(trace_id, BOT.health_summary()), status=503)
+    space_id = str(payload.get("spaceId") or DATABRICKS_SPACE_ID)
+    claims = getattr(req.get("claims_identity"), "claims", None) or {}
+    limited = await BOT.check_rate_limit(
+        claims.get("appid") or claims.get("azp"), claims.get("tid"), space_id, cost=len(items)
+    )
+    if limited:
+        return web.json_response(_batch_error(trace_id, limited), status=429)
+    results = await BOT.ask_batch(items, space_id)
+    status = batch_status(results)
+    failed = sum(r["status"] != "ok" for r in results)
+    resp = web.json_response({
+        "traceId": trace_id,
+        "elapsedMs": int((time.monotonic() - started) * 1000),
+        "status": status,
+        "error": "" if status == "ok" else f"{failed} prompt(s) failed",
+        "responses": results,
+    }, dumps=compact_json)
+    PAYLOAD_BYTES.observe(len(resp.body), kind="json")
+    if len(resp.body) >= COMPRESS_MIN_BYTES:
+        resp.enable_compression()  # gzip/deflate per the caller's Accept-Encoding
+    return resp
+
+
 # ------------------------------------------------------------------------------
 # API sub-application
 # ------------------------------------------------------------------------------
 def build_api_subapp(config: AppConfig) -> Application:
-    """
-    Construct the API sub-application.
+    """Construct the API sub-application.
 
     Routes:
         GET  {BASE_API}{MESSAGES_PATH} -> readiness-only (returns {'status': 'ok'})
         POST {BASE_API}{MESSAGES_PATH} -> bot entry point (protected by JWT)
+        POST {BASE_API}{PROMPTS_PATH}  -> batch prompts (protected by JWT)
 
     Middlewares:
         - messages_ready_middleware: Treats GET /messages as a lightweight readiness check.
@@ -464,7 +660,8 @@ def build_api_subapp(config: AppConfig) -> Application:
 
     @web.middleware
     async def auth_guard_mw(request: Request, handler: Callable[[Request], Awaitable[Response]]):
-        if request.method == "POST" and request.path.endswith(config.messages_path):
+        guarded = (config.messages_path, config.prompts_path)
+        if request.method == "POST" and request.path.endswith(guarded):
             auth = request.headers.get("Authorization", "")
             if not auth.startswith("Bearer "):
                 return web.json_response({"error": "Unauthorized"}, status=401)
@@ -475,6 +672,7 @@ def build_api_subapp(config: AppConfig) -> Application:
     )
 
     api_app.router.add_post(config.messages_path, entry_point)
+    api_app.router.add_post(config.prompts_path, prompts_entry_point)
     api_app.router.add_get(config.messages_path, lambda _req: web.json_response({"status": "ok"}))
 
     api_app["agent_configuration"] = CONNECTION_MANAGER.get_default_connection_configuration()
@@ -488,8 +686,7 @@ def build_api_subapp(config: AppConfig) -> Application:
 # Root app factory
 # ------------------------------------------------------------------------------
 def create_app(argv: Optional[List[str]] = None) -> Application:
-    """
-    Build and configure the root aiohttp application.
+    """Build and configure the root aiohttp application.
 
     Composition:
         - Normalizes paths (no trailing slashes).
@@ -497,9 +694,11 @@ def create_app(argv: Optional[List[str]] = None) -> Application:
         - Translates uncaught errors into JSON.
         - Optionally applies CORS.
         - Adds security headers.
-        - Serves static files under PUBLIC_MOUNT with soft cache headers.
+        - Serves static files under PUBLIC_MOUNT from memory (see src/static_files.py).
+        - Serves signed export downloads under EXPORT_MOUNT.
         - Mounts the API sub-app at BASE_API.
         - Exposes health (/healthz), readiness (/readyz), and liveness (/livez).
+        - Exposes /metrics when ENABLE_METRICS is on.
         - Optionally starts a compatibility server on port 3978 for local testing.
 
     Args:
@@ -513,6 +712,7 @@ def create_app(argv: Optional[List[str]] = None) -> Application:
 
     root_app = web.Application(
         middlewares=[
+            probe_fastpath_middleware,
             normalize_path_middleware(append_slash=False, remove_slash=True),
             request_logger_middleware,
             error_middleware,
@@ -527,24 +727,17 @@ def create_app(argv: Optional[List[str]] = None) -> Application:
     root_app.router.add_get("/healthz", healthz)
     root_app.router.add_get("/readyz", readyz)
     root_app.router.add_get("/livez", livez)
+    if config.enable_metrics:
+        root_app.router.add_get("/metrics", metrics_endpoint)
 
-    # Static files with gentle caching (as a middleware to set Cache-Control only when applicable)
-    @web.middleware
-    async def static_cache_mw(
-        request: Request, handler: Callable[[Request], Awaitable[Response]]
-    ):
-        """
-        Append Cache-Control headers for responses under PUBLIC_MOUNT.
-        """
-        resp = await handler(request)
-        if request.path.startswith(config.public_mount):
-            resp.headers.setdefault("Cache-Control", f"public, max-age={config.static_cache_seconds}")
-        return resp
+    # Static files served from memory (precompressed variants, per-encoding ETags, 304)
+    assets = StaticAssets(config.public_dir, max_age_seconds=config.static_cache_seconds)
+    assets.load()
+    root_app["static_assets"] = assets
+    root_app.router.add_get(config.public_mount.rstrip("/") + "/{path:.+}", assets.handle)
 
-    root_app.middlewares.append(static_cache_mw)
-    root_app.router.add_static(
-        config.public_mount, config.public_dir, show_index=False, follow_symlinks=True
-    )
+    # Signed, expiring downloads for `export csv|parquet`
+    root_app.router.add_get(EXPORT_MOUNT.rstrip("/") + "/{export_id}/{filename}", export_download)
 
     # API sub-application
     api_app = build_api_subapp(config)
@@ -558,13 +751,33 @@ def create_app(argv: Optional[List[str]] = None) -> Application:
 
     # Lifecycle hooks
     async def on_startup(app: Application):
+        """Start background work when the application starts.
+
+        - Logs startup event/version.
+        - Starts the export janitor (TTL cleanup of download files).
+        - Starts the prefetch scheduler when PREFETCH_ENABLED is on.
+        - Starts the Genie health prober (reachability/auth, spaces cache).
+        - Starts the outbound (proactive message) worker when OUTBOUND_ENABLED.
+        - Starts the schema index refresher (spaces in use) when SCHEMA_INDEX_ENABLED.
+        - Starts the subscription scheduler when SUBSCRIPTIONS_ENABLED.
+        - Starts the static file watcher in dev mode (STATIC_WATCH).
+        - Optionally starts a lightweight compatibility server on port 3978
+          mounting the same API under BASE_API (helpful for local Bot Framework/Teams).
         """
-        Startup hook:
-          - Logs startup event/version.
-          - Optionally starts a lightweight compatibility server on port 3978
-            mounting the same API under BASE_API (helpful for local Bot Framework/Teams).
-        """
-        logger.info(json.dumps({"event": "startup", "version": AGENT_VERSION}))
+        logger.info(structured({"event": "startup", "version": AGENT_VERSION}))
+        app["_export_janitor"] = asyncio.create_task(EXPORTS.run_janitor())
+        if PREFETCH_ENABLED:
+            app["_prefetch_task"] = asyncio.create_task(PREFETCH.run_forever())
+        if BOT.is_configured():
+            app["_health_task"] = asyncio.create_task(BOT.health.run_forever())
+            if SCHEMA_INDEX_ENABLED:
+                app["_schema_task"] = asyncio.create_task(SCHEMA.run_forever(BOT.spaces_in_use))
+        if OUTBOUND_ENABLED:
+            app["_outbound_task"] = asyncio.create_task(OUTBOUND.run_forever())
+        if SUBSCRIPTIONS_ENABLED and BOT.is_configured():
+            app["_subscriptions_task"] = asyncio.create_task(SUBSCRIPTIONS.run_forever())
+        if config.static_watch:
+            app["_static_watch"] = asyncio.create_task(app["static_assets"].watch())
         # Start “compat app” on 3978 (no recursion)
         if config.compat_listen_3978:
             try:
@@ -581,33 +794,57 @@ def create_app(argv: Optional[List[str]] = None) -> Application:
                 await site.start()
 
                 app["_compat_runner"] = runner
-                logger.info(json.dumps({"event": "compat_listen_started", "port": 3978}))
+                logger.info(structured({"event": "compat_listen_started", "port": 3978}))
             except OSError as e:
-                logger.warning(
-                    json.dumps({"event": "compat_listen_failed", "port": 3978, "error": type(e).__name__})
-                )
+                logger.warning(structured(
+                    {"event": "compat_listen_failed", "port": 3978, "error": type(e).__name__}
+                ))
             except Exception as e:
-                logger.warning(
-                    json.dumps(
-                        {"event": "compat_listen_failed", "port": 3978, "error": f"{type(e).__name__}:{e}"}
-                    )
-                )
+                error = f"{type(e).__name__}:{e}"
+                logger.warning(structured(
+                    {"event": "compat_listen_failed", "port": 3978, "error": error}
+                ))
 
-    async def on_cleanup(app: Application):
+    async def on_shutdown(app: Application):
+        """Shutdown hook, run before in-flight requests are cancelled.
+
+        - Cancels in-flight Genie turns and their warehouse statements.
         """
-        Cleanup hook:
-          - Shuts down the compatibility runner if it was started.
-          - Emits a 'cleanup' log event.
+        try:
+            await BOT.shutdown_inflight()
+        except Exception:
+            pass
+
+    async def on_cleanup(app: Application):
+        """Release resources when the application stops.
+
+        - Stops background tasks (export janitor, prefetch scheduler, health
+          prober, outbound worker, schema index refresher, subscription
+          scheduler, static watcher).
+        - Closes the rate-limit and idempotency backends.
+        - Shuts down the compatibility runner if it was started.
+        - Emits a 'cleanup' log event.
         """
+        for task_key in ("_export_janitor", "_prefetch_task", "_health_task", "_outbound_task",
+                         "_schema_task", "_subscriptions_task", "_static_watch"):
+            task: Optional[asyncio.Task] = app.get(task_key)
+            if task:
+                task.cancel()
+        for store in (LIMITER.store, LEDGER.store, SUBSCRIPTIONS.store):
+            try:
+                await store.close()
+            except Exception:
+                pass
         runner: Optional[web.AppRunner] = app.get("_compat_runner")
         if runner:
             try:
                 await runner.cleanup()
             except Exception:
                 pass
-        logger.info(json.dumps({"event": "cleanup"}))
+        logger.info(structured({"event": "cleanup"}))
 
     root_app.on_startup.append(on_startup)
+    root_app.on_shutdown.append(on_shutdown)
     root_app.on_cleanup.append(on_cleanup)
     return root_app
 
@@ -0,0 +1,228 @@
+"""Minimal in-process metrics registry with Prometheus text exposition.
+
+Module: metrics.py
+Purpose: Counters, gauges and histograms for the bot, rendered on /metrics.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/metrics.py
+# License: MIT
+# Description: Dependency-free metric primitives. Values live in plain dicts
+#              keyed by label tuples; `render_prometheus()` produces the text
+#              format served by `GET /metrics` when ENABLE_METRICS is on.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+
+class _Metric:
+    """Common naming/label plumbing."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _fmt_labels(self, key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:  # pragma: no cover - overridden
+        return []
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        """Add amount (>= 0) to the counter for the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for a label set (0 if never incremented)."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        """Exposition lines, one per label set."""
+        return [
+            f"{self.name}{self._fmt_labels(k)} {_num(v)}" for k, v in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Point-in-time value; may be set directly or sampled from a callable."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._funcs: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str):
+        """Set the gauge for the given labels."""
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        """Increment (or decrement with a negative amount)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, func: Callable[[], float], **labels: str):
+        """Sample the gauge lazily from func at exposition time."""
+        self._funcs[self._key(labels)] = func
+
+    def value(self, **labels: str) -> float:
+        """Current value for a label set."""
+        key = self._key(labels)
+        if key in self._funcs:
+            return float(self._funcs[key]())
+        return self._values.get(key, 0.0)
+
+    def samples(self) -> List[str]:
+        """Exposition lines for set values, then sampled functions (failures skipped)."""
+        out = [
+            f"{self.name}{self._fmt_labels(k)} {_num(v)}" for k, v in sorted(self._values.items())
+        ]
+        for k, fn in sorted(self._funcs.items()):
+            try:
+                out.append(f"{self.name}{self._fmt_labels(k)} {_num(float(fn()))}")
+            except Exception:
+                continue
+        return out
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (seconds by default)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record one observation."""
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            counts[idx] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Approximate quantile (bucket upper bound) for a label set."""
+        counts = self._counts.get(self._key(labels))
+        if not counts:
+            return None
+        total = sum(counts)
+        target = q * total
+        running = 0
+        for i, c in enumerate(counts):
+            running += c
+            if running >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return None
+
+    def samples(self) -> List[str]:
+        """Exposition lines: cumulative buckets, sum and count per label set."""
+        out: List[str] = []
+        for key, counts in sorted(self._counts.items()):
+            running = 0
+            for bound, c in zip(self.buckets, counts):
+                running += c
+                le = self._fmt_labels(key, ("le", _num(bound)))
+                out.append(f"{self.name}_bucket{le} {running}")
+            running += counts[-1]
+            out.append(f"{self.name}_bucket{self._fmt_labels(key, ('le', '+Inf'))} {running}")
+            out.append(f"{self.name}_sum{self._fmt_labels(key)} {_num(self._sums[key])}")
+            out.append(f"{self.name}_count{self._fmt_labels(key)} {running}")
+        return out
+
+
+class Registry:
+    """Holds metrics by name; creating a metric twice returns the first instance."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, help_text: str, labelnames: Sequence[str], **kw):
+        m = self._metrics.get(name)
+        if m is None:
+            m = cls(name, help_text, labelnames, **kw)
+            self._metrics[name] = m
+        return m
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a Counter."""
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Get or create a Gauge."""
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Get or create a Histogram."""
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        """Render every metric in Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            m = self._metrics[name]
+            lines.append(f"# HELP {name} {m.help}")
+            lines.append(f"# TYPE {name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+# Process-wide registry
+REGISTRY = Registry()
@@ -0,0 +1,224 @@
+"""Rate-limited outbound (proactive) delivery.
+
+Module: outbound.py
+Purpose: Pace bot-initiated messages (welcomes, scheduled results) so bursts do
+         not get the bot throttled by the channel connector.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/outbound.py
+# License: MIT
+# Description: Installing the app into a large team fires one conversationUpdate
+#              per batch of members; replying inline to each of them sends a
+#              burst the Bot Connector answers with 429s. `OutboundQueue`
+#              accepts messages keyed by purpose + conversation, coalesces
+#              duplicates that are still queued (and, per key, within a
+#              cooldown), and a single worker delivers them through a token
+#              bucket, backing off when the connector throttles. Delivery is a
+#              caller-supplied coroutine (a proactive `continue_conversation`
+#              in agent.py), so the queue knows nothing about the SDK. A
+#              message's `on_done` callback learns whether it was actually
+#              sent, and `on_failure` reports every message given up on.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .metrics import REGISTRY
+from .state import BoundedStateMap
+
+OUTBOUND_TOTAL = REGISTRY.counter(
+    "genie_outbound_total",
+    "Proactive messages by kind and outcome (sent|coalesced|dropped|failed).",
+    ["kind", "outcome"],
+)
+OUTBOUND_WAIT_SECONDS = REGISTRY.histogram(
+    "genie_outbound_wait_seconds",
+    "Time proactive messages spent queued before delivery, by kind.",
+    ["kind"],
+)
+OUTBOUND_THROTTLED = REGISTRY.counter(
+    "genie_outbound_throttled_total",
+    "Proactive sends the connector rejected with 429 (retried after a backoff).",
+)
+
+
+@dataclass
+class OutboundMessage:
+    """A queued proactive message.
+
+    Attributes:
+        key: Coalescing key (e.g. "welcome:<conversation id>").
+        kind: Metric label (welcome|schedule|...).
+        reference: Conversation reference to deliver to.
+        payload: Text or Activity handed to the deliver callable.
+        queued_at: Monotonic enqueue time.
+        attempts: Delivery attempts so far.
+        on_done: Awaited with True once sent, or False when given up on.
+    """
+
+    key: str
+    kind: str
+    reference: Any
+    payload: Any
+    queued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    on_done: Optional[Callable[[bool], Awaitable[None]]] = None
+
+
+Deliver = Callable[[OutboundMessage], Awaitable[None]]
+
+
+def _is_throttled(e: Exception) -> bool:
+    s = f"{type(e).__name__} {e}".lower()
+    return "429" in s or "too many requests" in s or "throttl" in s
+
+
+class OutboundQueue:
+    """Coalescing, token-bucket paced queue with one delivery worker.
+
+    Args:
+        deliver: Coroutine that sends one message (raises on failure).
+        rate_per_second: Sustained sends per second.
+        burst: Sends allowed back to back.
+        max_queue: Queued messages beyond this are dropped (oldest kept).
+        cooldown_seconds: A key delivered within this window is coalesced.
+        max_attempts: Tries per message when the connector throttles.
+        on_failure: Called with a message and the error when it is given up on.
+        clock: Monotonic clock (injectable for tests).
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        *,
+        rate_per_second: float,
+        burst: int,
+        max_queue: int = 5000,
+        cooldown_seconds: float = 0.0,
+        max_attempts: int = 3,
+        on_failure: Optional[Callable[[OutboundMessage, BaseException], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._deliver = deliver
+        self._on_failure = on_failure
+        self.rate = max(0.01, rate_per_second)
+        self.burst = max(1, burst)
+        self.max_queue = max(1, max_queue)
+        self.max_attempts = max(1, max_attempts)
+        self._clock = clock
+        self._queue: "OrderedDict[str, OutboundMessage]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._tokens = float(self.burst)
+        self._refilled_at = clock()
+        self._recent: BoundedStateMap[str, float] = BoundedStateMap(
+            "outbound_recent",
+            max_entries=max(1000, max_queue * 4),
+            ttl_seconds=max(1.0, cooldown_seconds),
+        )
+        self._cooldown = cooldown_seconds
+        REGISTRY.gauge(
+            "genie_outbound_queue_depth", "Proactive messages waiting for delivery."
+        ).set_function(lambda: float(len(self._queue)))
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def submit(
+        self,
+        key: str,
+        kind: str,
+        reference: Any,
+        payload: Any,
+        on_done: Optional[Callable[[bool], Awaitable[None]]] = None,
+    ) -> bool:
+        """Queue a message for delivery.
+
+        Returns:
+            False when it was coalesced with a queued/recent one or dropped
+            (`on_done` is then never called).
+        """
+        if key in self._queue or (self._cooldown > 0 and key in self._recent):
+            OUTBOUND_TOTAL.inc(kind=kind, outcome="coalesced")
+            return False
+        if len(self._queue) >= self.max_queue:
+            OUTBOUND_TOTAL.inc(kind=kind, outcome="dropped")
+            return False
+        self._queue[key] = OutboundMessage(key, kind, reference, payload, on_done=on_done)
+        self._ready.set()
+        return True
+
+    async def _take_token(self):
+        """Wait until the bucket holds a token, then consume it."""
+        while True:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def _pause(self, seconds: float):
+        """Empty the bucket for `seconds` (connector asked us to slow down)."""
+        self._tokens = -seconds * self.rate
+
+    async def run_forever(self):
+        """Background worker: deliver queued messages at the configured pace."""
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            await self._take_token()
+            if not self._queue:
+                continue
+            _, msg = self._queue.popitem(last=False)
+            msg.attempts += 1
+            try:
+                await self._deliver(msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if _is_throttled(e) and msg.attempts < self.max_attempts:
+                    OUTBOUND_THROTTLED.inc()
+                    self._pause(2.0 ** msg.attempts)
+                    self._queue[msg.key] = msg
+                    self._queue.move_to_end(msg.key, last=False)  # keep its place at the head
+                    continue
+                OUTBOUND_TOTAL.inc(kind=msg.kind, outcome="failed")
+                if self._on_failure is not None:
+                    self._on_failure(msg, e)
+                await self._done(msg, False)
+                continue
+            if self._cooldown > 0:
+                self._recent[msg.key] = self._clock()
+            OUTBOUND_TOTAL.inc(kind=msg.kind, outcome="sent")
+            OUTBOUND_WAIT_SECONDS.observe(self._clock() - msg.queued_at, kind=msg.kind)
+            await self._done(msg, True)
+
+    async def _done(self, msg: OutboundMessage, sent: bool):
+        """Run a message's completion callback (its errors never stop the worker)."""
+        if msg.on_done is None:
+            return
+        try:
+            await msg.on_done(sent)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self._on_failure is not None:
+                self._on_failure(msg, e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot for health endpoints."""
+        oldest: Optional[float] = None
+        if self._queue:
+            oldest = self._clock() - next(iter(self._queue.values())).queued_at
+        return {
+            "queued": len(self._queue),
+            "oldest_seconds": round(oldest, 3) if oldest is not None else None,
+        }
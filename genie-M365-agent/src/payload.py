@@ -0,0 +1,126 @@
+"""Outbound payload compaction.
+
+Module: payload.py
+Purpose: Keep answers small on the wire: compact Markdown tables, compact (and
+         optionally compressed) JSON for Copilot Studio callers, and size /
+         delivery-time metrics.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/payload.py
+# License: MIT
+# Description: `markdown_table()` renders `|a|b|` rows with `|-|` separators
+#              (same GFM table, no padding) and fits wide rows into a character
+#              budget by shrinking the widest columns first, so one long text
+#              column no longer pushes every row to cell_chars × cols.
+#              `compact_json()` drops separator whitespace and \u escapes;
+#              `encode_response()` gzips + base64-encodes a response for callers
+#              that opt in (`acceptEncoding: "gzip"`).
+# ─────────────────────────────────────────────────────────────────────────────
+
+import base64
+import gzip
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from .metrics import REGISTRY
+
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "genie_payload_bytes", "Outbound answer size in bytes by kind (markdown|card|json).", ["kind"],
+    buckets=(256, 1024, 4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576),
+)
+PAYLOAD_SAVED = REGISTRY.counter(
+    "genie_payload_bytes_saved_total",
+    "Bytes saved by payload compaction/compression by kind.",
+    ["kind"],
+)
+DELIVERY_SECONDS = REGISTRY.histogram(
+    "genie_delivery_seconds",
+    "Time to hand an answer to the channel (all chunks) by kind.",
+    ["kind"],
+)
+
+# Compress opted-in JSON responses only above this size (smaller ones grow once base64-encoded)
+COMPRESS_MIN_BYTES = 1024
+# No column is narrowed below this many characters when fitting a row budget
+MIN_COL_CHARS = 12
+
+
+def compact_json(obj: Any) -> str:
+    """JSON without separator whitespace or non-ASCII escapes (same data, fewer bytes)."""
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def encode_response(text: str, accept_encoding: Optional[str]) -> Tuple[str, str]:
+    """Compress a JSON response string for callers that accept it.
+
+    Args:
+        text: Serialized response.
+        accept_encoding: Caller preference ("gzip" enables compression).
+
+    Returns:
+        (response, encoding): encoding is "gzip+base64" when compressed, else "".
+    """
+    if (accept_encoding or "").strip().lower() not in ("gzip", "gzip+base64"):
+        return text, ""
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text, ""
+    packed = base64.b64encode(gzip.compress(raw, compresslevel=6, mtime=0)).decode("ascii")
+    if len(packed) >= len(raw):
+        return text, ""
+    PAYLOAD_SAVED.inc(len(raw) - len(packed), kind="json")
+    return packed, "gzip+base64"
+
+
+def fit_widths(widths: Sequence[int], budget: int, floor: int = MIN_COL_CHARS) -> List[int]:
+    """Cap column widths so their sum fits `budget`, narrowing the widest first.
+
+    Columns already at or under the resulting cap keep their natural width;
+    no column is narrowed below `floor` (the budget may then be exceeded).
+    """
+    widths = list(widths)
+    if budget <= 0 or sum(widths) <= budget:
+        return widths
+    # Water-filling: find the largest cap c with sum(min(w, c)) <= budget
+    lo, hi = floor, max(widths)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if sum(min(w, mid) for w in widths) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return [min(w, lo) for w in widths]
+
+
+def _clip(s: str, width: int) -> str:
+    return s if len(s) <= width else s[: max(0, width - 1)] + "…"
+
+
+def markdown_table(
+    headers: Sequence[str], rows: Sequence[Sequence[str]], *, row_chars: int = 0
+) -> str:
+    """Render a compact GFM table from already formatted/escaped cells.
+
+    Args:
+        headers: Column names.
+        rows: Cell strings (trailing/leading whitespace is trimmed).
+        row_chars: Character budget for the cells of one row (0 = unlimited);
+            wide columns are truncated with an ellipsis to fit.
+    """
+    cells = [[c.strip() for c in row] for row in rows]
+    # Versus "| a | b |" rows and "|---|" separators: two spaces per cell,
+    # two dashes per separator cell
+    saved = (len(cells) + 2) * 2 * len(headers)
+    if row_chars > 0 and cells:
+        natural = [max([len(h)] + [len(r[i]) for r in cells]) for i, h in enumerate(headers)]
+        caps = fit_widths(natural, row_chars)
+        if caps != natural:
+            before = sum(len(c) for row in cells for c in row)
+            cells = [[_clip(c, w) for c, w in zip(row, caps)] for row in cells]
+            saved += before - sum(len(c) for row in cells for c in row)
+    PAYLOAD_SAVED.inc(saved, kind="markdown")
+    lines = ["|" + "|".join(h.strip() for h in headers) + "|", "|" + "-|" * len(headers)]
+    lines.extend("|" + "|".join(row) + "|" for row in cells)
+    return "\n".join(lines)
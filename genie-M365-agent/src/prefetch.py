@@ -0,0 +1,297 @@
+"""Warm-result prefetching for popular questions.
+
+Module: prefetch.py
+Purpose: Learn the most asked (space, question) pairs and keep their answers warm.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/prefetch.py
+# License: MIT
+# Description: `PrefetchScheduler` keeps exponentially decayed hit counts per
+#              (space_id, question hash), re-asks the top-N (plus pinned)
+#              questions on an interval and shortly before configured peak
+#              times, and stores the answers in a shared TTL cache so the first
+#              interactive asker gets a cache hit. Warehouse time spent on
+#              prefetching is capped per rolling hour.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, tzinfo
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY
+from .result_table import ResultCache
+
+log = logging.getLogger(__name__)
+
+Runner = Callable[[str, str], Awaitable[Dict[str, Any]]]
+
+PREFETCH_RUNS = REGISTRY.counter(
+    "genie_prefetch_runs_total",
+    "Prefetch executions by outcome (ok|error|skipped_budget).",
+    ["outcome"],
+)
+PREFETCH_HITS = REGISTRY.counter(
+    "genie_prefetch_lookups_total",
+    "Interactive lookups in the prefetch cache by outcome (hit|miss).",
+    ["outcome"],
+)
+PREFETCH_SECONDS = REGISTRY.counter(
+    "genie_prefetch_seconds_total", "Genie/warehouse seconds spent on prefetching."
+)
+
+
+@dataclass
+class Candidate:
+    """A (space, question) pair observed in traffic.
+
+    Fields:
+        space_id: Genie Space id.
+        text_hash: Hash of the normalized question (as logged by on_message).
+        question: Question text (latest spelling seen).
+        score: Exponentially decayed ask count.
+        updated: Monotonic timestamp of the last score update.
+        pinned: Always prefetched regardless of score.
+        last_run: Monotonic timestamp of the last prefetch (0 = never).
+    """
+    space_id: str
+    text_hash: str
+    question: str
+    score: float = 0.0
+    updated: float = 0.0
+    pinned: bool = False
+    last_run: float = 0.0
+
+
+class PrefetchScheduler:
+    """Learns popular questions and keeps their answers warm.
+
+    Args:
+        runner: async (space_id, question) -> answer dict (fresh conversation).
+        top_n: How many learned questions to prefetch per cycle.
+        interval_seconds: Regular refresh interval.
+        peak_times: Local "HH:MM" times to refresh ahead of (lead_seconds before).
+        tz: Timezone for peak_times.
+        result_ttl_seconds: Lifetime of a prefetched answer.
+        budget_seconds_per_hour: Max Genie/warehouse seconds spent per rolling hour.
+        half_life_hours: Decay half-life for popularity scores.
+        max_candidates: Upper bound on tracked questions.
+    """
+
+    def __init__(
+        self,
+        runner: Runner,
+        *,
+        top_n: int = 20,
+        interval_seconds: float = 1800,
+        peak_times: Optional[List[str]] = None,
+        tz: Optional[tzinfo] = None,
+        lead_seconds: float = 900,
+        result_ttl_seconds: float = 3600,
+        budget_seconds_per_hour: float = 600,
+        half_life_hours: float = 24,
+        max_candidates: int = 5000,
+        min_score: float = 2.0,
+    ):
+        self._runner = runner
+        self.top_n = top_n
+        self.interval_seconds = interval_seconds
+        self.peak_times = [p.strip() for p in (peak_times or []) if p.strip()]
+        self.tz = tz
+        self.lead_seconds = lead_seconds
+        self.budget_seconds_per_hour = budget_seconds_per_hour
+        self.max_candidates = max_candidates
+        self.min_score = min_score
+        self._decay = math.log(2) / max(1e-6, half_life_hours * 3600)
+        self._candidates: Dict[Tuple[str, str], Candidate] = {}
+        self._spent: Deque[Tuple[float, float]] = deque()  # (monotonic ts, seconds)
+        self._last_cycle = 0.0
+        self._peaks_done: Dict[str, str] = {}  # peak -> date string already served
+        self.cache = ResultCache(max_entries=max(1, top_n * 4), max_bytes=128 * 1024 * 1024,
+                                 ttl_seconds=result_ttl_seconds)
+
+    # -------------------- Learning --------------------
+
+    def _score_now(self, c: Candidate, now: float) -> float:
+        return c.score * math.exp(-self._decay * (now - c.updated))
+
+    def observe(self, space_id: str, text_hash: str, question: str):
+        """Count one interactive ask of a context-free question."""
+        now = time.monotonic()
+        key = (space_id, text_hash)
+        c = self._candidates.get(key)
+        if c is None:
+            if len(self._candidates) >= self.max_candidates:
+                self._evict(now)
+            c = self._candidates[key] = Candidate(space_id, text_hash, question, updated=now)
+        c.score = self._score_now(c, now) + 1.0
+        c.updated = now
+        c.question = question
+
+    def _evict(self, now: float):
+        """Drop the lowest-scoring tenth of unpinned candidates."""
+        ranked = sorted(
+            (k for k, c in self._candidates.items() if not c.pinned),
+            key=lambda k: self._score_now(self._candidates[k], now),
+        )
+        for k in ranked[: max(1, len(ranked) // 10)]:
+            self._candidates.pop(k, None)
+
+    def pin(self, space_id: str, text_hash: str, question: str) -> Candidate:
+        """Always prefetch this question (admin)."""
+        key = (space_id, text_hash)
+        c = self._candidates.get(key) or Candidate(
+            space_id, text_hash, question, updated=time.monotonic()
+        )
+        c.pinned = True
+        self._candidates[key] = c
+        return c
+
+    def unpin(self, space_id: str, text_hash: str) -> bool:
+        """Remove a pin (the question may still be prefetched if popular)."""
+        c = self._candidates.get((space_id, text_hash))
+        if not c or not c.pinned:
+            return False
+        c.pinned = False
+        return True
+
+    def selection(self) -> List[Candidate]:
+        """Pinned questions plus the top-N learned ones (by decayed score)."""
+        now = time.monotonic()
+        pinned = [c for c in self._candidates.values() if c.pinned]
+        learned = sorted(
+            (
+                c for c in self._candidates.values()
+                if not c.pinned and self._score_now(c, now) >= self.min_score
+            ),
+            key=lambda c: self._score_now(c, now),
+            reverse=True,
+        )[: self.top_n]
+        return pinned + learned
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Rows for the admin listing (pinned first, then by score)."""
+        now = time.monotonic()
+        out = []
+        for c in self.selection():
+            entry = self.cache.get(self._cache_key(c.space_id, c.text_hash))
+            out.append({
+                "space_id": c.space_id,
+                "question": c.question,
+                "score": round(self._score_now(c, now), 1),
+                "pinned": c.pinned,
+                "warm": entry is not None,
+                "age_s": int(now - c.last_run) if c.last_run else None,
+            })
+        return out
+
+    # -------------------- Cache --------------------
+
+    @staticmethod
+    def _cache_key(space_id: str, text_hash: str) -> str:
+        return f"{space_id}:{text_hash}"
+
+    def lookup(self, space_id: str, text_hash: str) -> Optional[Dict[str, Any]]:
+        """Return a warm answer for an interactive question, if any."""
+        answer = self.cache.get(self._cache_key(space_id, text_hash))
+        PREFETCH_HITS.inc(outcome="hit" if answer else "miss")
+        return answer
+
+    def store(self, space_id: str, text_hash: str, answer: Dict[str, Any]):
+        """Publish an answer to the shared cache (also used by interactive turns).
+
+        The stored copy carries `_prefetched_at` (epoch seconds) so a hit can
+        say how old the answer is.
+        """
+        if "error" in answer:
+            return
+        stamped = {**answer, "_prefetched_at": time.time()}
+        self.cache.put(self._cache_key(space_id, text_hash), stamped)
+
+    # -------------------- Budget --------------------
+
+    def spent_last_hour(self) -> float:
+        """Seconds spent on prefetching in the rolling last hour."""
+        cutoff = time.monotonic() - 3600
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(s for _ts, s in self._spent)
+
+    def _budget_left(self) -> float:
+        return self.budget_seconds_per_hour - self.spent_last_hour()
+
+    # -------------------- Scheduling --------------------
+
+    def _peak_due(self, now_local: datetime) -> Optional[str]:
+        """Return a peak label whose lead window has started today and not yet been served."""
+        today = now_local.date().isoformat()
+        for peak in self.peak_times:
+            try:
+                hh, mm = (int(x) for x in peak.split(":", 1))
+            except ValueError:
+                continue
+            at = now_local.replace(hour=hh, minute=mm, second=0, microsecond=0)
+            in_lead = at - timedelta(seconds=self.lead_seconds) <= now_local < at
+            if in_lead and self._peaks_done.get(peak) != today:
+                self._peaks_done[peak] = today
+                return peak
+        return None
+
+    async def run_cycle(self, *, reason: str = "interval") -> Dict[str, int]:
+        """Refresh the current selection within the hourly budget.
+
+        Returns:
+            Counters {ok, error, skipped_budget} for this cycle.
+        """
+        self._last_cycle = time.monotonic()
+        stats = {"ok": 0, "error": 0, "skipped_budget": 0}
+        for c in self.selection():
+            if self._budget_left() <= 0:
+                stats["skipped_budget"] += 1
+                PREFETCH_RUNS.inc(outcome="skipped_budget")
+                continue
+            started = time.monotonic()
+            try:
+                answer = await self._runner(c.space_id, c.question)
+                ok = "error" not in answer
+            except Exception as e:
+                log.warning(
+                    "Prefetch failed for space %s question %s: %s", c.space_id, c.text_hash, e
+                )
+                answer, ok = {}, False
+            spent = time.monotonic() - started
+            self._spent.append((time.monotonic(), spent))
+            PREFETCH_SECONDS.inc(spent)
+            c.last_run = time.monotonic()
+            if ok:
+                self.store(c.space_id, c.text_hash, answer)
+                stats["ok"] += 1
+                PREFETCH_RUNS.inc(outcome="ok")
+            else:
+                stats["error"] += 1
+                PREFETCH_RUNS.inc(outcome="error")
+        return stats
+
+    async def run_forever(self, tick_seconds: float = 30.0):
+        """Background loop: run on the interval and ahead of configured peaks."""
+        while True:
+            await asyncio.sleep(tick_seconds)
+            try:
+                reason = None
+                now_local = datetime.now(self.tz) if self.tz else datetime.now()
+                if self._peak_due(now_local):
+                    reason = "peak"
+                elif time.monotonic() - self._last_cycle >= self.interval_seconds:
+                    reason = "interval"
+                if reason:
+                    await self.run_cycle(reason=reason)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Prefetch scheduler pass failed: %s", e)
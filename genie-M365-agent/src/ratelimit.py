@@ -0,0 +1,265 @@
+"""Hierarchical token-bucket rate limiting.
+
+Module: ratelimit.py
+Purpose: Burst-tolerant limits per user, tenant, space and globally, with an
+         accurate retry-after and a pluggable bucket store.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/ratelimit.py
+# License: MIT
+# Description: `TokenBucketLimiter.acquire()` checks every configured level in
+#              one step and only consumes tokens when all of them allow the
+#              request, so a rejection never burns quota. Buckets live in a
+#              `BucketStore`: in-process (default) or Redis, which shares state
+#              across workers/instances (`RATE_LIMIT_BACKEND=redis`).
+# ─────────────────────────────────────────────────────────────────────────────
+
+import abc
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .metrics import REGISTRY
+from .state import BoundedStateMap
+
+RATE_DECISIONS = REGISTRY.counter(
+    "genie_rate_limit_decisions_total",
+    "Rate-limit decisions by outcome and limiting level.",
+    ["outcome", "level"],
+)
+
+LEVELS = ("user", "tenant", "space", "global")
+
+
+@dataclass(frozen=True)
+class BucketSpec:
+    """Bucket shape for one level.
+
+    Fields:
+        burst: Bucket capacity (requests allowed back to back).
+        per_minute: Sustained refill rate.
+    """
+    burst: float
+    per_minute: float
+
+    @property
+    def rate(self) -> float:
+        """Refill rate in tokens per second."""
+        return self.per_minute / 60.0
+
+    @property
+    def enabled(self) -> bool:
+        """False when the level is switched off ("0"/"off")."""
+        return self.burst > 0 and self.per_minute > 0
+
+
+@dataclass
+class RateDecision:
+    """Outcome of a limiter check.
+
+    Fields:
+        allowed: True if tokens were consumed.
+        retry_after: Seconds until the request would be allowed (0 when allowed).
+        level: The level that limited the request ('' when allowed).
+    """
+    allowed: bool
+    retry_after: float = 0.0
+    level: str = ""
+
+
+# A request against one bucket: (level, key, spec)
+BucketRequest = Tuple[str, str, BucketSpec]
+
+
+class BucketStore(abc.ABC):
+    """Bucket state backend. Implementations must check-and-take atomically."""
+
+    @abc.abstractmethod
+    async def acquire(self, requests: Sequence[BucketRequest], cost: float) -> RateDecision:
+        """Take `cost` tokens from every requested bucket, or from none when one is short."""
+
+    async def close(self):
+        """Release backend resources."""
+        return None
+
+
+class MemoryBucketStore(BucketStore):
+    """In-process buckets (one event loop, so check-and-take is atomic).
+
+    Idle buckets are evicted once they would have refilled completely, which is
+    indistinguishable from keeping them.
+    """
+
+    def __init__(self, max_entries: int = 100000, clock=time.monotonic):
+        self._clock = clock
+        self._maps: Dict[str, BoundedStateMap[str, List[float]]] = {}
+        self._max_entries = max_entries
+
+    def _map(self, level: str, spec: BucketSpec) -> BoundedStateMap[str, List[float]]:
+        m = self._maps.get(level)
+        if m is None:
+            m = self._maps[level] = BoundedStateMap(
+                f"ratelimit_{level}",
+                max_entries=self._max_entries,
+                ttl_seconds=spec.burst / spec.rate,
+                clock=self._clock,
+            )
+        return m
+
+    async def acquire(self, requests: Sequence[BucketRequest], cost: float) -> RateDecision:
+        """Refill, check and take every bucket in one synchronous step."""
+        now = self._clock()
+        buckets = []
+        wait, level = 0.0, ""
+        for lvl, key, spec in requests:
+            m = self._map(lvl, spec)
+            b = m.get(key)
+            if b is None:
+                b = [spec.burst, now]  # [tokens, last refill]
+                m[key] = b
+            tokens = min(spec.burst, b[0] + (now - b[1]) * spec.rate)
+            b[0], b[1] = tokens, now
+            need = min(cost, spec.burst)
+            if tokens < need:
+                w = (need - tokens) / spec.rate
+                if w > wait:
+                    wait, level = w, lvl
+            buckets.append((b, need))
+        if wait > 0:
+            return RateDecision(False, wait, level)
+        for b, need in buckets:
+            b[0] -= need
+        return RateDecision(True)
+
+
+# KEYS = bucket keys; ARGV = cost, then (burst, rate/s) per key.
+# Uses the server clock so every worker agrees on time.
+_REDIS_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local cost = tonumber(ARGV[1])
+local wait, worst = 0, 0
+local left = {}
+for i, key in ipairs(KEYS) do
+  local burst = tonumber(ARGV[2 * i]); local rate = tonumber(ARGV[2 * i + 1])
+  local v = redis.call('HMGET', key, 't', 'ts')
+  local tokens = tonumber(v[1]) or burst
+  local ts = tonumber(v[2]) or now
+  tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+  local need = math.min(cost, burst)
+  if tokens < need then
+    local w = (need - tokens) / rate
+    if w > wait then wait = w; worst = i end
+  end
+  left[i] = tokens - need
+end
+if wait > 0 then return {tostring(wait), worst} end
+for i, key in ipairs(KEYS) do
+  local burst = tonumber(ARGV[2 * i]); local rate = tonumber(ARGV[2 * i + 1])
+  redis.call('HSET', key, 't', tostring(left[i]), 'ts', tostring(now))
+  redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+return {'0', 0}
+"""
+
+
+class RedisBucketStore(BucketStore):
+    """Buckets in Redis, shared by all workers/instances.
+
+    Requires the optional `redis` package (redis.asyncio). One round trip per
+    check; the Lua script makes the multi-level check-and-take atomic.
+    """
+
+    def __init__(self, url: str, prefix: str = "genie:rl:"):
+        try:
+            import redis.asyncio as aioredis  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package.") from e
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(_REDIS_SCRIPT)
+        self._prefix = prefix
+
+    async def acquire(self, requests: Sequence[BucketRequest], cost: float) -> RateDecision:
+        """Run the check-and-take script on the server (one round trip)."""
+        keys = [f"{self._prefix}{lvl}:{key}" for lvl, key, _spec in requests]
+        args: List[float] = [cost]
+        for _lvl, _key, spec in requests:
+            args.extend((spec.burst, spec.rate))
+        wait, worst = await self._script(keys=keys, args=args)
+        wait = float(wait)
+        if wait > 0:
+            return RateDecision(False, wait, requests[int(worst) - 1][0])
+        return RateDecision(True)
+
+    async def close(self):
+        """Close the Redis connection pool."""
+        await self._client.aclose()
+
+
+class TokenBucketLimiter:
+    """Token buckets at the user, tenant, space and global levels.
+
+    Args:
+        specs: BucketSpec per level name; disabled specs are skipped.
+        store: Bucket backend (defaults to in-process).
+    """
+
+    def __init__(self, specs: Dict[str, BucketSpec], store: Optional[BucketStore] = None):
+        self.specs = {lvl: spec for lvl, spec in specs.items() if spec.enabled}
+        self.store = store or MemoryBucketStore()
+        self._last_error = ""
+        self._last_error_at = 0.0
+
+    async def acquire(
+        self,
+        *,
+        user_id: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        space_id: Optional[str] = None,
+        cost: float = 1.0,
+    ) -> RateDecision:
+        """Consume `cost` tokens from every applicable bucket, or none at all.
+
+        Levels whose key is unknown (e.g. no tenant on the activity) are skipped.
+        A cost larger than a bucket's burst is capped at the burst so a large
+        batch waits for a full bucket instead of being rejected forever.
+        """
+        ids = {"user": user_id, "tenant": tenant_id, "space": space_id, "global": "*"}
+        requests = [(lvl, ids[lvl], spec) for lvl, spec in self.specs.items() if ids.get(lvl)]
+        if not requests:
+            return RateDecision(True)
+        try:
+            decision = await self.store.acquire(requests, cost)
+        except Exception as e:
+            self._last_error = f"{type(e).__name__}: {e}"[:300]
+            self._last_error_at = time.monotonic()
+            raise
+        outcome = "allowed" if decision.allowed else "limited"
+        RATE_DECISIONS.inc(outcome=outcome, level=decision.level)
+        return decision
+
+    def health(self, window_seconds: float = 60.0) -> Dict[str, object]:
+        """Backend name and whether it failed recently (no remote call)."""
+        recent = time.monotonic() - self._last_error_at < window_seconds
+        failing = bool(self._last_error_at) and recent
+        return {
+            "backend": type(self.store).__name__,
+            "healthy": not failing,
+            "last_error": self._last_error if failing else "",
+        }
+
+
+def parse_bucket_spec(raw: str, default: BucketSpec) -> BucketSpec:
+    """Parse "burst/per_minute" (e.g. "5/30"); "0" or "off" disables the level."""
+    raw = (raw or "").strip().lower()
+    if not raw:
+        return default
+    if raw in ("0", "off", "none"):
+        return BucketSpec(0, 0)
+    burst, _, per_minute = raw.partition("/")
+    try:
+        return BucketSpec(float(burst), float(per_minute or burst))
+    except ValueError:
+        return default
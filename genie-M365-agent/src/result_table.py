@@ -0,0 +1,591 @@
+"""Compact columnar container for Databricks statement results.
+
+Module: result_table.py
+Purpose: Column-major result storage with zero-copy row/column windowing.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/result_table.py
+# License: MIT
+# Description: `ResultTable` keeps query results column-major. Integer and
+#              floating point columns live in `array` buffers (exposed as
+#              memoryviews), strings are offset-encoded into a single UTF-8
+#              buffer. Windows (row ranges, column subsets) share storage with
+#              their parent table instead of copying rows. `from_arrow()` wraps
+#              Arrow buffers directly (no per-cell objects). `ResultCache` keeps
+#              recent answers (and their tables) for server-side pagination.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import math
+import time
+from array import array
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .metrics import REGISTRY
+
+INT_TYPES = frozenset({"BYTE", "SHORT", "INT", "BIGINT", "LONG"})
+FLOAT_TYPES = frozenset({"FLOAT", "DOUBLE"})
+
+RowIndex = Union[range, memoryview]
+
+RESULT_CACHE_SKIPPED = REGISTRY.counter(
+    "genie_result_cache_skipped_total",
+    "Answers not cached because they alone exceed the cache byte budget.",
+    ["cache"],
+)
+
+
+# ------------------------------------------------------------------------------
+# Column storage
+# ------------------------------------------------------------------------------
+
+class _NumericColumn:
+    """Fixed-width numeric column backed by an `array` plus a NULL bitmap.
+
+    Attributes:
+        values: `array('q')` for integers or `array('d')` for floats.
+        nulls: One byte per row; 1 marks a NULL.
+    """
+
+    __slots__ = ("values", "nulls", "_cast")
+
+    def __init__(self, typecode: str):
+        self.values = array(typecode)
+        self.nulls = bytearray()
+        self._cast = int if typecode == "q" else float
+
+    @classmethod
+    def wrap(cls, values: memoryview, nulls: Union[bytes, memoryview]) -> "_NumericColumn":
+        """Read-only column over existing buffers (e.g. Arrow); no copy."""
+        col = cls.__new__(cls)
+        col.values, col.nulls, col._cast = values, nulls, (int if values.format == "q" else float)
+        return col
+
+    def append(self, raw: Any):
+        """Append a raw cell; raises ValueError/TypeError on unparsable input."""
+        if raw is None:
+            self.values.append(0)
+            self.nulls.append(1)
+            return
+        self.values.append(self._cast(raw))
+        self.nulls.append(0)
+
+    def get(self, i: int) -> Any:
+        """Return the Python value at physical row i (None for NULL)."""
+        return None if self.nulls[i] else self.values[i]
+
+    def buffer(self) -> memoryview:
+        """Zero-copy view of the underlying numeric buffer."""
+        return memoryview(self.values)
+
+    def nbytes(self) -> int:
+        """Approximate storage size in bytes."""
+        return self.values.itemsize * len(self.values) + len(self.nulls)
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+
+class _StringColumn:
+    """Variable-width column: UTF-8 bytes concatenated into one buffer.
+
+    Values are addressed by an offsets array (n + 1 entries) and a NULL bitmap.
+    """
+
+    __slots__ = ("data", "offsets", "nulls", "_view")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+        self.nulls = bytearray()
+        self._view: Optional[memoryview] = None
+
+    @classmethod
+    def wrap(
+        cls, data: memoryview, offsets: memoryview, nulls: Union[bytes, memoryview]
+    ) -> "_StringColumn":
+        """Sealed column over existing UTF-8 data / int64 offsets buffers (e.g. Arrow); no copy."""
+        col = cls.__new__(cls)
+        col.data, col.offsets, col.nulls, col._view = data, offsets, nulls, data
+        return col
+
+    def append(self, raw: Any):
+        """Append a raw cell (anything non-None is stored as its str())."""
+        if raw is None:
+            self.nulls.append(1)
+        else:
+            self.data += (raw if isinstance(raw, str) else str(raw)).encode("utf-8")
+            self.nulls.append(0)
+        self.offsets.append(len(self.data))
+
+    def seal(self):
+        """Freeze the buffer and expose it as a memoryview (no further appends)."""
+        self._view = memoryview(self.data)
+
+    def get(self, i: int) -> Optional[str]:
+        """Decode the value at physical row i straight from the shared buffer."""
+        if self.nulls[i]:
+            return None
+        view = self._view if self._view is not None else memoryview(self.data)
+        return str(view[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def nbytes(self) -> int:
+        """Approximate storage size in bytes."""
+        return len(self.data) + self.offsets.itemsize * len(self.offsets) + len(self.nulls)
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+
+_Column = Union[_NumericColumn, _StringColumn]
+
+
+def _build_column(type_name: str, values: Iterable[Any]) -> _Column:
+    """Build the most compact column for a type, degrading to strings on bad input.
+
+    Args:
+        type_name: Databricks `type_name` (e.g. INT, DOUBLE, STRING).
+        values: Raw cell values for this column, in row order.
+
+    Returns:
+        A sealed column instance.
+    """
+    t = (type_name or "").upper()
+    values = values if isinstance(values, list) else list(values)
+    if t in INT_TYPES or t in FLOAT_TYPES:
+        col = _NumericColumn("q" if t in INT_TYPES else "d")
+        try:
+            for v in values:
+                col.append(v)
+            return col
+        except (TypeError, ValueError, OverflowError):
+            pass
+    scol = _StringColumn()
+    for v in values:
+        scol.append(v)
+    scol.seal()
+    return scol
+
+
+def _arrow_nulls(arr: Any, pc: Any, pa: Any) -> Union[bytes, memoryview]:
+    """Expand an Arrow validity bitmap to one byte per row (1 = NULL)."""
+    if arr.null_count == 0:
+        return bytes(len(arr))
+    flags = pc.cast(pc.is_null(arr), pa.uint8())
+    return memoryview(flags.buffers()[1])[flags.offset:flags.offset + len(flags)]
+
+
+def _arrow_column(type_name: str, arr: Any) -> _Column:
+    """Wrap one Arrow array as a column without per-cell Python objects.
+
+    Numeric types are cast to int64/float64 and strings (and everything that
+    renders as text: DECIMAL, DATE, TIMESTAMP, BOOLEAN...) to large_string, then
+    the Arrow buffers are exposed as memoryviews. Types Arrow can't cast fall
+    back to value-by-value construction.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    t = (type_name or "").upper()
+    n = len(arr)
+    try:
+        if t in INT_TYPES or t in FLOAT_TYPES:
+            code, target = ("q", pa.int64()) if t in INT_TYPES else ("d", pa.float64())
+            arr = pc.cast(arr, target)
+            buf = memoryview(arr.buffers()[1])[arr.offset * 8:(arr.offset + n) * 8].cast(code)
+            return _NumericColumn.wrap(buf, _arrow_nulls(arr, pc, pa))
+        arr = pc.cast(arr, pa.large_string())
+        bufs = arr.buffers()
+        offsets = memoryview(bufs[1])[arr.offset * 8:(arr.offset + n + 1) * 8].cast("q")
+        data = memoryview(bufs[2]) if bufs[2] is not None else memoryview(b"")
+        return _StringColumn.wrap(data, offsets, _arrow_nulls(arr, pc, pa))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return _build_column(t, arr.to_pylist())
+
+
+def _double_text(v: float) -> str:
+    """Render a float the way the warehouse writes DOUBLE cells in JSON_ARRAY results.
+
+    That is Java `Double.toString`: plain between 1e-3 and 1e7, otherwise
+    `1.0E10` / `1.5E-5` style, with the shortest round-trip digits.
+    """
+    if math.isnan(v):
+        return "NaN"
+    if math.isinf(v):
+        return "Infinity" if v > 0 else "-Infinity"
+    if v == 0 or 1e-3 <= abs(v) < 1e7:
+        return repr(v)
+    sign, digits, exp = Decimal(repr(v)).as_tuple()
+    text = "".join(map(str, digits)).rstrip("0") or "0"
+    return f"{'-' if sign else ''}{text[0]}.{text[1:] or '0'}E{len(digits) + exp - 1}"
+
+
+def _norm_name(name: str) -> str:
+    """Normalize a column name for forgiving comparisons."""
+    n = (name or "").strip().strip("`'\"").casefold()
+    return "".join("_" if ch in " -" else ch for ch in n)
+
+
+def _cell_value(cell: Any) -> Any:
+    """Unwrap a `data_typed_array` cell ({'v': ...}) or return the cell as-is."""
+    return cell.get("v") if isinstance(cell, dict) else cell
+
+
+# ------------------------------------------------------------------------------
+# ResultTable
+# ------------------------------------------------------------------------------
+
+class ResultTable:
+    """Read-only, column-major view over a query result.
+
+    A table is a (columns, row index, column index) triple. `window()` and
+    `take()` return new tables that share the same column storage, so slicing
+    for rendering, pagination or caching never copies cell data.
+    """
+
+    __slots__ = ("_meta", "_cols", "_rows", "_col_idx")
+
+    def __init__(
+        self,
+        meta: Sequence[Dict[str, Any]],
+        cols: Sequence[_Column],
+        rows: Optional[RowIndex] = None,
+        col_idx: Optional[Tuple[int, ...]] = None,
+    ):
+        self._meta = tuple(meta)
+        self._cols = tuple(cols)
+        self._rows: RowIndex = rows if rows is not None else range(len(cols[0]) if cols else 0)
+        self._col_idx = col_idx if col_idx is not None else tuple(range(len(self._cols)))
+
+    # -------------------- Construction --------------------
+
+    @classmethod
+    def empty(cls) -> "ResultTable":
+        """Return a table with no columns and no rows."""
+        return cls((), ())
+
+    @classmethod
+    def from_rows(
+        cls, meta: Sequence[Dict[str, Any]], rows: Sequence[Sequence[Any]]
+    ) -> "ResultTable":
+        """Build a table from row-major cells (lists or typed-array dicts).
+
+        Rows shorter than the schema are padded with NULLs; extra cells are ignored.
+
+        Args:
+            meta: Column metadata dicts (name, type_name, ...).
+            rows: Row-major cell values.
+
+        Returns:
+            A new ResultTable.
+        """
+        meta = [m if isinstance(m, dict) else {} for m in meta]
+        cols: List[_Column] = []
+        for ci, m in enumerate(meta):
+            cols.append(_build_column(
+                m.get("type_name") or "",
+                (_cell_value(r[ci]) if ci < len(r) else None for r in rows),
+            ))
+        return cls(meta, cols, rows=range(len(rows)))
+
+    @classmethod
+    def from_result_dict(cls, schema: Any, data: Any) -> "ResultTable":
+        """Build a table from a statement manifest schema and a result payload.
+
+        Accepts the `as_dict()` shapes (`data_array` / `data_typed_array`) as well
+        as the SDK `ResultData` object itself, which avoids an intermediate dict.
+
+        Args:
+            schema: `{"columns": [...]}` dict or a bare list of column dicts.
+            data: Result dict or object exposing `data_array`.
+
+        Returns:
+            A new ResultTable (empty when nothing usable is present).
+        """
+        if isinstance(schema, dict):
+            meta = schema.get("columns", []) or []
+        elif isinstance(schema, list):
+            meta = schema
+        else:
+            meta = []
+
+        rows: Any = None
+        if isinstance(data, dict):
+            if isinstance(data.get("data_array"), list):
+                rows = data["data_array"]
+            elif isinstance(data.get("data_typed_array"), list):
+                rows = [r for r in data["data_typed_array"] if isinstance(r, list)]
+        elif data is not None:
+            rows = getattr(data, "data_array", None)
+        return cls.from_rows(meta, rows or [])
+
+    @classmethod
+    def from_arrow(cls, meta: Sequence[Dict[str, Any]], data: Any) -> "ResultTable":
+        """Build a table from a pyarrow Table or RecordBatch (requires pyarrow).
+
+        Column storage wraps the Arrow buffers (chunked columns are combined
+        once); only NULL bitmaps are expanded. The Arrow data stays alive for as
+        long as the table does.
+
+        Args:
+            meta: Column metadata dicts (name, type_name, ...), one per Arrow column.
+            data: pyarrow.Table or pyarrow.RecordBatch.
+
+        Returns:
+            A new ResultTable.
+        """
+        meta = [m if isinstance(m, dict) else {} for m in meta]
+        cols: List[_Column] = []
+        for ci, m in enumerate(meta[: data.num_columns]):
+            arr = data.column(ci)
+            if hasattr(arr, "combine_chunks"):
+                arr = arr.combine_chunks()
+            cols.append(_arrow_column(m.get("type_name") or "", arr))
+        return cls(meta[: len(cols)], cols, rows=range(data.num_rows))
+
+    # -------------------- Shape / metadata --------------------
+
+    @property
+    def columns(self) -> Tuple[Dict[str, Any], ...]:
+        """Metadata dicts of the visible columns."""
+        return tuple(self._meta[i] for i in self._col_idx)
+
+    @property
+    def column_names(self) -> List[str]:
+        """Visible column names (falls back to col1, col2, ...)."""
+        return [self._meta[i].get("name") or f"col{n + 1}" for n, i in enumerate(self._col_idx)]
+
+    @property
+    def num_rows(self) -> int:
+        """Number of visible rows."""
+        return len(self._rows)
+
+    @property
+    def num_cols(self) -> int:
+        """Number of visible columns."""
+        return len(self._col_idx)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the underlying storage (shared with windows)."""
+        return sum(c.nbytes() for c in self._cols)
+
+    # -------------------- Windowing --------------------
+
+    def window(
+        self,
+        rows: Optional[slice] = None,
+        cols: Optional[Union[slice, Sequence[int]]] = None,
+    ) -> "ResultTable":
+        """Return a zero-copy window over this table.
+
+        Args:
+            rows: Slice over the visible rows (e.g. `slice(0, 50)`).
+            cols: Slice or explicit positions over the visible columns.
+
+        Returns:
+            A ResultTable sharing storage with this one.
+        """
+        new_rows = self._rows[rows] if rows is not None else self._rows
+        if cols is None:
+            new_cols = self._col_idx
+        elif isinstance(cols, slice):
+            new_cols = self._col_idx[cols]
+        else:
+            new_cols = tuple(self._col_idx[i] for i in cols)
+        return ResultTable(self._meta, self._cols, rows=new_rows, col_idx=new_cols)
+
+    def head(self, n: int) -> "ResultTable":
+        """Shortcut for `window(rows=slice(0, n))`."""
+        return self.window(rows=slice(0, max(0, n)))
+
+    def take(self, positions: Iterable[int]) -> "ResultTable":
+        """Reorder/filter rows by visible positions (used for sort/filter views).
+
+        Only the row index is materialized (one machine word per row); column
+        storage stays shared.
+        """
+        idx = array("q", (self._rows[p] for p in positions))
+        return ResultTable(self._meta, self._cols, rows=memoryview(idx), col_idx=self._col_idx)
+
+    # -------------------- Operators --------------------
+
+    def find_column(self, name: str) -> Optional[int]:
+        """Resolve a user-typed column name to a physical column position.
+
+        Matching ignores case, surrounding quotes/backticks and treats spaces,
+        dashes and underscores alike. Hidden (windowed-out) columns are found too.
+        """
+        wanted = _norm_name(name)
+        if not wanted:
+            return None
+        for i, m in enumerate(self._meta):
+            if _norm_name(m.get("name") or "") == wanted:
+                return i
+        return None
+
+    def select(self, physical: Sequence[int]) -> "ResultTable":
+        """Project onto physical column positions (see `find_column`), keeping row order."""
+        return ResultTable(self._meta, self._cols, rows=self._rows, col_idx=tuple(physical))
+
+    def _sort_key(self, physical: int):
+        """Key function over physical rows: numbers numerically, text case-insensitively."""
+        col = self._cols[physical]
+        if isinstance(col, _NumericColumn):
+            return col.get
+        values = [col.get(p) for p in self._rows]
+        try:
+            nums = {p: (None if v is None else float(v)) for p, v in zip(self._rows, values)}
+            return nums.get
+        except ValueError:
+            texts = {p: (None if v is None else v.casefold()) for p, v in zip(self._rows, values)}
+            return texts.get
+
+    def sort(self, physical: int, *, descending: bool = False) -> "ResultTable":
+        """Return a view sorted by one physical column (NULLs always last)."""
+        key = self._sort_key(physical)
+        present = [p for p in range(len(self._rows)) if key(self._rows[p]) is not None]
+        missing = [p for p in range(len(self._rows)) if key(self._rows[p]) is None]
+        present.sort(key=lambda p: key(self._rows[p]), reverse=descending)
+        return self.take(present + missing)
+
+    def filter(self, physical: int, predicate) -> "ResultTable":
+        """Return a view keeping rows whose value in the physical column satisfies predicate."""
+        get = self._cols[physical].get
+        return self.take(p for p in range(len(self._rows)) if predicate(get(self._rows[p])))
+
+    # -------------------- Access --------------------
+
+    def cell(self, r: int, c: int) -> Any:
+        """Value at visible row r, visible column c."""
+        return self._cols[self._col_idx[c]].get(self._rows[r])
+
+    def column_values(self, c: int) -> Iterator[Any]:
+        """Iterate the values of visible column c in row order."""
+        col = self._cols[self._col_idx[c]]
+        get = col.get
+        for phys in self._rows:
+            yield get(phys)
+
+    def column_buffer(self, c: int) -> Optional[memoryview]:
+        """Zero-copy buffer of a numeric column (None for string columns)."""
+        col = self._cols[self._col_idx[c]]
+        return col.buffer() if isinstance(col, _NumericColumn) else None
+
+    def iter_rows(self) -> Iterator[Tuple[Any, ...]]:
+        """Iterate visible rows as tuples of Python values."""
+        getters = [self._cols[i].get for i in self._col_idx]
+        for phys in self._rows:
+            yield tuple(g(phys) for g in getters)
+
+    # -------------------- Serialization --------------------
+
+    def to_data_array(self) -> List[List[Optional[str]]]:
+        """Row-major `data_array` (JSON_ARRAY shape: strings or None per cell).
+
+        Numeric cells are re-rendered from their parsed values: integers as
+        plain digits, FLOAT/DOUBLE in the warehouse's notation (`1.0E10`, see
+        `_double_text`). Text-typed cells (DECIMAL, DATE, ...) are returned
+        exactly as received.
+        """
+        def text(v: Any) -> Optional[str]:
+            if v is None:
+                return None
+            return _double_text(v) if isinstance(v, float) else str(v)
+
+        return [[text(v) for v in row] for row in self.iter_rows()]
+
+    def to_result_dict(self) -> Dict[str, Any]:
+        """Result payload compatible with `ResultData.as_dict()` consumers."""
+        return {"row_count": self.num_rows, "row_offset": 0, "data_array": self.to_data_array()}
+
+    def schema_dict(self) -> Dict[str, Any]:
+        """Manifest-schema payload for the visible columns."""
+        return {"column_count": self.num_cols, "columns": list(self.columns)}
+
+
+# ------------------------------------------------------------------------------
+# ResultCache
+# ------------------------------------------------------------------------------
+
+def answer_nbytes(answer: Dict[str, Any]) -> int:
+    """Approximate bytes held by an answer: its table, Arrow result and section answers."""
+    table = answer.get("table")
+    size = table.nbytes() if isinstance(table, ResultTable) else 0
+    size += int(getattr(answer.get("_arrow"), "nbytes", 0) or 0)
+    for section in answer.get("sections") or []:
+        size += answer_nbytes(section)
+    return size
+
+
+class ResultCache:
+    """Small LRU + TTL cache of answers holding a ResultTable.
+
+    Bounded by entry count and by the approximate bytes of the cached tables
+    (section tables and a kept Arrow result included). An answer larger than
+    the whole budget is not cached, so it never flushes the other entries.
+    """
+
+    def __init__(
+        self, *, max_entries: int, max_bytes: int, ttl_seconds: float, name: str = "results"
+    ):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+
+    def put(self, key: str, answer: Dict[str, Any]) -> bool:
+        """Insert/replace an answer and evict least recently used entries over budget.
+
+        Returns:
+            False when the answer alone exceeds the byte budget and was not cached.
+        """
+        self.pop(key)
+        size = answer_nbytes(answer)
+        if size > self.max_bytes and answer.get("_arrow") is not None:
+            # The complete Arrow result alone would blow the budget: keep the rows only
+            answer = {k: v for k, v in answer.items() if k != "_arrow"}
+            size = answer_nbytes(answer)
+        if size > self.max_bytes:
+            RESULT_CACHE_SKIPPED.inc(cache=self.name)
+            return False
+        self._items[key] = (time.monotonic() + self.ttl_seconds, size, answer)
+        self._bytes += size
+        while self._items and (len(self._items) > self.max_entries or self._bytes > self.max_bytes):
+            _k, (_exp, old_size, _a) = self._items.popitem(last=False)
+            self._bytes -= old_size
+        return True
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a live answer (refreshing its LRU position) or None."""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            self.pop(key)
+            return None
+        self._items.move_to_end(key)
+        return item[2]
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        """Remove an entry, returning its answer if present."""
+        item = self._items.pop(key, None)
+        if item is None:
+            return None
+        self._bytes -= item[1]
+        return item[2]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held by cached tables."""
+        return self._bytes
@@ -0,0 +1,136 @@
+"""Genie conversation rollover.
+
+Module: rollover.py
+Purpose: Track turns and latency per Genie conversation and decide when a user
+         should transparently continue in a fresh conversation.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/rollover.py
+# License: MIT
+# Description: Genie processes the whole conversation on every
+#              `create_message`, so latency grows with conversation length and
+#              a user who never types `reset` pays for it on every follow-up.
+#              `ConversationState` counts turns and keeps an EWMA of turn
+#              latency; `RolloverPolicy.reason()` asks for a fresh conversation
+#              after N turns, an idle gap or a latency threshold, and
+#              `carry_over()` prefixes the first question of the new
+#              conversation with a one-line summary of the last one.
+#              `genie_turn_seconds{position}` shows latency by turn position
+#              (the p95 of late positions is what rollover flattens).
+# ─────────────────────────────────────────────────────────────────────────────
+
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .metrics import REGISTRY
+
+ROLLOVERS = REGISTRY.counter(
+    "genie_conversation_rollovers_total",
+    "Genie conversations rolled over, by reason (turns|idle|latency).",
+    ["reason"],
+)
+TURN_SECONDS = REGISTRY.histogram(
+    "genie_turn_seconds",
+    "Genie turn latency by the turn's position in its conversation (1, 2-3, 4-7, 8-15, 16+).",
+    ["position"],
+    buckets=(1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300),
+)
+CONVERSATION_TURNS = REGISTRY.histogram(
+    "genie_conversation_turns", "Turns per Genie conversation when it was rolled over or replaced.",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34),
+)
+
+# Weight of the newest turn in the latency EWMA
+LATENCY_ALPHA = 0.3
+# Longest summary of the previous question carried into a new conversation
+CARRY_MAX_CHARS = 200
+
+
+def position_label(turn: int) -> str:
+    """Histogram label for the 1-based position of a turn in its conversation."""
+    if turn <= 1:
+        return "1"
+    if turn <= 3:
+        return "2-3"
+    if turn <= 7:
+        return "4-7"
+    if turn <= 15:
+        return "8-15"
+    return "16+"
+
+
+@dataclass
+class ConversationState:
+    """A user's current Genie conversation.
+
+    Attributes:
+        conversation_id: Genie conversation id.
+        turns: Completed turns in the conversation.
+        latency_ewma: Smoothed turn latency in seconds (0 until the first turn).
+        last_turn_at: Monotonic time of the last completed turn.
+        last_question: The user's last question (for carry-over).
+    """
+
+    conversation_id: str
+    turns: int = 0
+    latency_ewma: float = 0.0
+    last_turn_at: float = field(default_factory=time.monotonic)
+    last_question: str = ""
+
+    def record_turn(self, question: str, latency_s: float, now: Optional[float] = None):
+        """Account for a completed turn and observe its latency by position."""
+        self.turns += 1
+        if self.turns == 1:
+            self.latency_ewma = latency_s
+        else:
+            self.latency_ewma = LATENCY_ALPHA * latency_s + (1 - LATENCY_ALPHA) * self.latency_ewma
+        self.last_turn_at = time.monotonic() if now is None else now
+        self.last_question = question
+        TURN_SECONDS.observe(latency_s, position=position_label(self.turns))
+
+
+@dataclass(frozen=True)
+class RolloverPolicy:
+    """When to start a fresh conversation (each trigger is off at 0).
+
+    Attributes:
+        max_turns: Roll over once a conversation has this many turns.
+        idle_seconds: Roll over after this long without a turn.
+        latency_seconds: Roll over when the latency EWMA exceeds this (from the
+            second turn on, so one slow query alone does not trigger it).
+        carry_question: Prefix the first question of the new conversation with
+            the previous question.
+    """
+
+    max_turns: int = 0
+    idle_seconds: float = 0.0
+    latency_seconds: float = 0.0
+    carry_question: bool = False
+
+    def reason(
+        self, state: Optional[ConversationState], now: Optional[float] = None
+    ) -> Optional[str]:
+        """Why `state` should be rolled over before the next turn, or None."""
+        if state is None or state.turns == 0:
+            return None
+        now = time.monotonic() if now is None else now
+        if self.idle_seconds > 0 and now - state.last_turn_at >= self.idle_seconds:
+            return "idle"
+        if self.max_turns > 0 and state.turns >= self.max_turns:
+            return "turns"
+        slow = state.turns >= 2 and state.latency_ewma >= self.latency_seconds
+        if self.latency_seconds > 0 and slow:
+            return "latency"
+        return None
+
+    def carry_over(self, state: ConversationState, question: str) -> str:
+        """The question to send as the first turn of the fresh conversation."""
+        previous = " ".join(state.last_question.split())
+        if not self.carry_question or not previous or state.turns == 0:
+            return question
+        if len(previous) > CARRY_MAX_CHARS:
+            previous = previous[: CARRY_MAX_CHARS - 1] + "…"
+        return f"(Context: my previous question was \"{previous}\")\n{question}"
@@ -0,0 +1,265 @@
+"""Per-space schema index.
+
+Module: schema_index.py
+Purpose: Keep the tables, columns, types and comments of each Genie Space in
+         memory and answer recognised metadata questions without Genie.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/schema_index.py
+# License: MIT
+# Description: The questions the welcome text suggests ("Which tables do you
+#              have?", "the list of columns ... for the first table") go to
+#              Genie, which often runs a warehouse query just to describe
+#              metadata. `SchemaIndex` holds a `SpaceSchema` per space, built
+#              by a caller-supplied loader (space definition + Unity Catalog,
+#              in agent.py) and refreshed in the background on a TTL;
+#              lookups never wait for a load. `match_metadata_question()`
+#              recognises table listings and column descriptions of a named
+#              or ordinal ("first") table; anything else, or a table the
+#              index does not know, still goes to Genie.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+SCHEMA_ANSWERS = REGISTRY.counter(
+    "genie_schema_answers_total",
+    "Metadata questions answered from the schema index, by intent (tables|columns).",
+    ["intent"],
+)
+SCHEMA_REFRESHES = REGISTRY.counter(
+    "genie_schema_index_refresh_total",
+    "Schema index (re)builds by outcome (ok|error).",
+    ["outcome"],
+)
+
+# Tables listed in one answer (the rest is summarised)
+MAX_LISTED_TABLES = 50
+
+_ORDINALS = {"first": 0, "1st": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2, "last": -1}
+
+_RE_TABLES = re.compile(
+    r"^(?:(?:which|what)\s+(?:are\s+(?:the\s+)?)?tables\b"
+    r"|(?:list|show)(?:\s+me)?(?:\s+(?:all|the))*(?:\s+available)?\s+tables\b"
+    r"|tables$)"
+)
+_RE_COLUMNS = re.compile(r"\b(?:columns?|fields|schema|describe)\b")
+_RE_ORDINAL_TABLE = re.compile(r"\b(first|1st|second|2nd|third|3rd|last)\s+table\b")
+_RE_NAMED_TABLE = re.compile(
+    r"\b(?:describe(?:\s+table)?|(?:of|in|for)\s+(?:the\s+)?(?:table\s+)?)\s*`?([A-Za-z0-9_.`-]+)`?"
+)
+# Questions about the data itself are Genie's, even when they mention columns
+_RE_DATA_WORDS = re.compile(
+    r"\b(?:where|rows?|lines|values?|sum|count|average|avg|total|top|max|min|distinct|trend|group)\b"
+)
+
+
+@dataclass
+class ColumnSchema:
+    """A column of an indexed table."""
+
+    name: str
+    type: str = ""
+    comment: str = ""
+
+
+@dataclass
+class TableSchema:
+    """An indexed table.
+
+    Attributes:
+        full_name: catalog.schema.table.
+        comment: Table comment.
+        columns: Columns in table order (empty when the table could not be read).
+    """
+
+    full_name: str
+    comment: str = ""
+    columns: List[ColumnSchema] = field(default_factory=list)
+
+    @property
+    def short_name(self) -> str:
+        """Table name without catalog and schema."""
+        return self.full_name.rsplit(".", 1)[-1]
+
+
+@dataclass
+class SpaceSchema:
+    """The tables of one Genie Space, in the space's order."""
+
+    space_id: str
+    tables: List[TableSchema]
+    built_at: float = field(default_factory=time.monotonic)
+
+    def find(self, name: str) -> Optional[TableSchema]:
+        """Table by full or short name (case-insensitive, backticks ignored)."""
+        want = name.strip("`. ").lower()
+        if not want:
+            return None
+        for t in self.tables:
+            if t.full_name.lower() == want or t.short_name.lower() == want:
+                return t
+        matches = [t for t in self.tables if t.full_name.lower().endswith("." + want)]
+        return matches[0] if len(matches) == 1 else None
+
+
+Loader = Callable[[str], Awaitable[List[TableSchema]]]
+
+
+def match_metadata_question(
+    text: str, schema: SpaceSchema
+) -> Optional[Tuple[str, Optional[TableSchema]]]:
+    """Recognise a metadata question the index can answer.
+
+    Returns:
+        ("tables", None), ("columns", table) or None (ask Genie).
+    """
+    q = " ".join((text or "").lower().split()).rstrip("?!. ")
+    if not q or not schema.tables or _RE_DATA_WORDS.search(q):
+        return None
+    if _RE_TABLES.search(q) and not _RE_COLUMNS.search(q):
+        return "tables", None
+    if not _RE_COLUMNS.search(q):
+        return None
+    m = _RE_ORDINAL_TABLE.search(q)
+    if m:
+        idx = _ORDINALS[m.group(1)]
+        return "columns", schema.tables[idx] if idx < len(schema.tables) else None
+    for m in _RE_NAMED_TABLE.finditer(q):
+        table = schema.find(m.group(1))
+        if table is not None:
+            return "columns", table
+    return None
+
+
+def _cell(s: str) -> str:
+    return " ".join((s or "").split()).replace("|", "\\|")
+
+
+def render_tables_md(schema: SpaceSchema, space_title: str) -> str:
+    """Markdown list of a space's tables with their comments."""
+    lines = [f"**Tables in {space_title}** ({len(schema.tables)})"]
+    for t in schema.tables[:MAX_LISTED_TABLES]:
+        lines.append(f"- `{t.full_name}`" + (f" — {_cell(t.comment)}" if t.comment else ""))
+    if len(schema.tables) > MAX_LISTED_TABLES:
+        lines.append(f"- … and {len(schema.tables) - MAX_LISTED_TABLES} more")
+    return "\n".join(lines)
+
+
+def render_columns_md(table: TableSchema) -> str:
+    """Markdown table of a table's columns, types and comments."""
+    head = f"**`{table.full_name}`**" + (f" — {_cell(table.comment)}" if table.comment else "")
+    if not table.columns:
+        return head + "\n\n_Column details are not available for this table._"
+    rows = [
+        f"| {_cell(c.name)} | {_cell(c.type)} | {_cell(c.comment) or '—'} |"
+        for c in table.columns
+    ]
+    return "\n".join([head, "", "| Column | Type | Description |", "|---|---|---|", *rows])
+
+
+class SchemaIndex:
+    """Space schemas, refreshed in the background.
+
+    Args:
+        loader: async space_id -> tables of the space (raises on failure).
+        ttl_seconds: Age after which a space is rebuilt (the stale copy keeps
+            answering meanwhile).
+        retry_seconds: Wait before retrying a space whose build failed.
+        clock: Monotonic clock (injectable for tests).
+    """
+
+    def __init__(
+        self,
+        loader: Loader,
+        *,
+        ttl_seconds: float,
+        retry_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._loader = loader
+        self.ttl = max(60.0, ttl_seconds)
+        self.retry = retry_seconds
+        self._clock = clock
+        self._spaces: Dict[str, SpaceSchema] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._building: Dict[str, "asyncio.Task[Optional[SpaceSchema]]"] = {}
+        REGISTRY.gauge(
+            "genie_schema_index_tables", "Tables held in the schema index (all spaces)."
+        ).set_function(lambda: float(sum(len(s.tables) for s in self._spaces.values())))
+
+    def _due(self, space_id: str, now: float) -> bool:
+        if space_id in self._building:
+            return False
+        failed = self._failed_at.get(space_id)
+        if failed is not None and now - failed < self.retry:
+            return False
+        current = self._spaces.get(space_id)
+        return current is None or now - current.built_at >= self.ttl
+
+    def get(self, space_id: str) -> Optional[SpaceSchema]:
+        """Current schema of a space (possibly stale; None until first built).
+
+        Schedules a rebuild when the entry is missing or past its TTL.
+        """
+        if self._due(space_id, self._clock()):
+            self._start(space_id)
+        return self._spaces.get(space_id)
+
+    def _start(self, space_id: str) -> "asyncio.Task[Optional[SpaceSchema]]":
+        task = asyncio.ensure_future(self._build(space_id))
+        self._building[space_id] = task
+        task.add_done_callback(lambda _t: self._building.pop(space_id, None))
+        return task
+
+    async def _build(self, space_id: str) -> Optional[SpaceSchema]:
+        try:
+            tables = await self._loader(space_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            SCHEMA_REFRESHES.inc(outcome="error")
+            self._failed_at[space_id] = self._clock()
+            log.warning("Schema index build failed for space %s: %s", space_id, e)
+            return None
+        SCHEMA_REFRESHES.inc(outcome="ok")
+        self._failed_at.pop(space_id, None)
+        schema = SpaceSchema(space_id, tables, built_at=self._clock())
+        self._spaces[space_id] = schema
+        return schema
+
+    def knows_table(self, name: str) -> bool:
+        """True if any indexed space has a table with this full or short name."""
+        return any(s.find(name) is not None for s in self._spaces.values())
+
+    async def refresh(self, space_id: str) -> Optional[SpaceSchema]:
+        """Rebuild a space now (joins a build already running)."""
+        task = self._building.get(space_id) or self._start(space_id)
+        return await asyncio.shield(task)
+
+    def describe(self) -> Dict[str, Dict[str, float]]:
+        """Snapshot for health endpoints: tables and age per space."""
+        now = self._clock()
+        return {
+            sid: {"tables": len(s.tables), "age_seconds": round(now - s.built_at, 1)}
+            for sid, s in self._spaces.items()
+        }
+
+    async def run_forever(self, space_ids: Callable[[], Iterable[str]], tick_seconds: float = 60.0):
+        """Background loop: keep the given spaces (e.g. default + in use) built and fresh."""
+        while True:
+            now = self._clock()
+            for sid in list(space_ids()):
+                if sid and self._due(sid, now):
+                    self._start(sid)
+            await asyncio.sleep(tick_seconds)
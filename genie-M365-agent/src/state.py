@@ -0,0 +1,214 @@
+"""Bounded, self-expiring state containers for per-user bot state.
+
+Module: state.py
+Purpose: TTL + LRU maps that keep memory flat regardless of how many users appear.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/state.py
+# License: MIT
+# Description: `BoundedStateMap` is a dict-like container ordered by last access.
+#              Entries idle for longer than the TTL, or beyond the size cap, are
+#              evicted from the cold end in amortized O(1). A `can_evict` hook
+#              protects entries that are still in use (e.g. a `RefCountedLock`
+#              that is held or awaited).
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+from .metrics import REGISTRY
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+_MISSING = object()
+
+STATE_ENTRIES = REGISTRY.gauge(
+    "genie_state_entries", "Entries held per bounded state map.", ["map"]
+)
+STATE_EVICTIONS = REGISTRY.counter(
+    "genie_state_evictions_total",
+    "Evictions per bounded state map by reason (ttl|size).",
+    ["map", "reason"],
+)
+
+
+class BoundedStateMap(Generic[K, V]):
+    """Dict-like map with idle TTL and LRU size bound.
+
+    Args:
+        name: Label used for metrics.
+        max_entries: Hard cap on the number of entries.
+        ttl_seconds: Idle time after which an entry expires (reads refresh it).
+        can_evict: Optional predicate; entries for which it returns False are
+            never evicted (they are moved back to the hot end instead).
+        clock: Monotonic clock (injectable for tests).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_entries: int,
+        ttl_seconds: float,
+        can_evict: Optional[Callable[[V], bool]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._can_evict = can_evict
+        self._clock = clock
+        self._data: "OrderedDict[K, List[Any]]" = OrderedDict()  # key -> [value, last_access]
+        STATE_ENTRIES.set_function(lambda: len(self._data), map=name)
+
+    # -------------------- Mapping API --------------------
+
+    def get(self, key: K, default: Any = None) -> Any:
+        """Return the live value (refreshing its TTL/LRU position) or default."""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        now = self._clock()
+        if now - item[1] > self.ttl_seconds and self._evictable(item[0]):
+            del self._data[key]
+            STATE_EVICTIONS.inc(map=self.name, reason="ttl")
+            return default
+        item[1] = now
+        self._data.move_to_end(key)
+        return item[0]
+
+    def __getitem__(self, key: K) -> V:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: K, value: V):
+        now = self._clock()
+        item = self._data.get(key)
+        if item is None:
+            self._data[key] = [value, now]
+        else:
+            item[0], item[1] = value, now
+            self._data.move_to_end(key)
+        self._sweep(now)
+
+    def setdefault(self, key: K, factory: Callable[[], V]) -> V:
+        """Return the live value for key, creating it with factory() if absent."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self[key] = value
+        return value
+
+    def pop(self, key: K, default: Any = None) -> Any:
+        """Remove key and return its value (or default)."""
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key, _MISSING) is not _MISSING  # type: ignore[arg-type]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def items(self) -> Iterator[Tuple[K, V]]:
+        """Iterate (key, value) pairs without refreshing them (cold first)."""
+        for k, item in list(self._data.items()):
+            yield k, item[0]
+
+    # -------------------- Eviction --------------------
+
+    def _evictable(self, value: V) -> bool:
+        return self._can_evict is None or self._can_evict(value)
+
+    def _sweep(self, now: float):
+        """Evict from the cold end while entries are expired or the map is over size.
+
+        Protected entries found at the cold end are refreshed and skipped; the
+        loop visits each entry at most once per call.
+        """
+        budget = len(self._data)
+        while self._data and budget > 0:
+            budget -= 1
+            key, item = next(iter(self._data.items()))
+            expired = now - item[1] > self.ttl_seconds
+            oversize = len(self._data) > self.max_entries
+            if not (expired or oversize):
+                return
+            if not self._evictable(item[0]):
+                item[1] = now  # keep the cold end ordered by last access
+                self._data.move_to_end(key)
+                continue
+            del self._data[key]
+            STATE_EVICTIONS.inc(map=self.name, reason="ttl" if expired else "size")
+
+    def sweep(self) -> int:
+        """Evict everything currently expired; returns the number of evictions."""
+        before = len(self._data)
+        self._sweep(self._clock())
+        return before - len(self._data)
+
+
+class RefCountedLock:
+    """asyncio.Lock that counts the tasks holding or waiting for it.
+
+    `asyncio.Lock.locked()` is False between a release and the next waiter
+    resuming, so it cannot tell whether a lock is still in use; `in_use` can
+    (use it as a BoundedStateMap `can_evict` guard). Only `async with` is
+    supported.
+    """
+
+    __slots__ = ("_lock", "_users")
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._users = 0
+
+    @property
+    def in_use(self) -> bool:
+        """True while any task holds or waits for the lock."""
+        return self._users > 0
+
+    def locked(self) -> bool:
+        """True while the lock is held (see `asyncio.Lock.locked`)."""
+        return self._lock.locked()
+
+    async def __aenter__(self) -> "RefCountedLock":
+        self._users += 1
+        try:
+            await self._lock.acquire()
+        except BaseException:
+            self._users -= 1
+            raise
+        return self
+
+    async def __aexit__(self, *exc: Any):
+        self._lock.release()
+        self._users -= 1
+
+
+def process_rss_bytes() -> float:
+    """Current resident set size of this process (Linux /proc; peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return float(int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except Exception:
+        try:
+            import resource
+
+            return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        except Exception:
+            return 0.0
+
+
+REGISTRY.gauge(
+    "genie_process_rss_bytes", "Resident memory of the bot process."
+).set_function(process_rss_bytes)
+
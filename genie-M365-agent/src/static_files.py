@@ -0,0 +1,267 @@
+"""In-memory static file serving.
+
+Module: static_files.py
+Purpose: Serve `public/` from memory with precompressed variants, strong
+         per-encoding ETags and conditional GETs.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/static_files.py
+# License: MIT
+# Description: `StaticAssets.load()` reads every file under the public directory
+#              once (symlinks followed, as before), precomputes gzip and, when
+#              the optional `brotli` package is installed, brotli variants for
+#              compressible types, and derives strong ETags from the content
+#              hash, one per content-coding (`"<hash>"`, `"<hash>-gz"`,
+#              `"<hash>-br"`) so a shared cache never answers one coding's
+#              revalidation with another's bytes. Responses carry
+#              STATIC_CACHE_SECONDS and are revalidated through
+#              If-None-Match. In dev mode `watch()` polls mtimes and reloads
+#              changed files.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+
+from .metrics import REGISTRY
+
+try:  # optional: brotli variants
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+STATIC_REQUESTS = REGISTRY.counter(
+    "genie_static_requests_total",
+    "Static asset responses by status and content encoding.",
+    ["status", "encoding"],
+)
+
+_COMPRESSIBLE_PREFIXES = ("text/",)
+_COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "application/manifest+json",
+}
+
+
+@dataclass
+class Asset:
+    """One file held in memory.
+
+    Fields:
+        body: Raw bytes.
+        content_type: MIME type.
+        etag: Strong ETag of the identity body (quoted content hash); see `etag_for`.
+        gzip: Precompressed gzip body (None if not worth it).
+        br: Precompressed brotli body (None if unavailable / not worth it).
+        mtime: File mtime at load time (dev watcher).
+    """
+    body: bytes
+    content_type: str
+    etag: str
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+    mtime: float = 0.0
+
+    def etag_for(self, encoding: str) -> str:
+        """Strong ETag of the body sent with the given Content-Encoding ('' = identity)."""
+        suffix = {"gzip": "-gz", "br": "-br"}.get(encoding, "")
+        return f'{self.etag[:-1]}{suffix}"' if suffix else self.etag
+
+
+def _compressible(content_type: str) -> bool:
+    return content_type.startswith(_COMPRESSIBLE_PREFIXES) or content_type in _COMPRESSIBLE_TYPES
+
+
+def _build_asset(path: Path) -> Asset:
+    body = path.read_bytes()
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    digest = hashlib.sha256(body).hexdigest()
+    asset = Asset(body=body, content_type=content_type, etag=f'"{digest[:32]}"',
+                  mtime=path.stat().st_mtime)
+    if _compressible(content_type) and len(body) > 256:
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gz) < len(body):
+            asset.gzip = gz
+        if brotli is not None:
+            br = brotli.compress(body, quality=11)
+            if len(br) < len(body):
+                asset.br = br
+    return asset
+
+
+def _accepted_encodings(header: str) -> Tuple[bool, bool]:
+    """Return (br, gzip) acceptance from an Accept-Encoding header (q=0 means refused)."""
+    br = gz = False
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            continue
+        if token == "br":
+            br = True
+        elif token in ("gzip", "*"):
+            gz = True
+    return br, gz
+
+
+def _etag_matches(header: str, etags: Dict[str, str]) -> Optional[str]:
+    """Return the encoding whose tag is listed in If-None-Match (None if none is).
+
+    Args:
+        header: If-None-Match value.
+        etags: Tag per encoding the response may use ('' = identity).
+    """
+    if header.strip() == "*":
+        return next(iter(etags))
+    listed = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return next((enc for enc, tag in etags.items() if tag in listed), None)
+
+
+class StaticAssets:
+    """Public directory served from memory.
+
+    Args:
+        root: Directory to serve (e.g. PUBLIC_DIR).
+        max_age_seconds: Cache-Control max-age for unversioned URLs.
+        max_file_bytes: Larger files are streamed from disk instead of cached.
+    """
+
+    def __init__(
+        self, root: str, max_age_seconds: int = 3600, max_file_bytes: int = 5 * 1024 * 1024
+    ):
+        self.root = Path(root)
+        self.max_age_seconds = max_age_seconds
+        self.max_file_bytes = max_file_bytes
+        self._assets: Dict[str, Asset] = {}
+        self._large: Dict[str, Path] = {}
+        REGISTRY.gauge(
+            "genie_static_bytes", "Bytes held by in-memory static assets (all variants)."
+        ).set_function(
+            lambda: sum(
+                len(a.body) + len(a.gzip or b"") + len(a.br or b"") for a in self._assets.values()
+            )
+        )
+
+    # -------------------- Loading --------------------
+
+    def _scan(self) -> Dict[str, Path]:
+        files: Dict[str, Path] = {}
+        if not self.root.is_dir():
+            return files
+        for dirpath, _dirs, names in os.walk(self.root, followlinks=True):
+            for name in names:
+                p = Path(dirpath) / name
+                if p.is_file():
+                    files[p.relative_to(self.root).as_posix()] = p
+        return files
+
+    def load(self) -> int:
+        """(Re)load every file; returns the number of files served."""
+        assets: Dict[str, Asset] = {}
+        large: Dict[str, Path] = {}
+        for rel, p in self._scan().items():
+            try:
+                if p.stat().st_size > self.max_file_bytes:
+                    large[rel] = p
+                else:
+                    assets[rel] = _build_asset(p)
+            except OSError:
+                continue
+        self._assets, self._large = assets, large
+        return len(assets) + len(large)
+
+    def refresh_changed(self) -> int:
+        """Reload files whose mtime changed, plus added/removed files; returns changes."""
+        current = self._scan()
+        changes = 0
+        if set(current) != set(self._assets) | set(self._large):
+            self.load()
+            return 1
+        for rel, p in current.items():
+            a = self._assets.get(rel)
+            try:
+                if a is not None and p.stat().st_mtime != a.mtime:
+                    self._assets[rel] = _build_asset(p)
+                    changes += 1
+            except OSError:
+                continue
+        return changes
+
+    async def watch(self, interval_seconds: float = 1.0):
+        """Dev-mode watcher: poll for changes and reload them (runs until cancelled)."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(self.refresh_changed)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                continue
+
+
+    # -------------------- Serving --------------------
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        """Aiohttp handler for `<PUBLIC_MOUNT>/{path:.+}`."""
+        rel = request.match_info.get("path", "")
+        asset = self._assets.get(rel)
+        if asset is None:
+            big = self._large.get(rel)
+            if big is not None:
+                resp = web.FileResponse(big)
+                resp.headers["Cache-Control"] = f"public, max-age={self.max_age_seconds}"
+                return resp
+            raise web.HTTPNotFound()
+
+        headers = {
+            "Cache-Control": f"public, max-age={self.max_age_seconds}",
+            "Vary": "Accept-Encoding",
+        }
+        body, encoding = asset.body, ""
+        br_ok, gz_ok = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        if br_ok and asset.br is not None:
+            body, encoding = asset.br, "br"
+        elif gz_ok and asset.gzip is not None:
+            body, encoding = asset.gzip, "gzip"
+
+        # Any tag of a coding this request accepts validates (a cache may hold several)
+        usable = {encoding: asset.etag_for(encoding), "": asset.etag}
+        if br_ok and asset.br is not None:
+            usable["br"] = asset.etag_for("br")
+        if gz_ok and asset.gzip is not None:
+            usable["gzip"] = asset.etag_for("gzip")
+        inm = request.headers.get("If-None-Match")
+        matched = _etag_matches(inm, usable) if inm else None
+        if matched is not None:
+            headers["ETag"] = usable[matched]
+            STATIC_REQUESTS.inc(status="304", encoding=matched or "identity")
+            return web.Response(status=304, headers=headers)
+
+        headers["ETag"] = asset.etag_for(encoding)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        STATIC_REQUESTS.inc(status="200", encoding=encoding or "identity")
+        charset = "utf-8" if asset.content_type.startswith("text/") else None
+        return web.Response(
+            body=body, headers=headers, content_type=asset.content_type, charset=charset
+        )
@@ -0,0 +1,528 @@
+"""Scheduled question subscriptions.
+
+Module: subscriptions.py
+Purpose: Re-ask subscribed questions on a schedule and deliver the answer only
+         when the result changed.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/subscriptions.py
+# License: MIT
+# Description: Users re-ask the same question every morning just to see
+#              whether the numbers moved. A `Subscription` (`subscribe
+#              "<question>" daily 08:00`) keeps the question, its `Schedule`,
+#              the conversation reference to deliver to and the fingerprint of
+#              the last result that user was sent. `SubscriptionScheduler`
+#              groups due subscriptions by (space, normalised question) so N
+#              subscribers cost one Genie execution, fingerprints the result
+#              and hands it to the delivery callable (the paced outbound
+#              queue in agent.py) only for subscribers whose last result
+#              differs. A subscriber's fingerprint advances only once the
+#              queue confirms the send, so a result lost to a failed send or
+#              a restart is delivered by the next run. State lives in a
+#              `SubscriptionStore`: a JSON file (default) or Redis, where a
+#              per-run claim keeps several workers from executing the same
+#              group twice.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+SUBSCRIPTION_RUNS = REGISTRY.counter(
+    "genie_subscription_runs_total",
+    "Scheduled question executions (one per space + question group) "
+    "by outcome (changed|unchanged|error).",
+    ["outcome"],
+)
+SUBSCRIPTION_DELIVERIES = REGISTRY.counter(
+    "genie_subscription_deliveries_total",
+    "Subscription results by outcome (queued|sent|failed|unchanged|dropped).",
+    ["outcome"],
+)
+
+_DAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+_DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+# ------------------------------------------------------------------------------
+# Schedules and fingerprints
+# ------------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Schedule:
+    """Days of the week and a local time of day.
+
+    Attributes:
+        days: Weekdays to run on (0 = Monday).
+        hour: Local hour (0-23).
+        minute: Local minute (0-59).
+    """
+
+    days: Tuple[int, ...]
+    hour: int
+    minute: int
+
+    @classmethod
+    def parse(cls, spec: str) -> "Schedule":
+        """Parse `daily HH:MM`, `weekdays HH:MM` or `<day> HH:MM` (mon..sun).
+
+        Raises:
+            ValueError: Unrecognised spec.
+        """
+        parts = (spec or "").lower().split()
+        if len(parts) != 2:
+            raise ValueError("expected `daily HH:MM`, `weekdays HH:MM` or `<day> HH:MM`")
+        when, at = parts
+        if when == "daily":
+            days: Tuple[int, ...] = tuple(range(7))
+        elif when == "weekdays":
+            days = tuple(range(5))
+        elif when[:3] in _DAYS:
+            days = (_DAYS[when[:3]],)
+        else:
+            raise ValueError(f"unknown schedule `{when}`")
+        try:
+            hh, mm = (int(x) for x in at.split(":", 1))
+        except ValueError:
+            raise ValueError(f"invalid time `{at}` (use HH:MM)") from None
+        if not (0 <= hh < 24 and 0 <= mm < 60):
+            raise ValueError(f"invalid time `{at}` (use HH:MM)")
+        return cls(days, hh, mm)
+
+    def label(self) -> str:
+        """Canonical spec (round-trips through `parse`)."""
+        when = "daily" if len(self.days) == 7 else "weekdays" if self.days == tuple(range(5)) else (
+            _DAY_NAMES[self.days[0]].lower()
+        )
+        return f"{when} {self.hour:02d}:{self.minute:02d}"
+
+    def next_after(self, ts: float, tz: Optional[tzinfo]) -> float:
+        """Epoch seconds of the first scheduled time strictly after `ts` (local to tz)."""
+        now = datetime.fromtimestamp(ts, tz or timezone.utc)
+        at = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        for _ in range(8):
+            if at.weekday() in self.days and at > now:
+                return at.timestamp()
+            at = (at + timedelta(days=1)).replace(hour=self.hour, minute=self.minute)
+        raise ValueError("schedule has no days")  # pragma: no cover
+
+
+def result_fingerprint(wire: Dict[str, Any]) -> str:
+    """Hash of what an answer says, not how Genie worded it.
+
+    Covers columns and rows when there is a table, otherwise the message text
+    (sections included).
+    """
+    def _project(a: Dict[str, Any]) -> Any:
+        if "data" in a:
+            cols = a.get("columns") or {}
+            names = [
+                c.get("name") if isinstance(c, dict) else c
+                for c in (cols.get("columns") or [] if isinstance(cols, dict) else cols)
+            ]
+            body: Any = {"columns": names, "data": a.get("data")}
+        else:
+            body = {"message": " ".join(str(a.get("message") or "").split())}
+        if a.get("sections"):
+            body["sections"] = [_project(s) for s in a["sections"]]
+        return body
+
+    raw = json.dumps(_project(wire), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def group_key(space_id: str, question: str) -> str:
+    """Subscriptions sharing this key run as one execution."""
+    norm = " ".join((question or "").split()).casefold()
+    return f"{space_id}:{hashlib.sha256(norm.encode('utf-8')).hexdigest()[:32]}"
+
+
+@dataclass
+class Subscription:
+    """A user's scheduled question.
+
+    Attributes:
+        id: Short id shown to the user (`unsubscribe <id>`).
+        user_id: Subscriber.
+        space_id: Genie Space the question runs in.
+        question: Question text.
+        schedule: Schedule spec (`Schedule.label()`).
+        reference: Serialized conversation reference to deliver to.
+        next_run: Epoch seconds of the next execution.
+        last_hash: Fingerprint of the last result confirmed sent to this user.
+        last_run: Epoch seconds of the last execution (0 = never).
+    """
+
+    id: str
+    user_id: str
+    space_id: str
+    question: str
+    schedule: str
+    reference: Dict[str, Any]
+    next_run: float
+    last_hash: str = ""
+    last_run: float = 0.0
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def group(self) -> str:
+        """Key shared by subscriptions to the same question in the same space."""
+        return group_key(self.space_id, self.question)
+
+
+# ------------------------------------------------------------------------------
+# Stores
+# ------------------------------------------------------------------------------
+
+class SubscriptionStore(abc.ABC):
+    """Interface: subscription records by id, plus a run claim."""
+
+    shared = False  # True when other workers see the same records
+
+    @abc.abstractmethod
+    async def load(self) -> Dict[str, Dict[str, Any]]:
+        """All stored records by subscription id."""
+
+    @abc.abstractmethod
+    async def put(self, sub_id: str, record: Dict[str, Any]):
+        """Create or replace a subscription record."""
+
+    @abc.abstractmethod
+    async def delete(self, sub_id: str):
+        """Drop a subscription record (no error when it does not exist)."""
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        """True if this worker should run `key` (single-worker stores always do)."""
+        return True
+
+    async def close(self):
+        """Release backend resources."""
+        return None
+
+
+class FileSubscriptionStore(SubscriptionStore):
+    """All records in one JSON file, for a single worker.
+
+    The file is rewritten atomically (tmp file + rename) on every change.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = asyncio.Lock()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return doc.get("subscriptions") or {} if isinstance(doc, dict) else {}
+
+    def _write(self, records: Dict[str, Dict[str, Any]]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "subscriptions": records}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    async def load(self) -> Dict[str, Dict[str, Any]]:
+        """Records from the file (read once, then served from memory)."""
+        async with self._lock:
+            if self._records is None:
+                self._records = await asyncio.to_thread(self._read)
+            return dict(self._records)
+
+    async def put(self, sub_id: str, record: Dict[str, Any]):
+        """Store a record and rewrite the file."""
+        await self._update(lambda r: r.__setitem__(sub_id, record))
+
+    async def delete(self, sub_id: str):
+        """Drop a record and rewrite the file."""
+        await self._update(lambda r: r.pop(sub_id, None))
+
+    async def _update(self, change: Callable[[Dict[str, Dict[str, Any]]], Any]):
+        async with self._lock:
+            if self._records is None:
+                self._records = await asyncio.to_thread(self._read)
+            change(self._records)
+            await asyncio.to_thread(self._write, dict(self._records))
+
+
+class RedisSubscriptionStore(SubscriptionStore):
+    """Records in a Redis hash shared by all workers; runs are claimed with SET NX.
+
+    Requires the optional `redis` package (redis.asyncio).
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "genie:subs:"):
+        try:
+            import redis.asyncio as aioredis  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("SUBSCRIPTIONS_BACKEND=redis requires the 'redis' package.") from e
+        self._client = aioredis.from_url(url)
+        self._prefix = prefix
+
+    async def load(self) -> Dict[str, Dict[str, Any]]:
+        """HGETALL of the shared hash."""
+        raw = await self._client.hgetall(self._prefix + "all")
+        out: Dict[str, Dict[str, Any]] = {}
+        for k, v in (raw or {}).items():
+            key = k.decode("utf-8") if isinstance(k, bytes) else str(k)
+            out[key] = json.loads(v)
+        return out
+
+    async def put(self, sub_id: str, record: Dict[str, Any]):
+        """HSET one record."""
+        value = json.dumps(record, ensure_ascii=False)
+        await self._client.hset(self._prefix + "all", sub_id, value)
+
+    async def delete(self, sub_id: str):
+        """HDEL one record."""
+        await self._client.hdel(self._prefix + "all", sub_id)
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        """True for the first worker to claim `key` within `ttl` (SET NX)."""
+        px = max(1, int(ttl * 1000))
+        return bool(await self._client.set(self._prefix + "run:" + key, "1", nx=True, px=px))
+
+    async def close(self):
+        """Close the Redis connection pool."""
+        await self._client.aclose()
+
+
+# ------------------------------------------------------------------------------
+# Scheduler
+# ------------------------------------------------------------------------------
+
+Runner = Callable[[str, str], Awaitable[Dict[str, Any]]]
+Confirm = Callable[[bool], Awaitable[None]]
+Deliver = Callable[[Subscription, Dict[str, Any], Confirm], bool]
+
+
+class SubscriptionScheduler:
+    """Runs due subscriptions, one execution per (space, question) group.
+
+    Args:
+        store: Persistent subscription records.
+        runner: async (space_id, question) -> answer (fresh conversation).
+        fingerprint: answer -> result hash (see `result_fingerprint`).
+        deliver: Queue an answer for a subscriber, with a callback to await once the
+            send succeeded or failed; False when it was not accepted.
+        tz: Timezone of schedule times.
+        max_per_user: Subscriptions a user may hold.
+        concurrency: Groups executed at the same time.
+        clock: Wall clock in epoch seconds (injectable for tests).
+    """
+
+    def __init__(
+        self,
+        store: SubscriptionStore,
+        runner: Runner,
+        fingerprint: Callable[[Dict[str, Any]], str],
+        deliver: Deliver,
+        *,
+        tz: Optional[tzinfo],
+        max_per_user: int = 10,
+        concurrency: int = 2,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self._runner = runner
+        self._fingerprint = fingerprint
+        self._deliver = deliver
+        self.tz = tz
+        self.max_per_user = max(1, max_per_user)
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._clock = clock
+        self._subs: Dict[str, Subscription] = {}
+        self._loaded = False
+        REGISTRY.gauge("genie_subscriptions", "Active question subscriptions.").set_function(
+            lambda: float(len(self._subs))
+        )
+
+    async def load(self):
+        """(Re)read all subscriptions from the store."""
+        records = await self.store.load()
+        subs: Dict[str, Subscription] = {}
+        for sid, rec in records.items():
+            try:
+                subs[sid] = Subscription(**rec)
+            except TypeError:
+                log.warning("Ignoring malformed subscription record %s", sid)
+        self._subs = subs
+        self._loaded = True
+
+    async def _ensure_loaded(self):
+        if not self._loaded:
+            await self.load()
+
+    # -------------------- User operations --------------------
+
+    async def list_for(self, user_id: str) -> List[Subscription]:
+        """A user's subscriptions, oldest first."""
+        await self._ensure_loaded()
+        mine = (s for s in self._subs.values() if s.user_id == user_id)
+        return sorted(mine, key=lambda s: s.created_at)
+
+    async def add(
+        self,
+        user_id: str,
+        space_id: str,
+        question: str,
+        schedule: Schedule,
+        reference: Dict[str, Any],
+    ) -> Subscription:
+        """Subscribe a user (re-subscribing the same question replaces its schedule).
+
+        Raises:
+            ValueError: The user already holds max_per_user other subscriptions.
+        """
+        await self._ensure_loaded()
+        mine = await self.list_for(user_id)
+        key = group_key(space_id, question)
+        existing = next((s for s in mine if s.group == key), None)
+        if existing is None and len(mine) >= self.max_per_user:
+            raise ValueError(
+                f"you already have {self.max_per_user} subscriptions; "
+                "remove one with `unsubscribe <id>`"
+            )
+        sub = Subscription(
+            id=existing.id if existing else uuid.uuid4().hex[:6],
+            user_id=user_id,
+            space_id=space_id,
+            question=" ".join(question.split()),
+            schedule=schedule.label(),
+            reference=reference,
+            next_run=schedule.next_after(self._clock(), self.tz),
+            last_hash=existing.last_hash if existing else "",
+        )
+        self._subs[sub.id] = sub
+        await self.store.put(sub.id, asdict(sub))
+        return sub
+
+    async def remove(self, user_id: str, sub_id: str) -> bool:
+        """Unsubscribe (only the owner can)."""
+        await self._ensure_loaded()
+        sub = self._subs.get(sub_id)
+        if sub is None or sub.user_id != user_id:
+            return False
+        del self._subs[sub_id]
+        await self.store.delete(sub_id)
+        return True
+
+    # -------------------- Execution --------------------
+
+    def due(self, now: float) -> Dict[str, List[Subscription]]:
+        """Due subscriptions grouped by (space, question)."""
+        groups: Dict[str, List[Subscription]] = {}
+        for sub in self._subs.values():
+            if sub.next_run <= now:
+                groups.setdefault(sub.group, []).append(sub)
+        return groups
+
+    async def run_due(self) -> Dict[str, int]:
+        """Execute every due group once and queue changed results.
+
+        Returns:
+            Counters {groups, changed, unchanged, error} for this pass.
+        """
+        if self.store.shared or not self._loaded:
+            await self.load()  # other workers may have added, removed or run subscriptions
+        now = self._clock()
+        stats = {"groups": 0, "changed": 0, "unchanged": 0, "error": 0}
+        groups = self.due(now)
+
+        async def _one(subs: List[Subscription]):
+            async with self._slots:
+                outcome = await self._run_group(subs, now)
+            if outcome:
+                stats["groups"] += 1
+                stats[outcome] += 1
+
+        await asyncio.gather(*(_one(subs) for subs in groups.values()))
+        return stats
+
+    async def _run_group(self, subs: List[Subscription], now: float) -> Optional[str]:
+        lead = subs[0]
+        # The slot being served (earliest next_run) keys the claim, so one worker runs it
+        slot = int(min(s.next_run for s in subs))
+        if not await self.store.claim(f"{lead.group}:{slot}", ttl=3600):
+            return None
+        try:
+            answer = await self._runner(lead.space_id, lead.question)
+            failed = "error" in answer
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Subscription run failed for %s: %s", lead.group, e)
+            answer, failed = {}, True
+
+        fp = "" if failed else self._fingerprint(answer)
+        changed = False
+        for sub in subs:
+            if not failed and fp != sub.last_hash:
+                changed = True
+                if self._deliver(sub, answer, self._confirmer(sub.id, fp)):
+                    SUBSCRIPTION_DELIVERIES.inc(outcome="queued")
+                else:
+                    SUBSCRIPTION_DELIVERIES.inc(outcome="dropped")  # retried at the next run
+            elif not failed:
+                SUBSCRIPTION_DELIVERIES.inc(outcome="unchanged")
+            sub.last_run = now
+            sub.next_run = Schedule.parse(sub.schedule).next_after(now, self.tz)
+            if sub.id in self._subs:
+                await self.store.put(sub.id, asdict(sub))
+        outcome = "error" if failed else "changed" if changed else "unchanged"
+        SUBSCRIPTION_RUNS.inc(outcome=outcome)
+        return outcome
+
+    def _confirmer(self, sub_id: str, fp: str) -> Confirm:
+        """Completion callback of one queued result: record it as seen once sent."""
+        async def _confirm(sent: bool):
+            SUBSCRIPTION_DELIVERIES.inc(outcome="sent" if sent else "failed")
+            sub = self._subs.get(sub_id)
+            if not sent or sub is None:
+                return  # not seen: the next run delivers it again
+            sub.last_hash = fp
+            await self.store.put(sub_id, asdict(sub))
+
+        return _confirm
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot for health endpoints."""
+        upcoming = min((s.next_run for s in self._subs.values()), default=None)
+        return {
+            "subscriptions": len(self._subs),
+            "groups": len({s.group for s in self._subs.values()}),
+            "next_run_in_seconds": (
+                round(max(0.0, upcoming - self._clock()), 1) if upcoming is not None else None
+            ),
+        }
+
+    async def run_forever(self, tick_seconds: float = 30.0):
+        """Background loop: load the store, then run due groups every tick."""
+        while True:
+            try:
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Subscription scheduler pass failed: %s", e)
+            await asyncio.sleep(tick_seconds)
@@ -0,0 +1,143 @@
+"""HTTP transport for Databricks SDK traffic.
+
+Module: transport.py
+Purpose: Size the SDK's connection pool explicitly, keep connections alive and
+         expose pool saturation / connect-time metrics.
+"""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Project: Databricks Genie – M365 Agents
+# File: databricks-genie-M365_agents/src/transport.py
+# License: MIT
+# Description: Every `asyncio.to_thread` call into `WorkspaceClient` goes
+#              through one `requests.Session`. `DatabricksTransport` replaces
+#              that session's HTTPS adapter with a pool sized to the number of
+#              concurrent Genie turns (threads otherwise queue on the pool and
+#              extra connections pay a TLS handshake each), enables TCP
+#              keep-alive, and instruments connection checkout and connect.
+# ─────────────────────────────────────────────────────────────────────────────
+
+import socket
+import time
+import weakref
+from typing import Any, Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .metrics import REGISTRY
+
+POOL_WAIT = REGISTRY.histogram(
+    "genie_dbx_pool_wait_seconds",
+    "Time a Databricks call waited to check out a pooled connection.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_SATURATED = REGISTRY.counter(
+    "genie_dbx_pool_saturated_total",
+    "Connection checkouts that found every pooled connection in use.",
+)
+CONNECT_SECONDS = REGISTRY.histogram(
+    "genie_dbx_connect_seconds", "TCP + TLS connect time of new Databricks connections.",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CONNECTIONS_OPENED = REGISTRY.counter(
+    "genie_dbx_connections_opened_total", "New connections opened to Databricks (pool misses)."
+)
+
+_POOLS: "weakref.WeakSet[HTTPConnectionPool]" = weakref.WeakSet()
+
+
+def _in_use() -> float:
+    """Connections currently checked out across all instrumented pools."""
+    total = 0
+    for pool in list(_POOLS):
+        q = pool.pool
+        if q is not None:
+            total += q.maxsize - q.qsize()
+    return float(total)
+
+
+REGISTRY.gauge(
+    "genie_dbx_pool_in_use", "Databricks connections currently checked out."
+).set_function(_in_use)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that records its connect (TCP + TLS) time."""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        CONNECT_SECONDS.observe(time.perf_counter() - started)
+        CONNECTIONS_OPENED.inc()
+
+
+class _InstrumentedHTTPSConnectionPool(HTTPSConnectionPool):
+    """Pool that records checkout wait time and saturation."""
+
+    ConnectionCls = _TimedHTTPSConnection
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        _POOLS.add(self)
+
+    def _get_conn(self, timeout: Optional[float] = None):
+        if self.pool is not None and self.pool.empty():
+            POOL_SATURATED.inc()
+        started = time.perf_counter()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+class DatabricksTransport(HTTPAdapter):
+    """Instrumented, keep-alive HTTPS adapter for the Databricks SDK session.
+
+    Args:
+        pool_size: Connections kept per host (size it to GENIE_MAX_CONCURRENCY
+            plus headroom for background work).
+        pool_block: Wait for a free connection instead of opening throwaway
+            connections beyond pool_size.
+        keepalive: Enable TCP keep-alive probes so idle pooled connections
+            survive load balancers and NAT timeouts.
+    """
+
+    def __init__(self, pool_size: int = 32, pool_block: bool = True, keepalive: bool = True):
+        self._keepalive = keepalive
+        super().__init__(pool_connections=4, pool_maxsize=max(1, pool_size), pool_block=pool_block)
+
+    def init_poolmanager(
+        self, connections: int, maxsize: int, block: bool = False, **pool_kwargs: Any
+    ):
+        """Install TCP keep-alive socket options and the instrumented HTTPS pool."""
+        if self._keepalive:
+            opts = list(HTTPConnection.default_socket_options)
+            opts.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                opts += [
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 20),
+                ]
+            pool_kwargs.setdefault("socket_options", opts)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": HTTPConnectionPool,
+            "https": _InstrumentedHTTPSConnectionPool,
+        }
+
+
+def install_transport(workspace_client: Any, transport: DatabricksTransport) -> bool:
+    """Mount transport on the SDK's shared session (all Genie and statement endpoints).
+
+    Returns:
+        False when the SDK internals are not where this version expects them; the
+        SDK's own adapter (sized via Config.max_connection_pools) stays in place.
+    """
+    base = getattr(getattr(workspace_client, "api_client", None), "_api_client", None)
+    session = getattr(base, "_session", None)
+    if session is None:
+        return False
+    session.mount("https://", transport)
+    return True